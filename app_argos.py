@@ -1,32 +1,13 @@
 import streamlit as st
 from streamlit_mic_recorder import mic_recorder, speech_to_text
-from transformers import BlenderbotTokenizer, BlenderbotForConditionalGeneration
-import argostranslate.package
-import argostranslate.translate
-import time
-
-
-# Get the Argos model up and running
-def load_language_package(from_code, to_code):
-    """Load the language package from Argos Translate."""
-    argostranslate.package.update_package_index()
-    available_packages = argostranslate.package.get_available_packages()
-    package_to_install = next(
-        filter(
-            lambda x: x.from_code == from_code and x.to_code == to_code,
-            available_packages
-        )
-    )
-    argostranslate.package.install_from_path(package_to_install.download())
-
 
-# Make our translation function!
-def translate_text(from_language: str, to_language: str, text: str) -> dict:
-    """Translates text from one language to another using Argos Translate."""
-    load_language_package(from_language, to_language)
-    translated_text = argostranslate.translate.translate(text, from_language, to_language)
-    return {"translatedText": translated_text}
+from polyprose import metrics, ui
+from polyprose.conversation import Conversation, Turn
+# Our translation + BlenderBot pipeline! Packages are installed once per pair and results are memoized,
+# and nothing heavy gets imported until the first translation
+from polyprose.core import Pipeline
 
+pipeline = Pipeline("argos")
 
 # Create three tabs -- One is "About me", one is "PolyProse", one is "Sources"
 tabs = st.tabs(["PolyProse", "About Me", "Sources"])
@@ -36,101 +17,72 @@ with tabs[0]:
     # Add a "Try"!!! This is very helpful
     try:
         # AESTHETICS - Put the title on!
-        original_title = "PolyProse: Let's learn together!"
-        st.title(original_title)
-        st.markdown(f"<h1 style='font-size: 50px; text-align: center;'>&#127760;</h1>", unsafe_allow_html=True)
+        ui.header()
 
         # LANGUAGE DROPDOWN
-        option = st.selectbox(
-            "Which language are we practicing today?",
-            ("Russian", "French", "Polish", "Spanish", "Hindi"),
-        )
+        option = ui.language_select(pipeline)
 
         # Set the variable to the language code
-        lang_mapping = {"Russian": "ru", "French": "fr", "Polish": "pl", "Spanish": "es", "Hindi": "hi"}
-        lang = lang_mapping.get(option, "en")
-
+        lang = pipeline.languages.get(option, "en")
 
-        # DEFINE ALL SORTS OF FUNCTIONS!
-        def translate_title(target_language: str) -> str:
-            """Translates the title from English to the target language."""
-            translation_result = translate_text("en", target_language, "Let's learn together!")
-            return translation_result["translatedText"]
+        # The model and both translators started loading (and warming up) when the language was picked
+        ui.prefetch_language(pipeline, lang)
 
-
-        # Update the title to the translated text based on the selected language!!
+        # Update the title to the translated text based on the selected language!! (pre-translated, no waiting)
         if option:
-            translated_title = translate_title(lang)
-            st.markdown(f"<h1 style='font-size: 24px; text-align: center;'>{translated_title}</h1>",
-                        unsafe_allow_html=True)
-
-
-        # MAKE CHAT BUBBLES
-        def display_user_message(original_message, translated_message):
-            st.markdown(f"""
-                <div style="background-color: #d1e7dd; padding: 10px; border-radius: 10px; margin: 5px 0;">
-                    <strong style="color: black;">You:</strong> <span style="color: black;">{original_message}</span><br>
-                    <strong style="color: black;">Translation:</strong> <span style="color: black;">{translated_message}</span>
-                </div>
-            """, unsafe_allow_html=True)
+            ui.tagline(ui.title(pipeline, lang))
 
+        # SPEECH TO TEXT
+        # The history lives in the session now, with every turn's translations stored once
+        if 'conversation' not in st.session_state:
+            st.session_state.conversation = Conversation()
+        conversation = st.session_state.conversation
 
-        def display_ai_message(original_message, translated_message):
-            st.markdown(f"""
-                <div style="background-color: #f8d7da; padding: 10px; border-radius: 10px; margin: 5px 0;">
-                    <strong style="color: black;">PolyProse:</strong> <span style="color: black;">{original_message}</span><br>
-                    <strong style="color: black;">Translation:</strong> <span style="color: black;">{translated_message}</span>
-                </div>
-            """, unsafe_allow_html=True)
+        # The chat pane reruns on its own: speaking or Refresh only redo this part of the page,
+        # not the title, the dropdown or the other tabs
+        @st.fragment
+        def chat_pane(lang):
+            # Its own "Try", since a rerun of just the pane doesn't go through the one around the page
+            try:
+                c1, c2 = st.columns(2)
+                with c1:
+                    st.write("Convert speech to text:")
+                with c2:
+                    text = speech_to_text(language=lang, use_container_width=True, just_once=True, key='STT')
 
+                # Translate user input (speaking again cancels a reply that's still being generated)
+                turn = ui.start_turn(pipeline, lang, text, conversation.turns()) if text else None
 
-        # SPEECH TO TEXT
-        conversation_history = []
+                if text:
+                    translated_text = turn.user_translation()
 
-        c1, c2 = st.columns(2)
-        with c1:
-            st.write("Convert speech to text:")
-        with c2:
-            text = speech_to_text(language=lang, use_container_width=True, just_once=True, key='STT')
+                    # Display user message and translation
+                    ui.display_user_message(text, translated_text)
 
-        if text:
-            conversation_history.append(f"You: {text}")
+                    with st.spinner('Pondering...'):
+                        # MODEL TIME! Generate AI response -- finished sentences get translated while it keeps going
+                        reply = turn.reply()
 
-            # Translate user input
-            translated_text = translate_text(lang, "en", text)["translatedText"]
+                    # Display AI response and its translation as they stream in
+                    response, translated_response = ui.stream_ai_message(reply)
 
-            # Display user message and translation
-            display_user_message(text, translated_text)
+                    conversation.add(Turn(lang, text, translated_text, response, translated_response))
 
-            with st.spinner('Pondering...'):
-                # MODEL TIME!
-                model_name = "facebook/blenderbot-400M-distill"
-                tokenizer = BlenderbotTokenizer.from_pretrained(model_name)
-                model = BlenderbotForConditionalGeneration.from_pretrained(model_name)
+                # Display the conversation history and translations (no translating, just reading, a page at a time)
+                ui.history_pages(conversation, skip_newest=1 if text else 0)
 
-                # Generate AI response
-                inputs = tokenizer(text, return_tensors="pt", padding=True, truncation=True)
-                reply_ids = model.generate(input_ids=inputs["input_ids"], attention_mask=inputs["attention_mask"],
-                                           max_length=100)
-                response = tokenizer.decode(reply_ids[0], skip_special_tokens=True)
+                # ADD REFRESH BUTTON!!! Long story short, we want to redo after every talk (just the pane)
+                if st.button("Refresh"):
+                    st.rerun(scope="fragment")
 
-                # Display AI response and its translation
-                translated_response = translate_text("en", lang, response)["translatedText"]
-                display_ai_message(response, translated_response)
+            except Exception as e:
+                ui.show_error(e)
 
-        # Display the conversation history and translations
-        for entry in conversation_history:
-            user_text = entry.split(": ", 1)[1]
-            translated_text = translate_text("en", lang, user_text)["translatedText"]
-
-        # ADD REFRESH BUTTON!!! Long story short, we want to redo after every talk
-        if st.button("Refresh"):
-            st.rerun()
+        chat_pane(lang)
 
     except Exception as e:
-        st.error(f"An error occurred: {e}")
-        time.sleep(1)
-        st.rerun()
+        # Just say so: sleeping and rerunning only retried whatever had failed, forever
+        ui.show_error(e)
 
 # SECOND TAB: About Me
 with tabs[1]:
@@ -171,3 +123,6 @@ with tabs[2]:
     st.markdown(
         f'<a href={blenderurl}><button style="background-color:lightblue; color: black;">🤖 BlenderBot Model</button></a>',
         unsafe_allow_html=True)
+
+# DEBUG SIDEBAR -- per-stage timings and counters, only shows up with POLYPROSE_METRICS=1
+metrics.debug_sidebar()
@@ -0,0 +1,69 @@
+"""Throughput/latency of the Google backend against the local fake Translate server.
+
+No network or credentials needed. Compares plain pooled clients against
+pooled clients + request coalescing under concurrent load.
+
+    python -m benchmarks.google_backend --threads 16 --calls 50 --latency-ms 40
+"""
+import argparse
+import json
+import os
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from polyprose.fake_translate import FakeTranslateServer
+
+
+def run(threads: int, calls: int, coalesce_ms: float, server) -> dict:
+    from polyprose import google_backend
+
+    os.environ["POLYPROSE_GOOGLE_COALESCE_MS"] = str(coalesce_ms)
+    google_backend._coalescer = None
+    requests_before = server.requests
+
+    def worker(worker_id):
+        latencies = []
+        for i in range(calls):
+            # Unique texts so the translation cache never answers for us
+            text = f"{coalesce_ms}-{worker_id}-{i}-{time.perf_counter_ns()}"
+            start = time.perf_counter()
+            google_backend.translate_text("ru", text)
+            latencies.append(time.perf_counter() - start)
+        return latencies
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        latencies = [t for result in pool.map(worker, range(threads)) for t in result]
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+
+    return {
+        "coalesce_ms": coalesce_ms,
+        "threads": threads,
+        "translations": len(latencies),
+        "http_requests": server.requests - requests_before,
+        "throughput_per_s": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 2),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 2),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the Google backend against the fake server")
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--calls", type=int, default=50, help="translations per thread")
+    parser.add_argument("--latency-ms", type=float, default=40.0, help="fake server latency per request")
+    parser.add_argument("--coalesce-ms", type=float, nargs="+", default=[0.0, 5.0])
+    args = parser.parse_args(argv)
+
+    server = FakeTranslateServer(latency_ms=args.latency_ms).start()
+    os.environ["POLYPROSE_GOOGLE_ENDPOINT"] = server.url
+    os.environ.setdefault("POLYPROSE_CACHE_DISK_ITEMS", "0")
+    results = [run(args.threads, args.calls, ms, server) for ms in args.coalesce_ms]
+    print(json.dumps(results, indent=2))
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
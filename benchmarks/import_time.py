@@ -0,0 +1,95 @@
+"""Cold-start import cost of PolyProse.
+
+Every measurement runs in a fresh interpreter with `python -X importtime`, so
+it is what a new Streamlit server process (or a script) pays before it can do
+anything. The apps used to import transformers, argostranslate and
+google.cloud.translate at the top (and call google.auth.default()); now they
+only import polyprose.core, which pulls those in on first use. This prints
+both side by side as JSON:
+
+    python -m benchmarks.import_time --repeats 5 --top 10
+
+Dependencies that aren't installed are reported as errors instead of timings.
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+TARGETS = {
+    "python": "pass",
+    "polyprose.core": "import polyprose.core",
+    "polyprose.core + pipelines": "from polyprose.core import Pipeline; Pipeline('argos'); Pipeline('google')",
+    # What every app process paid up front before
+    "transformers": "import transformers",
+    "argostranslate": "import argostranslate.package, argostranslate.translate",
+    "google.cloud.translate": "from google.cloud import translate_v2",
+    "google.auth.default()": "import google.auth; google.auth.default()",
+    "all of the above (old app startup)": (
+        "import transformers, argostranslate.package, argostranslate.translate, google.auth; "
+        "from google.cloud import translate_v2; google.auth.default()"
+    ),
+}
+
+
+def parse_importtime(stderr: str) -> list:
+    """(module, cumulative seconds) for every top-level import in -X importtime output."""
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not name.startswith("  "):
+            # Only top-level imports, nested ones are already in their parent's cumulative time
+            imports.append((name.strip(), int(cumulative) / 1e6))
+    return imports
+
+
+def measure(code: str) -> dict:
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                            cwd=ROOT, capture_output=True, text=True)
+    wall = time.perf_counter() - start
+    if result.returncode != 0:
+        return {"error": result.stderr.strip().splitlines()[-1]}
+    imports = parse_importtime(result.stderr)
+    return {"wall_s": wall, "import_s": sum(seconds for _, seconds in imports), "imports": imports}
+
+
+def run(name: str, code: str, repeats: int, top: int) -> dict:
+    runs = [measure(code) for _ in range(repeats)]
+    errors = [r["error"] for r in runs if "error" in r]
+    if errors:
+        return {"target": name, "error": errors[0]}
+    slowest = sorted(runs[-1]["imports"], key=lambda item: item[1], reverse=True)[:top]
+    return {
+        "target": name,
+        "wall_ms": round(statistics.median(r["wall_s"] for r in runs) * 1000, 1),
+        "import_ms": round(statistics.median(r["import_s"] for r in runs) * 1000, 1),
+        "slowest_imports_ms": {module: round(seconds * 1000, 1) for module, seconds in slowest},
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure cold import time of PolyProse and its heavy dependencies")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--top", type=int, default=5, help="list this many of the slowest top-level imports")
+    parser.add_argument("--targets", nargs="*", choices=list(TARGETS), help="only these")
+    args = parser.parse_args(argv)
+
+    names = args.targets or list(TARGETS)
+    report = {
+        "python": sys.version.split()[0],
+        "repeats": args.repeats,
+        "results": [run(name, TARGETS[name], args.repeats, args.top) for name in names],
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""Multi-session load test of the Streamlit apps.
+
+Every interaction reruns the whole app script, so how many learners one server
+process can take depends on the script as much as on the models. This drives
+N sessions of an app at once with Streamlit's AppTest (the same script, the
+same shared polyprose modules, one session state each, all in one process like
+a real server), every session picking languages and "speaking" utterances from
+benchmarks/corpus.jsonl, and reports for each concurrency level:
+
+    rerun latency (p50/p95/p99) for the first load, language changes and turns,
+    reruns per second, resident memory per session, and errors shown by the app.
+
+Speech to text is always stubbed (components don't run under AppTest): the
+utterance is handed to speech_to_text through the session state. With
+--stub-backends, translation and BlenderBot are stubbed too, with fixed
+latencies, which measures the script and Streamlit themselves.
+
+    python -m benchmarks.load_test app_argos.py --sessions 1 2 4 8 16 --turns 5 --stub-backends
+
+Needs streamlit (>= 1.28 for AppTest).
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import types
+from pathlib import Path
+
+from benchmarks.pipeline import DEFAULT_CORPUS, load_corpus, summarize
+
+ROOT = Path(__file__).resolve().parent.parent
+# Where the stubbed speech_to_text finds what the session "said"
+UTTERANCE_KEY = "load_test_utterance"
+
+
+def install_stt_stub():
+    """Replaces streamlit_mic_recorder with a stand-in that returns the session's scripted utterance."""
+    import streamlit as st
+
+    module = types.ModuleType("streamlit_mic_recorder")
+
+    def speech_to_text(*args, **kwargs):
+        # just_once: the utterance is only there for one rerun
+        return st.session_state.pop(UTTERANCE_KEY, None)
+
+    def mic_recorder(*args, **kwargs):
+        return None
+
+    module.speech_to_text = speech_to_text
+    module.mic_recorder = mic_recorder
+    sys.modules["streamlit_mic_recorder"] = module
+
+
+def install_backend_stubs(translate_ms: float, generate_ms: float, reply_words: int):
+    """Swaps translation and BlenderBot for sleeps of about the same shape (they release the GIL too)."""
+    from polyprose import argos_backend, core, prefetch, responder
+
+    def translate(self, from_language, to_language, text):
+        time.sleep(translate_ms / 1000)
+        return f"[{to_language}] {text}"
+
+    def translate_batch(self, from_language, to_language, texts):
+        time.sleep(translate_ms / 1000)
+        return [f"[{to_language}] {text}" for text in texts]
+
+    def stream_respond(self, english_text, lang, history=()):
+        def chunks():
+            for i in range(reply_words):
+                time.sleep(generate_ms / 1000 / reply_words)
+                yield "Sure. " if i % 8 == 7 else "word "
+        return responder.StreamedReply(chunks(), lambda sentence: self.translate("en", lang, sentence))
+
+    core.Pipeline.translate = translate
+    core.Pipeline.translate_batch = translate_batch
+    core.Pipeline.stream_respond = stream_respond
+    core.Pipeline.prepare = lambda self, lang: []
+    prefetch._steps = lambda backend, lang, model_name: []
+    # Only what the public index has, no registry lookups
+    argos_backend.has_route = lambda from_code, to_code: False
+
+
+def rss_bytes() -> int:
+    from polyprose.models import current_rss_bytes
+
+    return current_rss_bytes()
+
+
+class Session:
+    """One learner: an AppTest of the app plus the reruns it has timed."""
+
+    def __init__(self, app: str, index: int, corpus: list, timeout: float, stub_backends: bool):
+        from streamlit.testing.v1 import AppTest
+
+        self.index = index
+        self.corpus = corpus
+        self.app = AppTest.from_file(app, default_timeout=timeout)
+        if stub_backends:
+            # app.py reads its Google credentials from the secrets
+            self.app.secrets["google_translate"] = {"private_key": "load-test"}
+        self.samples = {"load": [], "select": [], "turn": []}
+        self.errors = []
+
+    def _timed(self, kind: str, run):
+        start = time.perf_counter()
+        try:
+            run()
+        except Exception as e:
+            self.errors.append(f"{kind}: {type(e).__name__}: {e}")
+            return
+        self.samples[kind].append(time.perf_counter() - start)
+        self.errors.extend(f"{kind}: {element.value}" for element in self.app.error)
+        self.errors.extend(f"{kind}: {element.message}" for element in self.app.exception)
+
+    def run(self, turns: int):
+        from polyprose.core import LANGUAGES
+
+        names = {code: name for name, code in LANGUAGES.items()}
+        self._timed("load", self.app.run)
+        for turn in range(turns):
+            # Every session walks the corpus from its own starting point, so they don't all speak the same language
+            record = self.corpus[(self.index + turn) % len(self.corpus)]
+            selectbox = self.app.selectbox(key="language")
+            option = names.get(record["lang"])
+            if option not in selectbox.options:
+                continue
+            if selectbox.value != option:
+                self._timed("select", selectbox.set_value(option).run)
+            self.app.session_state[UTTERANCE_KEY] = record["text"]
+            self._timed("turn", self.app.run)
+
+
+def run_level(app: str, sessions: int, turns: int, corpus: list, timeout: float, stub_backends: bool) -> dict:
+    """Runs `sessions` sessions at once and summarizes their reruns."""
+    rss_before = rss_bytes()
+    # Built up front: creating an AppTest isn't what we're timing
+    runners = [Session(app, i, corpus, timeout, stub_backends) for i in range(sessions)]
+    threads = [threading.Thread(target=runner.run, args=(turns,), name=f"session-{i}")
+               for i, runner in enumerate(runners)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    # Measured while every session (and its state) is still alive
+    rss_after = rss_bytes()
+
+    samples = {kind: [s for runner in runners for s in runner.samples[kind]] for kind in ("load", "select", "turn")}
+    all_samples = [s for kind_samples in samples.values() for s in kind_samples]
+    errors = [error for runner in runners for error in runner.errors]
+    return {
+        "sessions": sessions,
+        "reruns": len(all_samples),
+        "reruns_per_s": round(len(all_samples) / elapsed, 2) if elapsed else 0.0,
+        "seconds": round(elapsed, 2),
+        "latency": {kind: summarize(kind_samples) for kind, kind_samples in samples.items()},
+        "all_reruns": summarize(all_samples),
+        "rss_mb": round(rss_after / 2 ** 20, 1),
+        "per_session_mb": round(max(rss_after - rss_before, 0) / sessions / 2 ** 20, 2),
+        "errors": len(errors),
+        "first_errors": errors[:5],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test a PolyProse app with many simultaneous sessions")
+    parser.add_argument("app", nargs="?", default="app_argos.py", help="app script (default app_argos.py)")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 2, 4, 8], help="concurrency levels to run")
+    parser.add_argument("--turns", type=int, default=3, help="utterances per session")
+    parser.add_argument("--corpus", default=str(DEFAULT_CORPUS))
+    parser.add_argument("--languages", nargs="*", help="only these language codes")
+    parser.add_argument("--timeout", type=float, default=120.0, help="seconds one rerun may take")
+    parser.add_argument("--stub-backends", action="store_true", help="stub translation and BlenderBot")
+    parser.add_argument("--translate-ms", type=float, default=50.0, help="stubbed translation latency")
+    parser.add_argument("--generate-ms", type=float, default=500.0, help="stubbed reply generation time")
+    parser.add_argument("--reply-words", type=int, default=20, help="words in a stubbed reply")
+    parser.add_argument("--stop-p95-ms", type=float, help="stop at the first level whose turn p95 is above this")
+    parser.add_argument("--output", help="write the JSON here as well as printing it")
+    args = parser.parse_args(argv)
+
+    app = str(Path(args.app).resolve())
+    # The app scripts import polyprose and open ./headshot.png, so they run from the repo root
+    sys.path.insert(0, str(ROOT))
+    os.chdir(ROOT)
+    install_stt_stub()
+    if args.stub_backends:
+        install_backend_stubs(args.translate_ms, args.generate_ms, args.reply_words)
+
+    corpus = load_corpus(args.corpus, args.languages)
+    report = {"app": args.app, "turns_per_session": args.turns, "stub_backends": args.stub_backends, "levels": []}
+    for sessions in args.sessions:
+        level = run_level(app, sessions, args.turns, corpus, args.timeout, args.stub_backends)
+        report["levels"].append(level)
+        print(f"{sessions} sessions: turn p95 {level['latency']['turn']['p95_ms']} ms, "
+              f"{level['reruns_per_s']} reruns/s, {level['per_session_mb']} MB/session, {level['errors']} errors",
+              file=sys.stderr)
+        if args.stop_p95_ms and level["latency"]["turn"]["p95_ms"] > args.stop_p95_ms:
+            break
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        Path(args.output).write_text(output, encoding="utf-8")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
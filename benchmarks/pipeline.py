@@ -0,0 +1,193 @@
+"""Headless end-to-end benchmark of the PolyProse pipeline.
+
+Runs the same steps as the apps, minus the UI:
+
+    utterance -> translate (lang -> en) -> tokenize -> generate -> decode -> translate (en -> lang)
+
+over a fixed multilingual corpus (benchmarks/corpus.jsonl: ru, fr, pl, es, hi, be)
+for each translation backend, and prints p50/p95/p99 latency and throughput per
+stage as JSON. Languages a backend can't handle (e.g. no Argos package for be)
+are skipped and listed under "unsupported".
+
+By default the Google backend talks to the local fake Translate server
+(polyprose.fake_translate) so nothing leaves the machine; pass --google-live to
+use the real API. The translation cache is off unless --cache is given, so the
+numbers are what a cold string costs. --concurrent also times whole turns run
+through Pipeline.start_turn (stages overlapping) next to the serial total.
+
+    python -m benchmarks.pipeline --backends google argos --repeats 3 --output bench.json
+"""
+import argparse
+import json
+import math
+import os
+import time
+from pathlib import Path
+
+STAGES = ("translate_in", "tokenize", "generate", "decode", "translate_out")
+DEFAULT_CORPUS = Path(__file__).with_name("corpus.jsonl")
+
+
+def load_corpus(path, languages=None) -> list:
+    with open(path, encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    if languages:
+        records = [r for r in records if r["lang"] in languages]
+    return records
+
+
+def percentile(sorted_values: list, p: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(p / 100 * len(sorted_values)) - 1, 0)
+    return sorted_values[rank]
+
+
+def summarize(samples: list) -> dict:
+    """Latency percentiles (ms) and throughput for a list of durations in seconds."""
+    samples = sorted(samples)
+    total = sum(samples)
+    return {
+        "count": len(samples),
+        "mean_ms": round(total / len(samples) * 1000, 2) if samples else 0.0,
+        "p50_ms": round(percentile(samples, 50) * 1000, 2),
+        "p95_ms": round(percentile(samples, 95) * 1000, 2),
+        "p99_ms": round(percentile(samples, 99) * 1000, 2),
+        "throughput_per_s": round(len(samples) / total, 2) if total else 0.0,
+    }
+
+
+def translator_for(backend: str):
+    """A translate(from, to, text) -> str function for a backend."""
+    from polyprose.core import Pipeline
+
+    return Pipeline(backend).translate
+
+
+def time_concurrent_turns(backend: str, corpus: list, repeats: int, max_length: int, skip) -> list:
+    """Wall time of whole turns with the stages overlapping (Pipeline.start_turn)."""
+    from polyprose.core import Pipeline
+
+    pipeline = Pipeline(backend, max_length=max_length)
+    samples = []
+    for _ in range(repeats):
+        for record in corpus:
+            if record["lang"] in skip:
+                continue
+            start = time.perf_counter()
+            pipeline.start_turn(record["lang"], record["text"]).result()
+            samples.append(time.perf_counter() - start)
+    return samples
+
+
+def run_backend(backend: str, corpus: list, repeats: int, max_length: int, warmup: bool = True,
+                concurrent: bool = False) -> dict:
+    from polyprose.models import get_loaded
+
+    translate = translator_for(backend)
+    loaded = get_loaded()
+    tokenizer, model = loaded.tokenizer, loaded.model
+    timings = {stage: [] for stage in STAGES}
+    totals = []
+    unsupported = {}
+
+    def one_turn(lang, text):
+        t0 = time.perf_counter()
+        english = translate(lang, "en", text)
+        t1 = time.perf_counter()
+        inputs = tokenizer(english, return_tensors="pt", padding=True, truncation=True)
+        t2 = time.perf_counter()
+        reply_ids = model.generate(input_ids=inputs["input_ids"], attention_mask=inputs["attention_mask"],
+                                   max_length=max_length)
+        t3 = time.perf_counter()
+        reply = tokenizer.decode(reply_ids[0], skip_special_tokens=True)
+        t4 = time.perf_counter()
+        translate("en", lang, reply)
+        t5 = time.perf_counter()
+        return (t1 - t0, t2 - t1, t3 - t2, t4 - t3, t5 - t4)
+
+    # One untimed pass per language: package installs and first-use loads aren't what we measure here
+    if warmup:
+        for lang in dict.fromkeys(r["lang"] for r in corpus):
+            text = next(r["text"] for r in corpus if r["lang"] == lang)
+            try:
+                one_turn(lang, text)
+            except Exception as e:
+                unsupported[lang] = f"{type(e).__name__}: {e}"
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for record in corpus:
+            if record["lang"] in unsupported:
+                continue
+            try:
+                durations = one_turn(record["lang"], record["text"])
+            except Exception as e:
+                unsupported[record["lang"]] = f"{type(e).__name__}: {e}"
+                continue
+            for stage, duration in zip(STAGES, durations):
+                timings[stage].append(duration)
+            totals.append(sum(durations))
+    elapsed = time.perf_counter() - start
+
+    report = {
+        "backend": backend,
+        "responder_backend": loaded.backend,
+        "turns": len(totals),
+        "turns_per_s": round(len(totals) / elapsed, 3) if elapsed else 0.0,
+        "stages": {stage: summarize(samples) for stage, samples in timings.items()},
+        "total": summarize(totals),
+        "unsupported": unsupported,
+    }
+    if concurrent:
+        report["concurrent_total"] = summarize(time_concurrent_turns(backend, corpus, repeats, max_length, unsupported))
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the PolyProse pipeline per stage and backend")
+    parser.add_argument("--backends", nargs="+", default=["google", "argos"], choices=["google", "argos"])
+    parser.add_argument("--corpus", default=str(DEFAULT_CORPUS))
+    parser.add_argument("--languages", nargs="*", help="only these language codes")
+    parser.add_argument("--repeats", type=int, default=1)
+    parser.add_argument("--max-length", type=int, default=100)
+    parser.add_argument("--cache", action="store_true", help="keep the translation cache on")
+    parser.add_argument("--no-warmup", action="store_true")
+    parser.add_argument("--concurrent", action="store_true", help="also time turns with overlapping stages")
+    parser.add_argument("--google-live", action="store_true", help="use the real Google API")
+    parser.add_argument("--google-latency-ms", type=float, default=0.0, help="latency of the fake Google server")
+    parser.add_argument("--output", help="write the JSON here as well as printing it")
+    args = parser.parse_args(argv)
+
+    if not args.cache:
+        os.environ["POLYPROSE_CACHE_MEMORY_ITEMS"] = "0"
+        os.environ["POLYPROSE_CACHE_DISK_ITEMS"] = "0"
+    # Time generate() itself, not the cross-session batcher's queue
+    os.environ["POLYPROSE_GENERATE_BATCH_SIZE"] = "1"
+
+    server = None
+    if "google" in args.backends and not args.google_live:
+        from polyprose.fake_translate import FakeTranslateServer
+        server = FakeTranslateServer(latency_ms=args.google_latency_ms).start()
+        os.environ["POLYPROSE_GOOGLE_ENDPOINT"] = server.url
+
+    corpus = load_corpus(args.corpus, args.languages)
+    report = {
+        "corpus": args.corpus,
+        "utterances": len(corpus),
+        "repeats": args.repeats,
+        "google_endpoint": "live" if args.google_live else "fake",
+        "results": [run_backend(b, corpus, args.repeats, args.max_length, not args.no_warmup, args.concurrent) for b in args.backends],
+    }
+    if server is not None:
+        server.shutdown()
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        Path(args.output).write_text(output, encoding="utf-8")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""Compare the responder backends (fp32 / int8 / onnx) on CPU.
+
+Each backend is loaded in its own process so the memory numbers don't mix.
+Reports load time, resident memory, generate latency, and how close the
+replies are to the fp32 ones (exact matches and a difflib similarity score),
+so we can pick the fastest mode that still gives sane replies.
+
+    python -m benchmarks.responder_modes --backends fp32 int8 onnx --repeats 3
+
+onnx is only in the default list when optimum is installed. A backend whose
+process fails or runs past --timeout is reported with an "error" instead.
+"""
+import argparse
+import difflib
+import importlib.util
+import json
+import multiprocessing
+import queue
+import statistics
+import time
+
+PROMPTS = [
+    "Hello! How are you today?",
+    "What is your favorite book?",
+    "I am learning Russian and it is hard.",
+    "Do you like to travel?",
+    "Tell me about your weekend.",
+    "I just moved to a new city and I don't know anyone yet.",
+    "What should I cook for dinner tonight?",
+    "My cat keeps waking me up at five in the morning.",
+]
+
+
+def _measure(backend, prompts, repeats, max_length, results):
+    try:
+        results.put(_run(backend, prompts, repeats, max_length))
+    except Exception as e:
+        results.put({"backend": backend, "error": f"{type(e).__name__}: {e}"})
+
+
+def _run(backend, prompts, repeats, max_length) -> dict:
+    import os
+    os.environ["POLYPROSE_RESPONDER_BACKEND"] = backend
+    os.environ["POLYPROSE_GENERATE_BATCH_SIZE"] = "1"
+    from polyprose import models
+    from polyprose.responder import generate_reply
+
+    loaded = models.get_loaded()
+    generate_reply(prompts[0], max_length=max_length)  # warm-up
+
+    replies, latencies = [], []
+    for prompt in prompts:
+        for _ in range(repeats):
+            start = time.perf_counter()
+            reply = generate_reply(prompt, max_length=max_length)
+            latencies.append(time.perf_counter() - start)
+        replies.append(reply)
+
+    latencies.sort()
+    return {
+        "backend": backend,
+        "load_seconds": round(loaded.load_seconds, 2),
+        "rss_mb": round(models.current_rss_bytes() / 2 ** 20, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 1),
+        "p95_ms": round(latencies[max(int(len(latencies) * 0.95) - 1, 0)] * 1000, 1),
+        "replies": replies,
+    }
+
+
+def run_backend(backend, prompts, repeats, max_length, timeout: float = 1800.0) -> dict:
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    process = context.Process(target=_measure, args=(backend, prompts, repeats, max_length, results))
+    process.start()
+    deadline = time.monotonic() + timeout
+    result = None
+    while result is None:
+        try:
+            result = results.get(timeout=1.0)
+        except queue.Empty:
+            # Killed (out of memory, say) or crashed in native code: it will never answer
+            if not process.is_alive():
+                result = {"backend": backend, "error": f"process exited with code {process.exitcode}"}
+            elif time.monotonic() > deadline:
+                process.terminate()
+                result = {"backend": backend, "error": f"timed out after {timeout:.0f}s"}
+    process.join(10)
+    return result
+
+
+def default_backends() -> list:
+    backends = ["fp32", "int8"]
+    if importlib.util.find_spec("optimum") is not None:
+        backends.append("onnx")
+    return backends
+
+
+def compare(reference: list, replies: list) -> dict:
+    """How close a backend's replies are to the fp32 ones."""
+    similarities = [difflib.SequenceMatcher(None, a, b).ratio() for a, b in zip(reference, replies)]
+    return {
+        "exact_match": round(sum(a == b for a, b in zip(reference, replies)) / len(reference), 3),
+        "mean_similarity": round(statistics.mean(similarities), 3),
+        "empty_replies": sum(not reply.strip() for reply in replies),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare responder backends against fp32")
+    parser.add_argument("--backends", nargs="+", default=default_backends(),
+                        help="default: fp32 int8, and onnx if optimum is installed")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--max-length", type=int, default=100)
+    parser.add_argument("--timeout", type=float, default=1800.0, help="seconds one backend may take")
+    parser.add_argument("--show-replies", action="store_true")
+    args = parser.parse_args(argv)
+
+    backends = ["fp32"] + [b for b in args.backends if b != "fp32"]
+    results = [run_backend(b, PROMPTS, args.repeats, args.max_length, args.timeout) for b in backends]
+    reference = results[0].get("replies")
+    for result in results:
+        if "replies" not in result:
+            continue
+        if reference is not None:
+            result["parity_vs_fp32"] = compare(reference, result["replies"])
+        if not args.show_replies:
+            del result["replies"]
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,12 @@
+"""Offline batch mode: translate + respond to a JSONL file of utterances without Streamlit.
+
+    python just_translation.py corpus.jsonl results.jsonl --backend argos --workers 2
+
+See polyprose/batch.py for the options.
+"""
+import sys
+
+from polyprose.batch import main
+
+if __name__ == "__main__":
+    sys.exit(main())
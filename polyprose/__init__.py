@@ -0,0 +1,6 @@
+"""Shared helpers behind the PolyProse Streamlit apps.
+
+The apps (app.py, app_argos.py, sandbox.py, streamlit_app.py, ...) stay as the
+Streamlit entry points. Anything that should live longer than a single rerun
+(installed language packages, loaded models, caches) lives in here instead.
+"""
@@ -0,0 +1,212 @@
+"""Argos Translate backend used by app_argos.py, sandbox.py and condensed_argos_app.py.
+
+translate_batch runs a whole list of texts through the pair's CTranslate2 model
+in one translate_batch() call instead of one argostranslate.translate.translate()
+per text. The CTranslate2 translator and SentencePiece model are loaded once per
+language pair and reused. argostranslate, ctranslate2 and sentencepiece
+are imported on the first translation, not when this module is imported.
+
+Texts are split into sentences first, so a long reply becomes several short
+rows of the same batch instead of one long one. CTranslate2 runs the
+sub-batches on several cores at once (inter_threads), so long inputs get
+faster with more cores instead of sitting on one.
+
+Pairs without a package of their own go through English (ru -> en -> fr). Every
+hop is cached on its own, so two pairs pivoting through the same English reuse
+that half of the route.
+
+Loaded translators are kept under a memory budget by polyprose.residency:
+the least recently used pairs are unloaded when a new one doesn't fit, and
+loaded again when they're needed.
+
+Settings (environment variables):
+    POLYPROSE_ARGOS_THREADS  batches CTranslate2 translates in parallel (default: cores, at most 4)
+"""
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from polyprose import config, metrics, residency
+from polyprose.argos_registry import PackageNotAvailable, get_registry, load_language_package
+from polyprose.cache import cached_batch
+
+BEAM_SIZE = 4
+MAX_BATCH_SIZE = 32
+PIVOT = "en"
+
+# A sentence ends with ., !, ? or the Devanagari danda, followed by whitespace
+_SENTENCE_END = re.compile(r"(?<=[.!?।])\s+")
+
+# Pairs whose package isn't a CTranslate2 + SentencePiece one, Argos translates those itself
+_legacy_pairs = set()
+_routes = {}
+_lock = threading.Lock()
+_fallback_pool = None
+
+
+def _threads() -> tuple:
+    """(inter_threads, intra_threads) for CTranslate2: batches in parallel x cores per batch."""
+    # The cores this process may run on (an inference server worker is pinned to a few)
+    cores = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+    inter = max(config.env_int("POLYPROSE_ARGOS_THREADS", min(cores, 4)), 1)
+    return inter, max(cores // inter, 1)
+
+
+def sub_batch_size(count: int, inter_threads: int) -> int:
+    """Sentences per sub-batch so that `count` of them are spread over every replica (at most MAX_BATCH_SIZE)."""
+    return max(min(-(-count // max(inter_threads, 1)), MAX_BATCH_SIZE), 1)
+
+
+class _PairTranslator:
+    """CTranslate2 model + tokenizer for one installed language pair."""
+
+    def __init__(self, package):
+        import ctranslate2
+        import sentencepiece
+
+        inter_threads, intra_threads = _threads()
+        self.inter_threads = inter_threads
+        self.translator = ctranslate2.Translator(str(package.package_path / "model"), device="cpu",
+                                                 inter_threads=inter_threads, intra_threads=intra_threads)
+        self.tokenizer = sentencepiece.SentencePieceProcessor(
+            model_file=str(package.package_path / "sentencepiece.model")
+        )
+        self.target_prefix = getattr(package, "target_prefix", "") or ""
+
+    def translate(self, texts: list) -> list:
+        batch = [self.tokenizer.encode(text, out_type=str) for text in texts]
+        prefix = [[self.target_prefix]] * len(batch) if self.target_prefix else None
+        # Split into sub-batches of similar length, which run side by side on the inter_threads. Sized so
+        # every replica gets some: a 6-sentence reply with 3 replicas is 3 sub-batches of 2, not 1 of 6
+        results = self.translator.translate_batch(
+            batch,
+            target_prefix=prefix,
+            beam_size=BEAM_SIZE,
+            max_batch_size=sub_batch_size(len(batch), self.inter_threads),
+            replace_unknowns=True,
+        )
+        outputs = []
+        for result in results:
+            tokens = result.hypotheses[0]
+            if self.target_prefix and tokens[:1] == [self.target_prefix]:
+                tokens = tokens[1:]
+            outputs.append(self.tokenizer.decode(tokens))
+        return outputs
+
+
+def _installed_package(from_code, to_code):
+    import argostranslate.package
+
+    return next(
+        (p for p in argostranslate.package.get_installed_packages()
+         if p.from_code == from_code and p.to_code == to_code),
+        None,
+    )
+
+
+def get_translator(from_code: str, to_code: str):
+    """The loaded translator for a pair, or None if the package isn't a CTranslate2 + SentencePiece one."""
+    pair = (from_code, to_code)
+    if pair in _legacy_pairs:
+        return None
+    resident = residency.get_residency()
+    translator = resident.get(pair)
+    if translator is None:
+        load_language_package(from_code, to_code)
+        package = _installed_package(from_code, to_code)
+        if package is None or not (package.package_path / "sentencepiece.model").exists():
+            _legacy_pairs.add(pair)
+            return None
+        translator = resident.load(pair, lambda: _PairTranslator(package),
+                                   residency.footprint_bytes(package.package_path / "model"))
+    return translator
+
+
+def route(from_code: str, to_code: str) -> tuple:
+    """The languages a translation goes through: (from, to), or (from, en, to) if there's no package for the pair."""
+    key = (from_code, to_code)
+    hops = _routes.get(key)
+    if hops is None:
+        try:
+            load_language_package(from_code, to_code)
+            hops = key
+        except PackageNotAvailable:
+            if PIVOT in key:
+                raise
+            load_language_package(from_code, PIVOT)
+            load_language_package(PIVOT, to_code)
+            hops = (from_code, PIVOT, to_code)
+        _routes[key] = hops
+    return hops
+
+
+def has_route(from_code: str, to_code: str) -> bool:
+    """Can this pair be translated with what's installed or seeded locally? (No network.)"""
+    known = get_registry().known_pairs()
+    return (from_code, to_code) in known or {(from_code, PIVOT), (PIVOT, to_code)} <= known
+
+
+def split_sentences(text: str) -> list:
+    return [sentence for sentence in _SENTENCE_END.split(text.strip()) if sentence]
+
+
+def _translate_one_by_one(from_code, to_code, sentences) -> list:
+    # Older packages: let Argos handle the sentences, a few at a time
+    import argostranslate.translate
+
+    global _fallback_pool
+    if _fallback_pool is None:
+        with _lock:
+            if _fallback_pool is None:
+                _fallback_pool = ThreadPoolExecutor(max_workers=_threads()[0], thread_name_prefix="argos")
+    return list(_fallback_pool.map(
+        lambda sentence: argostranslate.translate.translate(sentence, from_code, to_code), sentences,
+    ))
+
+
+def _translate_pair(from_code, to_code, texts) -> list:
+    """Translates texts with one package: every sentence of every text goes into one batch."""
+    split = [split_sentences(text) for text in texts]
+    # The same sentence only needs translating once
+    sentences = list(dict.fromkeys(sentence for parts in split for sentence in parts))
+
+    translator = get_translator(from_code, to_code)
+    with metrics.span("translate_request", backend="argos", pair=f"{from_code}-{to_code}"):
+        if not sentences:
+            outputs = []
+        elif translator is None:
+            outputs = _translate_one_by_one(from_code, to_code, sentences)
+        else:
+            outputs = translator.translate(sentences)
+    metrics.count("translated_segments", len(sentences), backend="argos")
+
+    translated = dict(zip(sentences, outputs))
+    return [" ".join(translated[sentence] for sentence in parts) for parts in split]
+
+
+def _translate_hop(from_code, to_code, texts) -> list:
+    """One step of a route, through the cache."""
+    def translate_many(missing):
+        return [{"translatedText": output} for output in _translate_pair(from_code, to_code, missing)]
+
+    results = cached_batch("argos", f"{from_code}-{to_code}", texts, translate_many)
+    return [result["translatedText"] for result in results]
+
+
+@metrics.timed("translate_batch", backend="argos")
+def translate_batch(from_language: str, to_language: str, texts) -> list:
+    """Translates many texts in one batched inference per hop. Returns one result dict per text."""
+    texts = list(texts)
+    hops = route(from_language, to_language)
+    if len(hops) > 2:
+        metrics.count("pivot_translations", len(texts), backend="argos")
+    for hop_from, hop_to in zip(hops, hops[1:]):
+        texts = _translate_hop(hop_from, hop_to, texts)
+    return [{"translatedText": text} for text in texts]
+
+
+@metrics.timed("translate_text", backend="argos")
+def translate_text(from_language: str, to_language: str, text: str) -> dict:
+    """Translates text from one language to another using Argos Translate."""
+    return translate_batch(from_language, to_language, [text])[0]
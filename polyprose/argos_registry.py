@@ -0,0 +1,265 @@
+"""Local registry of Argos Translate language packages.
+
+The apps used to call update_package_index(), list every available package and
+download + reinstall the .argosmodel on *every* translation. This registry
+installs each language pair once (from a pre-seeded local folder or a mirror),
+checks the file against its sha256, and after that answers "is en->ru ready?"
+from a set in memory. No network is needed as long as the packages are seeded.
+Listing the pairs that are known (for the apps' language dropdown) only reads
+the manifest and our own records; argostranslate is imported the first time a
+pair is actually checked or installed.
+
+Settings (environment variables):
+    POLYPROSE_ARGOS_PACKAGES  folder of .argosmodel files + manifest.json
+    POLYPROSE_ARGOS_MIRROR    base URL serving the same files as the folder
+    POLYPROSE_ARGOS_OFFLINE   set to 1 to never fall back to the public index
+
+Seed a folder once with:
+    python -m polyprose.argos_registry seed path/to/packages
+"""
+import hashlib
+import json
+import shutil
+import sys
+import threading
+import time
+import zipfile
+from pathlib import Path
+
+from polyprose import config, metrics
+
+MANIFEST_NAME = "manifest.json"
+INSTALLED_NAME = "installed.json"
+
+
+class PackageNotAvailable(LookupError):
+    """Raised when no package for a language pair can be found anywhere."""
+
+
+def sha256_of(path) -> str:
+    """Returns the sha256 hex digest of a file."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def read_package_metadata(path) -> dict:
+    """Reads metadata.json out of an .argosmodel file (it's just a zip)."""
+    with zipfile.ZipFile(path) as archive:
+        name = next(n for n in archive.namelist() if n.endswith("metadata.json"))
+        return json.loads(archive.read(name))
+
+
+def seed_manifest(package_dir) -> dict:
+    """Writes manifest.json for every .argosmodel in a folder and returns it."""
+    package_dir = Path(package_dir)
+    packages = []
+    for path in sorted(package_dir.glob("*.argosmodel")):
+        metadata = read_package_metadata(path)
+        packages.append({
+            "from_code": metadata["from_code"],
+            "to_code": metadata["to_code"],
+            "version": metadata.get("package_version", ""),
+            "filename": path.name,
+            "sha256": sha256_of(path),
+        })
+    manifest = {"packages": packages}
+    (package_dir / MANIFEST_NAME).write_text(json.dumps(manifest, indent=2))
+    return manifest
+
+
+class ArgosRegistry:
+    """Keeps track of which Argos language pairs are installed and ready."""
+
+    def __init__(self, package_dir=None, mirror_url=None, state_dir=None, allow_index=True):
+        self.package_dir = Path(package_dir) if package_dir else None
+        self.mirror_url = mirror_url.rstrip("/") if mirror_url else None
+        self.state_dir = Path(state_dir) if state_dir else config.data_dir() / "argos"
+        self.allow_index = allow_index
+        self._ready = set()
+        self._installed = {}
+        self._manifest = {}
+        self._lock = threading.Lock()
+        self._pair_locks = {}
+        self._index_updated = False
+        self._scanned = False
+        self._load()
+
+    def _load(self):
+        """Reads the manifests and our record of what we installed (no network, no argostranslate)."""
+        self.state_dir.mkdir(parents=True, exist_ok=True)
+        installed_path = self.state_dir / INSTALLED_NAME
+        if installed_path.exists():
+            self._installed = json.loads(installed_path.read_text())
+
+        manifest_path = self._manifest_path()
+        if manifest_path is not None and manifest_path.exists():
+            for entry in json.loads(manifest_path.read_text())["packages"]:
+                self._manifest[(entry["from_code"], entry["to_code"])] = entry
+
+    def _scan(self):
+        """Whatever Argos has installed is ready, even if we didn't install it."""
+        if self._scanned:
+            return
+        with self._lock:
+            if self._scanned:
+                return
+            import argostranslate.package
+
+            for package in argostranslate.package.get_installed_packages():
+                self._ready.add((package.from_code, package.to_code))
+            self._scanned = True
+
+    def _manifest_path(self):
+        if self.package_dir is not None:
+            return self.package_dir / MANIFEST_NAME
+        if self.mirror_url is not None:
+            # Keep a local copy of the mirror's manifest so restarts stay offline
+            local_copy = self.state_dir / f"mirror-{MANIFEST_NAME}"
+            if not local_copy.exists():
+                import urllib.request
+                try:
+                    with urllib.request.urlopen(f"{self.mirror_url}/{MANIFEST_NAME}", timeout=10) as response:
+                        local_copy.write_bytes(response.read())
+                except OSError:
+                    return None
+            return local_copy
+        return None
+
+    def is_ready(self, from_code: str, to_code: str) -> bool:
+        """Is this language pair installed? Pure in-memory lookup (after the first call)."""
+        self._scan()
+        return (from_code, to_code) in self._ready
+
+    def ready_pairs(self) -> set:
+        """All installed (from_code, to_code) pairs."""
+        self._scan()
+        return set(self._ready)
+
+    def known_pairs(self) -> set:
+        """Pairs that we installed or can install from the local folder/mirror (no network).
+
+        Cheap enough for every rerun: packages someone installed with Argos
+        directly only count once a pair has been checked.
+        """
+        recorded = {(entry["from_code"], entry["to_code"]) for entry in self._installed.values()}
+        return self._ready | recorded | set(self._manifest)
+
+    def ensure(self, from_code: str, to_code: str):
+        """Makes sure a language pair is installed, installing it at most once."""
+        pair = (from_code, to_code)
+        if pair in self._ready:
+            return
+
+        self._scan()
+        with self._lock:
+            pair_lock = self._pair_locks.setdefault(pair, threading.Lock())
+        # Only one session installs a given pair; everyone else waits for it
+        with pair_lock:
+            if pair in self._ready:
+                return
+            with metrics.span("argos_package_install", pair=f"{from_code}-{to_code}"):
+                self._install(from_code, to_code)
+            self._ready.add(pair)
+
+    def _install(self, from_code, to_code):
+        import argostranslate.package
+
+        entry = self._manifest.get((from_code, to_code))
+        if entry is not None:
+            path = self._fetch(entry)
+            argostranslate.package.install_from_path(path)
+            self._record(from_code, to_code, entry["sha256"], str(path))
+            return
+
+        if not self.allow_index:
+            raise PackageNotAvailable(f"No Argos package for {from_code}->{to_code} in the local registry")
+
+        # Last resort: the public package index (the only step that needs the internet)
+        if not self._index_updated:
+            argostranslate.package.update_package_index()
+            self._index_updated = True
+        package = next(
+            (p for p in argostranslate.package.get_available_packages()
+             if p.from_code == from_code and p.to_code == to_code),
+            None,
+        )
+        if package is None:
+            raise PackageNotAvailable(f"Argos has no package for {from_code}->{to_code}")
+        path = package.download()
+        argostranslate.package.install_from_path(path)
+        self._record(from_code, to_code, sha256_of(path), "index")
+
+    def _fetch(self, entry) -> Path:
+        """Finds (or downloads from the mirror) a package file and checks its sha256."""
+        if self.package_dir is not None:
+            path = self.package_dir / entry["filename"]
+        else:
+            path = self.state_dir / "downloads" / entry["filename"]
+            if not path.exists():
+                import urllib.request
+                path.parent.mkdir(parents=True, exist_ok=True)
+                partial = path.with_suffix(".part")
+                with urllib.request.urlopen(f"{self.mirror_url}/{entry['filename']}", timeout=60) as response, \
+                        open(partial, "wb") as f:
+                    shutil.copyfileobj(response, f)
+                partial.replace(path)
+
+        checksum = sha256_of(path)
+        if checksum != entry["sha256"]:
+            raise ValueError(f"Checksum mismatch for {path.name}: expected {entry['sha256']}, got {checksum}")
+        return path
+
+    def _record(self, from_code, to_code, checksum, source):
+        self._installed[f"{from_code}-{to_code}"] = {
+            "from_code": from_code,
+            "to_code": to_code,
+            "sha256": checksum,
+            "source": source,
+            "installed_at": time.time(),
+        }
+        (self.state_dir / INSTALLED_NAME).write_text(json.dumps(self._installed, indent=2))
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> ArgosRegistry:
+    """The process-wide registry, shared by every Streamlit session."""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = ArgosRegistry(
+                    package_dir=config.env_str("POLYPROSE_ARGOS_PACKAGES") or None,
+                    mirror_url=config.env_str("POLYPROSE_ARGOS_MIRROR") or None,
+                    allow_index=not config.env_flag("POLYPROSE_ARGOS_OFFLINE"),
+                )
+    return _registry
+
+
+@metrics.timed("load_language_package")
+def load_language_package(from_code: str, to_code: str):
+    """Makes sure the Argos package for this pair is installed (cheap after the first time)."""
+    get_registry().ensure(from_code, to_code)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) == 2 and argv[0] == "seed":
+        manifest = seed_manifest(argv[1])
+        print(f"Wrote {MANIFEST_NAME} with {len(manifest['packages'])} packages")
+    elif argv[:1] == ["status"]:
+        for from_code, to_code in sorted(get_registry().ready_pairs()):
+            print(f"{from_code} -> {to_code}")
+    else:
+        print("usage: python -m polyprose.argos_registry seed <folder> | status")
+        return 2
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
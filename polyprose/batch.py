@@ -0,0 +1,191 @@
+"""Offline batch mode: run a JSONL file of utterances through the pipeline.
+
+For pre-generating practice dialogues or comparing backends over thousands of
+utterances, without Streamlit. Every input line is a JSON object with "lang"
+and "text" (and optionally "id"), e.g. benchmarks/corpus.jsonl. Every output
+line is the same object plus "translation", "reply" and "reply_translation",
+or "error" if that utterance couldn't be done (e.g. no Argos package for its
+language).
+
+The input is read as a stream, in chunks of --batch-size records. Chunks go
+to a pool of worker processes, each with its own BlenderBot loaded once; a
+worker runs a whole chunk through the pipeline with every stage batched
+(Pipeline.run_turns). Only a few chunks are in flight at a time and results are
+written in input order as soon as they're ready, so memory stays flat however
+big the input is.
+
+After every chunk, <output>.checkpoint records how far the output got. Run
+again with --resume after a crash (or Ctrl-C) to carry on from there.
+
+    python -m polyprose.batch corpus.jsonl results.jsonl --backend argos --workers 2 --resume
+"""
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+# Chunks queued per worker: enough to keep them busy, few enough to keep memory flat
+IN_FLIGHT_PER_WORKER = 2
+
+_pipeline = None
+
+
+def _init_worker(backend, max_length, threads):
+    """Runs once in every worker process: one Pipeline and one loaded model per worker."""
+    global _pipeline
+    # Workers get their own batches, the cross-thread batcher would only add waiting
+    os.environ["POLYPROSE_GENERATE_BATCH_SIZE"] = "1"
+    from polyprose import client, models
+    from polyprose.core import Pipeline
+
+    if threads:
+        # Otherwise every worker's torch uses every core and they fight over them
+        import torch
+        torch.set_num_threads(threads)
+    _pipeline = Pipeline(backend, max_length=max_length)
+    if client.get_client() is None:
+        # With an inference server the model lives there
+        models.get_loaded(_pipeline.model_name)
+
+
+def run_chunk(records: list) -> list:
+    """Runs one chunk of records through the pipeline, one batched pass per language."""
+    by_lang = {}
+    for i, record in enumerate(records):
+        by_lang.setdefault(record.get("lang"), []).append(i)
+
+    results = [dict(record) for record in records]
+    for lang, indexes in by_lang.items():
+        try:
+            if not lang:
+                raise ValueError("record has no \"lang\"")
+            turns = _pipeline.run_turns(lang, [records[i]["text"] for i in indexes])
+        except Exception as e:
+            for i in indexes:
+                results[i]["error"] = f"{type(e).__name__}: {e}"
+            continue
+        for i, turn in zip(indexes, turns):
+            results[i].update(translation=turn.user_translation, reply=turn.reply,
+                              reply_translation=turn.reply_translation)
+    return results
+
+
+def read_records(path, skip: int = 0):
+    """Yields the records of a JSONL file one by one, skipping blank lines and the first `skip` records."""
+    with open(path, encoding="utf-8") as f:
+        records = (json.loads(line) for line in f if line.strip())
+        yield from itertools.islice(records, skip, None)
+
+
+def chunked(records, size: int):
+    iterator = iter(records)
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
+
+
+class Checkpoint:
+    """How many records of which input are in the output, and where the output ends."""
+
+    def __init__(self, output_path):
+        self.path = Path(f"{output_path}.checkpoint")
+
+    def load(self) -> dict:
+        if not self.path.exists():
+            return {}
+        return json.loads(self.path.read_text())
+
+    def save(self, state: dict):
+        # Written to the side and renamed, so a crash never leaves half a checkpoint
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(state))
+        os.replace(tmp, self.path)
+
+    def clear(self):
+        self.path.unlink(missing_ok=True)
+
+
+def run(input_path, output_path, backend: str = "argos", workers: int = 1, batch_size: int = 16,
+        max_length: int = 100, resume: bool = False, threads_per_worker: int = None, log=sys.stderr) -> dict:
+    """Runs every record of input_path through the pipeline into output_path. Returns a summary."""
+    checkpoint = Checkpoint(output_path)
+    input_key = str(Path(input_path).resolve())
+    state = checkpoint.load() if resume else {}
+    if state and state.get("input") != input_key:
+        raise ValueError(f"{checkpoint.path} belongs to another input ({state.get('input')})")
+    if not state:
+        checkpoint.clear()
+    done = state.get("records", 0)
+    errors = state.get("errors", 0)
+
+    output = open(output_path, "r+b" if state else "wb")
+    # Anything written after the last checkpoint may be half a chunk -- it gets redone
+    output.truncate(state.get("bytes", 0))
+    output.seek(0, os.SEEK_END)
+
+    if threads_per_worker is None:
+        threads_per_worker = max((os.cpu_count() or 1) // workers, 1)
+    # spawn, not fork: torch and the HTTP clients don't survive a fork well
+    pool = ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(backend, max_length, threads_per_worker),
+    )
+    started = time.perf_counter()
+    new_records = 0
+
+    def write(results):
+        nonlocal done, errors, new_records
+        for result in results:
+            output.write((json.dumps(result, ensure_ascii=False) + "\n").encode("utf-8"))
+            errors += "error" in result
+        output.flush()
+        os.fsync(output.fileno())
+        done += len(results)
+        new_records += len(results)
+        checkpoint.save({"input": input_key, "records": done, "bytes": output.tell(), "errors": errors})
+        rate = new_records / (time.perf_counter() - started)
+        print(f"{done} records ({rate:.1f}/s, {errors} errors)", file=log)
+
+    in_flight = deque()
+    try:
+        for chunk in chunked(read_records(input_path, skip=done), batch_size):
+            in_flight.append(pool.submit(run_chunk, chunk))
+            if len(in_flight) >= workers * IN_FLIGHT_PER_WORKER:
+                # Always the oldest chunk, so the output stays in input order
+                write(in_flight.popleft().result())
+        while in_flight:
+            write(in_flight.popleft().result())
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+        output.close()
+
+    return {"records": done, "errors": errors, "seconds": round(time.perf_counter() - started, 2)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a JSONL file of utterances through the PolyProse pipeline")
+    parser.add_argument("input", help="JSONL with one {\"lang\": ..., \"text\": ...} per line")
+    parser.add_argument("output", help="JSONL results, one line per input record")
+    parser.add_argument("--backend", default="argos", choices=["argos", "google"])
+    parser.add_argument("--workers", type=int, default=1, help="worker processes (each loads its own model)")
+    parser.add_argument("--batch-size", type=int, default=16, help="records per chunk, translated and generated together")
+    parser.add_argument("--max-length", type=int, default=100)
+    parser.add_argument("--threads-per-worker", type=int, help="torch threads per worker (default: cores / workers)")
+    parser.add_argument("--resume", action="store_true", help="carry on from <output>.checkpoint")
+    args = parser.parse_args(argv)
+
+    summary = run(args.input, args.output, backend=args.backend, workers=args.workers, batch_size=args.batch_size,
+                  max_length=args.max_length, resume=args.resume, threads_per_worker=args.threads_per_worker)
+    print(json.dumps(summary))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,239 @@
+"""Cross-session micro-batching for BlenderBot generation.
+
+When several learners talk at once, every Streamlit session thread used to run
+its own model.generate and they all fought over the same CPU cores. Instead,
+requests go on a queue; a single background thread collects whatever arrives
+within a few milliseconds (up to a maximum batch size), pads it into one
+batched generate call with proper attention masks, and hands every session
+its own reply. Streaming still works: each row of the batch is fed to that
+request's own streamer.
+
+Whole replies keep BlenderBot's beam search (10 beams). transformers can't
+stream beam search, so streamed requests (only sent with
+POLYPROSE_STREAM_REPLIES=1, see polyprose.responder) are generated greedily
+(STREAM_NUM_BEAMS) in batches of their own.
+
+Settings (environment variables):
+    POLYPROSE_GENERATE_BATCH_SIZE  max requests per generate call (default 8, 1 = no batching)
+    POLYPROSE_GENERATE_WAIT_MS     how long to wait for a batch to fill up (default 5)
+"""
+import functools
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from polyprose import config, metrics
+from polyprose.context import get_builder
+from polyprose.models import DEFAULT_MODEL, get_blenderbot
+
+# Beams for streamed generation: a streamer only works with one
+STREAM_NUM_BEAMS = 1
+
+
+def _rows_per_request(rows: int, requests: int) -> int:
+    # Beam search runs requests x beams rows, each request's beams next to each other (streamed batches: 1 each)
+    return max(rows // max(requests, 1), 1)
+
+
+class _Request:
+    __slots__ = ("input_ids", "max_length", "streamer", "stop", "future", "enqueued_at")
+
+    def __init__(self, input_ids, max_length, streamer, stop):
+        self.input_ids = input_ids
+        self.max_length = max_length
+        self.streamer = streamer
+        self.stop = stop
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+class _FanOutStreamer:
+    """Splits a batched generate's token stream into one stream per request.
+
+    generate() only ever calls put() and end(), so this doesn't need to
+    subclass transformers' BaseStreamer (and this module doesn't need transformers).
+    """
+
+    def __init__(self, streamers):
+        self.streamers = streamers
+
+    def put(self, value):
+        # Streamed batches are greedy, so row i is request i
+        for index, streamer in enumerate(self.streamers):
+            if streamer is not None:
+                streamer.put(value[index:index + 1])
+
+    def end(self):
+        for streamer in self.streamers:
+            if streamer is not None:
+                streamer.end()
+
+
+@functools.lru_cache(maxsize=None)
+def _stop_on_events_class():
+    import torch
+    from transformers import StoppingCriteria
+
+    class StopOnEvents(StoppingCriteria):
+        def __init__(self, events):
+            self.events = events
+
+        def __call__(self, input_ids, scores, **kwargs):
+            stopped = torch.tensor([event is not None and event.is_set() for event in self.events],
+                                   dtype=torch.bool, device=input_ids.device)
+            # One flag per row: every beam of a stopped request stops
+            return stopped.repeat_interleave(_rows_per_request(input_ids.shape[0], len(self.events)))
+
+    return StopOnEvents
+
+
+def stop_criteria(events):
+    """Stopping criteria that finish row i of a generate call once events[i] is set.
+
+    Returns None when there's nothing to watch, so generate() keeps its defaults.
+    """
+    if all(event is None for event in events):
+        return None
+    from transformers import StoppingCriteriaList
+
+    return StoppingCriteriaList([_stop_on_events_class()(list(events))])
+
+
+class GenerateBatcher:
+    """Background scheduler that batches concurrent generate() calls for one model."""
+
+    def __init__(self, model_name: str = DEFAULT_MODEL, max_batch_size: int = 8, max_wait_seconds: float = 0.005):
+        self.model_name = model_name
+        self.max_batch_size = max_batch_size
+        self.max_wait_seconds = max_wait_seconds
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.requests = 0
+        self.queue_wait_seconds = 0.0
+
+    def submit(self, input_ids: list, max_length: int, streamer=None, stop=None) -> Future:
+        """Queues a request (already tokenized, see polyprose.context). The future resolves to the decoded reply.
+
+        Setting the stop event ends this request's row early, even mid-batch.
+        """
+        self._start()
+        request = _Request(input_ids, max_length, streamer, stop)
+        self._queue.put(request)
+        return request.future
+
+    def generate(self, input_ids: list, max_length: int) -> str:
+        return self.submit(input_ids, max_length).result()
+
+    def _start(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="generate-batcher", daemon=True)
+                    self._thread.start()
+
+    def _collect(self) -> list:
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait_seconds
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            # Requests with different max_length can't share a generate call, nor streamed and whole ones
+            groups = {}
+            for request in batch:
+                groups.setdefault((request.max_length, request.streamer is not None), []).append(request)
+            for (max_length, _), group in groups.items():
+                self._generate(group, max_length)
+
+    def _generate(self, batch, max_length):
+        # Drop anything that was cancelled while it sat in the queue
+        for request in batch:
+            stopped = request.stop is not None and request.stop.is_set() and not request.future.cancelled()
+            if stopped and request.future.cancel() and request.streamer is not None:
+                request.streamer.end()
+        batch = [request for request in batch if request.future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+
+        started = time.perf_counter()
+        self.batches += 1
+        self.requests += len(batch)
+        self.queue_wait_seconds += sum(started - request.enqueued_at for request in batch)
+        metrics.count("generate_batches")
+        metrics.count("generate_requests", len(batch))
+        for request in batch:
+            metrics.observe("generate_queue_wait", started - request.enqueued_at)
+
+        streamer = None
+        options = {}
+        if any(request.streamer is not None for request in batch):
+            streamer = _FanOutStreamer([request.streamer for request in batch])
+            options["num_beams"] = STREAM_NUM_BEAMS
+        try:
+            tokenizer, model = get_blenderbot(self.model_name)
+            # Padding + the attention_mask keep the shorter inputs from turning into nonsense; the encoder
+            # outputs come from the context builder's cache where it has them
+            inputs = get_builder(self.model_name).batch_inputs(model, [request.input_ids for request in batch])
+            with metrics.span("generate", batched="yes"):
+                reply_ids = model.generate(**inputs, max_length=max_length, streamer=streamer,
+                                           stopping_criteria=stop_criteria([request.stop for request in batch]),
+                                           **options)
+            with metrics.span("decode"):
+                replies = tokenizer.batch_decode(reply_ids, skip_special_tokens=True)
+            if metrics.enabled():
+                metrics.count("input_tokens", int(inputs["attention_mask"].sum()))
+                metrics.count("generated_tokens", int((reply_ids != tokenizer.pad_token_id).sum()))
+        except Exception as e:
+            # Fail the futures before ending the streams, so readers see the error
+            for request in batch:
+                request.future.set_exception(e)
+            if streamer is not None:
+                streamer.end()
+            return
+
+        for request, reply in zip(batch, replies):
+            request.future.set_result(reply)
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "requests": self.requests,
+            "avg_batch_size": round(self.requests / self.batches, 2) if self.batches else 0.0,
+            "avg_queue_wait_ms": round(self.queue_wait_seconds / self.requests * 1000, 2) if self.requests else 0.0,
+            "queued": self._queue.qsize(),
+        }
+
+
+_batchers = {}
+_batchers_lock = threading.Lock()
+
+
+def get_batcher(model_name: str = DEFAULT_MODEL):
+    """The shared batcher for a model, or None if batching is turned off."""
+    max_batch_size = config.env_int("POLYPROSE_GENERATE_BATCH_SIZE", 8)
+    if max_batch_size <= 1:
+        return None
+    batcher = _batchers.get(model_name)
+    if batcher is None:
+        with _batchers_lock:
+            batcher = _batchers.get(model_name)
+            if batcher is None:
+                batcher = GenerateBatcher(
+                    model_name,
+                    max_batch_size=max_batch_size,
+                    max_wait_seconds=config.env_float("POLYPROSE_GENERATE_WAIT_MS", 5.0) / 1000,
+                )
+                _batchers[model_name] = batcher
+    return batcher
@@ -0,0 +1,248 @@
+"""Two-tier memo cache for translations.
+
+The apps translate the same strings over and over: the title on every rerun and
+every history entry on every rerun. This cache sits in front of every
+translate_text variant. Lookups hit a bounded in-memory LRU first, then a
+SQLite file that survives restarts. Both tiers have a size cap and evict the
+least recently used entries.
+
+Disk writes are batched: a disk hit only notes the time it was used, and those
+times go to disk together (with the next put, or every TOUCH_EVERY hits), and
+cached_batch looks up and stores a whole batch under one lock and one commit.
+A crash loses nothing but a few last-used times, which only decide what gets
+evicted first.
+
+Settings (environment variables):
+    POLYPROSE_CACHE_PATH          SQLite file (default: <data dir>/translations.sqlite3)
+    POLYPROSE_CACHE_MEMORY_ITEMS  entries kept in memory (default 2048)
+    POLYPROSE_CACHE_DISK_ITEMS    rows kept on disk (default 100000, 0 turns the disk tier off)
+"""
+import functools
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from polyprose import config, metrics
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS translations (
+    backend TEXT NOT NULL,
+    pair TEXT NOT NULL,
+    text TEXT NOT NULL,
+    value TEXT NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (backend, pair, text)
+)
+"""
+
+
+class TranslationCache:
+    """In-memory LRU backed by an on-disk SQLite store."""
+
+    # How many disk writes between checks of the disk size cap
+    EVICT_EVERY = 256
+    # How many disk hits' last-used times are kept in memory before they're written
+    TOUCH_EVERY = 64
+
+    def __init__(self, path=None, max_memory_items=2048, max_disk_items=100_000):
+        self.max_memory_items = max_memory_items
+        self.max_disk_items = max_disk_items
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.memory_evictions = 0
+        self.disk_evictions = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes_since_evict = 0
+        self._touched = {}
+        self._db = None
+        if path is not None and max_disk_items > 0:
+            # POLYPROSE_CACHE_PATH may point somewhere that doesn't exist yet
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(path), check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(_SCHEMA)
+            self._db.commit()
+
+    def get(self, backend: str, pair: str, text: str):
+        """Returns the cached value, or None on a miss."""
+        return self.get_many(backend, pair, [text])[0]
+
+    def get_many(self, backend: str, pair: str, texts) -> list:
+        """The cached value for every text (None for each miss), in order."""
+        with self._lock:
+            results = [self._lookup((backend, pair, text)) for text in texts]
+            if len(self._touched) >= self.TOUCH_EVERY:
+                self._write_touched()
+                self._db.commit()
+        return results
+
+    def _lookup(self, key):
+        backend = key[0]
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            self.hits += 1
+            metrics.count("translation_cache_hits", backend=backend, tier="memory")
+            return self._memory[key]
+
+        if self._db is not None:
+            row = self._db.execute(
+                "SELECT value FROM translations WHERE backend = ? AND pair = ? AND text = ?", key
+            ).fetchone()
+            if row is not None:
+                # Written later, together with others (see _write_touched)
+                self._touched[key] = time.time()
+                value = json.loads(row[0])
+                self._remember(key, value)
+                self.hits += 1
+                self.disk_hits += 1
+                metrics.count("translation_cache_hits", backend=backend, tier="disk")
+                return value
+
+        self.misses += 1
+        metrics.count("translation_cache_misses", backend=backend)
+        return None
+
+    def put(self, backend: str, pair: str, text: str, value):
+        """Stores a value in both tiers."""
+        self.put_many(backend, pair, [(text, value)])
+
+    def put_many(self, backend: str, pair: str, items):
+        """Stores (text, value) pairs in both tiers, in one transaction."""
+        items = list(items)
+        with self._lock:
+            for text, value in items:
+                self._remember((backend, pair, text), value)
+            if self._db is None:
+                return
+            now = time.time()
+            self._db.executemany(
+                "INSERT OR REPLACE INTO translations VALUES (?, ?, ?, ?, ?)",
+                [(backend, pair, text, json.dumps(value), now) for text, value in items],
+            )
+            self._write_touched()
+            self._db.commit()
+            self._writes_since_evict += len(items)
+            if self._writes_since_evict >= self.EVICT_EVERY:
+                self._evict_disk()
+
+    def _write_touched(self):
+        # Called with the lock held; the caller commits
+        if self._touched:
+            self._db.executemany(
+                "UPDATE translations SET last_used = ? WHERE backend = ? AND pair = ? AND text = ?",
+                [(used, *key) for key, used in self._touched.items()],
+            )
+            self._touched.clear()
+
+    def flush(self):
+        """Writes the last-used times of recent disk hits now."""
+        with self._lock:
+            if self._db is not None and self._touched:
+                self._write_touched()
+                self._db.commit()
+
+    def _remember(self, key, value):
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+            self.memory_evictions += 1
+
+    def _evict_disk(self):
+        self._writes_since_evict = 0
+        (count,) = self._db.execute("SELECT COUNT(*) FROM translations").fetchone()
+        extra = count - self.max_disk_items
+        if extra > 0:
+            self._db.execute(
+                "DELETE FROM translations WHERE rowid IN "
+                "(SELECT rowid FROM translations ORDER BY last_used LIMIT ?)",
+                (extra,),
+            )
+            self._db.commit()
+            self.disk_evictions += extra
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._touched.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM translations")
+                self._db.commit()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "memory_evictions": self.memory_evictions,
+            "disk_evictions": self.disk_evictions,
+            "memory_items": len(self._memory),
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> TranslationCache:
+    """The process-wide translation cache."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                path = config.env_str("POLYPROSE_CACHE_PATH") or config.data_dir() / "translations.sqlite3"
+                _cache = TranslationCache(
+                    path=path,
+                    max_memory_items=config.env_int("POLYPROSE_CACHE_MEMORY_ITEMS", 2048),
+                    max_disk_items=config.env_int("POLYPROSE_CACHE_DISK_ITEMS", 100_000),
+                )
+    return _cache
+
+
+def cached_translation(backend: str):
+    """Decorator that memoizes a translate_text function.
+
+    Works for both signatures the apps use, translate_text(target, text) and
+    translate_text(from_language, to_language, text): every argument before the
+    text is a language code and becomes part of the key.
+    """
+    def decorator(translate_fn):
+        @functools.wraps(translate_fn)
+        def wrapper(*args):
+            *languages, text = args
+            if isinstance(text, bytes):
+                text = text.decode("utf-8")
+            pair = "-".join(languages)
+            cache = get_cache()
+            value = cache.get(backend, pair, text)
+            if value is None:
+                value = translate_fn(*languages, text)
+                cache.put(backend, pair, text, value)
+            return value
+        return wrapper
+    return decorator
+
+
+def cached_batch(backend: str, pair: str, texts: list, translate_many) -> list:
+    """Memoized batch translation.
+
+    Looks every text up in the cache and hands only the misses (deduplicated)
+    to translate_many(missing_texts) in a single call. Results come back in the
+    same order as texts.
+    """
+    texts = [text.decode("utf-8") if isinstance(text, bytes) else text for text in texts]
+    cache = get_cache()
+    results = cache.get_many(backend, pair, texts)
+    missing = list(dict.fromkeys(text for text, result in zip(texts, results) if result is None))
+    if missing:
+        fresh = dict(zip(missing, translate_many(missing)))
+        cache.put_many(backend, pair, fresh.items())
+        results = [fresh[text] if result is None else result for text, result in zip(texts, results)]
+    return results
@@ -0,0 +1,197 @@
+"""Thin client for the shared inference server (polyprose.server).
+
+With POLYPROSE_INFERENCE_SOCKET set, Pipeline sends Argos translations and
+BlenderBot generation to the server listening on that Unix socket instead of
+loading the models in the Streamlit process, so every app replica on the
+machine uses the same few worker processes (and the same copy of the
+weights). Google translation stays in the app: it's an HTTP call anyway.
+
+Messages are length-prefixed JSON both ways. Connections are kept open and
+reused, one call at a time each. Errors from the server come back as
+RemoteError, carrying whether resilience should retry them, open the circuit
+right away, or neither, the same as if the call had failed locally. A server
+that can't be reached is a ConnectionError (and so retried).
+
+Settings (environment variables):
+    POLYPROSE_INFERENCE_SOCKET   path of the server's socket (unset = run everything in this process)
+    POLYPROSE_INFERENCE_TIMEOUT  seconds to wait for an answer, or for the next chunk of a streamed reply (default 120)
+"""
+import json
+import os
+import socket
+import struct
+import threading
+from collections import deque
+
+from polyprose import config
+
+# Big-endian length of the JSON that follows
+_HEADER = struct.Struct(">I")
+# Idle connections kept per client
+MAX_IDLE = 8
+
+
+class RemoteError(RuntimeError):
+    """An error raised by the inference server while handling a call."""
+
+    def __init__(self, kind: str, message: str, code=None, retryable=False, permanent=False):
+        self.kind = kind
+        # HTTP-like status, when the original error had one (resilience looks at it)
+        self.code = code
+        self.retryable = retryable
+        self.permanent = permanent
+        super().__init__(f"{kind}: {message}")
+
+
+def send_message(sock, message: dict):
+    data = json.dumps(message, ensure_ascii=False).encode()
+    sock.sendall(_HEADER.pack(len(data)) + data)
+
+
+def _recv_exact(sock, size: int) -> bytes:
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1 << 20))
+        if not chunk:
+            raise ConnectionError("inference server closed the connection")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def recv_message(sock):
+    """The next message, or None if the other side closed the connection between messages."""
+    header = sock.recv(_HEADER.size, socket.MSG_WAITALL)
+    if not header:
+        return None
+    if len(header) < _HEADER.size:
+        header += _recv_exact(sock, _HEADER.size - len(header))
+    (size,) = _HEADER.unpack(header)
+    return json.loads(_recv_exact(sock, size))
+
+
+def _raise_for(message: dict):
+    error = message.get("error")
+    if error is not None:
+        raise RemoteError(error["kind"], error["message"], error.get("code"),
+                          error.get("retryable", False), error.get("permanent", False))
+
+
+class InferenceClient:
+    """Calls a polyprose.server over its Unix socket, reusing connections."""
+
+    def __init__(self, path: str, timeout: float = 120.0):
+        self.path = path
+        self.timeout = timeout
+        self._idle = deque()
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(os.path.expanduser(self.path))
+        except OSError as e:
+            sock.close()
+            # A missing socket file means the server isn't up (yet): as retryable as a refused connection
+            raise ConnectionError(f"inference server at {self.path} is unreachable: {e}") from e
+        return sock
+
+    def _checkout(self):
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        return self._connect()
+
+    def _checkin(self, sock):
+        with self._lock:
+            if len(self._idle) < MAX_IDLE:
+                self._idle.append(sock)
+                return
+        sock.close()
+
+    def call(self, op: str, **args):
+        """Sends one request and returns its result."""
+        sock = self._checkout()
+        try:
+            send_message(sock, {"op": op, **args})
+            message = recv_message(sock)
+        except OSError as e:
+            sock.close()
+            if isinstance(e, (TimeoutError, ConnectionError)):
+                raise
+            raise ConnectionError(f"inference server call failed: {e}") from e
+        if message is None:
+            sock.close()
+            # An idle connection the server dropped (e.g. a worker restarted): worth one more try
+            raise ConnectionError("inference server closed the connection")
+        self._checkin(sock)
+        _raise_for(message)
+        return message["result"]
+
+    def stream(self, op: str, **args):
+        """Sends one request and returns (chunks, close): an iterator of the streamed results and a way to stop it."""
+        sock = self._checkout()
+        try:
+            send_message(sock, {"op": op, **args})
+        except OSError as e:
+            sock.close()
+            raise ConnectionError(f"inference server call failed: {e}") from e
+        closed = threading.Event()
+
+        def close():
+            if not closed.is_set():
+                closed.set()
+                # Wakes up a reader blocked in recv; the server notices on its next write and stops generating
+                try:
+                    sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+
+        def chunks():
+            try:
+                while True:
+                    message = recv_message(sock)
+                    if message is None:
+                        if closed.is_set():
+                            sock.close()
+                            return
+                        raise ConnectionError("inference server closed the connection mid-stream")
+                    _raise_for(message)
+                    if message.get("done"):
+                        break
+                    yield message["chunk"]
+            except OSError:
+                sock.close()
+                if closed.is_set():
+                    return
+                raise
+            except BaseException:
+                sock.close()
+                raise
+            # Read to the end, so the connection can take the next call
+            self._checkin(sock)
+
+        return chunks(), close
+
+    def close(self):
+        with self._lock:
+            while self._idle:
+                self._idle.pop().close()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """The process-wide InferenceClient, or None if there's no inference server configured."""
+    global _client
+    path = config.env_str("POLYPROSE_INFERENCE_SOCKET")
+    if not path:
+        return None
+    if _client is None or _client.path != path:
+        with _client_lock:
+            if _client is None or _client.path != path:
+                _client = InferenceClient(path, config.env_float("POLYPROSE_INFERENCE_TIMEOUT", 120.0))
+    return _client
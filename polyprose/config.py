@@ -0,0 +1,43 @@
+"""Settings shared by the PolyProse helpers.
+
+Everything is read from environment variables so the Streamlit apps keep
+working with zero setup.
+"""
+import os
+from pathlib import Path
+
+
+def data_dir() -> Path:
+    """Where PolyProse keeps its local state (manifests, caches, ...)."""
+    path = Path(os.environ.get("POLYPROSE_DATA_DIR", Path.home() / ".cache" / "polyprose"))
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def env_str(name: str, default: str = "") -> str:
+    """Reads a string setting."""
+    return os.environ.get(name, default)
+
+
+def env_flag(name: str, default: bool = False) -> bool:
+    """Reads a yes/no setting (1/true/yes/on count as yes)."""
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def env_int(name: str, default: int) -> int:
+    """Reads an integer setting, falling back to the default if it's garbage."""
+    try:
+        return int(os.environ[name])
+    except (KeyError, ValueError):
+        return default
+
+
+def env_float(name: str, default: float) -> float:
+    """Reads a float setting, falling back to the default if it's garbage."""
+    try:
+        return float(os.environ[name])
+    except (KeyError, ValueError):
+        return default
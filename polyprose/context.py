@@ -0,0 +1,180 @@
+"""Multi-turn context for BlenderBot under a fixed token budget.
+
+BlenderBot used to see only the current utterance. Feeding it the whole
+conversation would make every turn more expensive than the last, so the input
+is built from the newest turns backwards until the budget is used up (the
+oldest turns drop off first), in BlenderBot's own format: turns joined by two
+spaces, the learner's turns starting with a space.
+
+Each turn is tokenized on its own and the ids are kept in an LRU, so a new
+turn only tokenizes the new text; how many turns are walked is bounded by the
+budget, not by how long the conversation is. Encoder outputs are cached by
+exact input too (the encoder is bidirectional, so a context that changed by a
+single token has to be encoded again), which saves the encoder pass whenever
+the same context comes around again, e.g. the usual opening lines. The
+cross-session batcher uses the cache too: a batch's encoder output is the
+cached outputs of its requests, padded to the longest one.
+
+Settings (environment variables):
+    POLYPROSE_CONTEXT_TOKENS         token budget for the model input (default 128, BlenderBot's limit)
+    POLYPROSE_CONTEXT_TURNS          earlier turns to consider at most (default 10, 0 = current utterance only)
+    POLYPROSE_ENCODER_CACHE_ITEMS    encoder outputs to keep per model (default 32, 0 = off)
+"""
+import threading
+from collections import OrderedDict
+
+from polyprose import config, metrics
+from polyprose.models import DEFAULT_MODEL, default_backend, get_blenderbot
+
+TOKEN_CACHE_ITEMS = 4096
+# How BlenderBot's conversational format separates turns
+SEPARATOR = "  "
+
+
+class _LRU:
+    """A small thread-safe LRU dict."""
+
+    def __init__(self, max_items: int):
+        self.max_items = max_items
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        if self.max_items <= 0:
+            return
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    def __len__(self):
+        return len(self._items)
+
+
+class ContextBuilder:
+    """Builds BlenderBot inputs from recent turns, with cached tokenizations and encoder outputs."""
+
+    def __init__(self, tokenizer, max_tokens: int = 128, max_turns: int = 10, encoder_cache_items: int = 32):
+        self.tokenizer = tokenizer
+        model_max = getattr(tokenizer, "model_max_length", max_tokens) or max_tokens
+        self.max_tokens = min(max_tokens, model_max)
+        self.max_turns = max_turns
+        self._tokens = _LRU(TOKEN_CACHE_ITEMS)
+        self._encoded = _LRU(encoder_cache_items)
+        self._separator = self._tokenize(SEPARATOR)
+
+    def _tokenize(self, text: str) -> tuple:
+        return tuple(self.tokenizer(text, add_special_tokens=False)["input_ids"])
+
+    def segment_ids(self, text: str, user: bool) -> tuple:
+        """Token ids for one turn's text, tokenized once and then cached."""
+        key = (text, user)
+        ids = self._tokens.get(key)
+        if ids is None:
+            ids = self._tokenize(" " + text if user else text)
+            self._tokens.put(key, ids)
+            metrics.count("context_tokenizations")
+        return ids
+
+    def input_ids(self, text: str, history=()) -> list:
+        """Ids for text plus as many of the latest (user, reply) pairs from history as fit the budget."""
+        budget = self.max_tokens - 1  # room for </s>
+        # The current utterance always goes in; if it's too long on its own, keep its end
+        ids = list(self.segment_ids(text, user=True)[-budget:])
+        used_turns = 0
+        if self.max_turns > 0 and history:
+            segments = []
+            length = len(ids)
+            # Newest first, so the oldest turns are the ones that don't fit
+            for user_text, reply in reversed(list(history)[-self.max_turns:]):
+                pair = self.segment_ids(user_text, True) + self._separator + self.segment_ids(reply, False) \
+                    + self._separator
+                if length + len(pair) > budget:
+                    break
+                segments.append(pair)
+                length += len(pair)
+                used_turns += 1
+            ids = [token for segment in reversed(segments) for token in segment] + ids
+        metrics.count("context_tokens", len(ids) + 1)
+        metrics.count("context_turns", used_turns)
+        return ids + [self.tokenizer.eos_token_id]
+
+    def _encoder_state(self, model, input_ids: list):
+        """The encoder's last hidden state for one input, shape (length, hidden), cached by exact input."""
+        import torch
+
+        key = tuple(input_ids)
+        state = self._encoded.get(key)
+        if state is None:
+            metrics.count("encoder_cache_misses")
+            with torch.no_grad(), metrics.span("encode"):
+                state = model.get_encoder()(input_ids=torch.tensor([input_ids]),
+                                            attention_mask=torch.ones((1, len(input_ids)), dtype=torch.long),
+                                            return_dict=True).last_hidden_state[0]
+            self._encoded.put(key, state)
+        else:
+            metrics.count("encoder_cache_hits")
+        return state
+
+    def batch_inputs(self, model, batch: list) -> dict:
+        """Keyword arguments for one model.generate() over several inputs, right-padded like tokenizer.pad."""
+        import torch
+
+        longest = max(len(input_ids) for input_ids in batch)
+        pad_id = getattr(self.tokenizer, "pad_token_id", None) or 0
+        # generate() still needs the real ids next to the encoder output: BlenderBot's
+        # encoder_no_repeat_ngram_size looks at them to keep the reply from parroting the input
+        ids = torch.full((len(batch), longest), pad_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(batch), longest), dtype=torch.long)
+        for row, input_ids in enumerate(batch):
+            ids[row, :len(input_ids)] = torch.tensor(list(input_ids), dtype=torch.long)
+            attention_mask[row, :len(input_ids)] = 1
+        if self._encoded.max_items <= 0:
+            # Encoder cache turned off: generate() runs the encoder itself
+            return {"input_ids": ids, "attention_mask": attention_mask}
+
+        from transformers.modeling_outputs import BaseModelOutput
+
+        states = [self._encoder_state(model, input_ids) for input_ids in batch]
+        # New tensors every call: generate() expands them for beam search, the cached ones stay as they are
+        hidden = states[0].new_zeros((len(states), longest, states[0].shape[-1]))
+        for row, state in enumerate(states):
+            hidden[row, :state.shape[0]] = state
+        return {"input_ids": ids, "attention_mask": attention_mask,
+                "encoder_outputs": BaseModelOutput(last_hidden_state=hidden)}
+
+    def generate_inputs(self, model, input_ids: list) -> dict:
+        """Keyword arguments for model.generate(), with the encoder output cached for this exact input."""
+        return self.batch_inputs(model, [input_ids])
+
+
+_builders = {}
+_builders_lock = threading.Lock()
+
+
+def get_builder(model_name: str = DEFAULT_MODEL) -> ContextBuilder:
+    """The shared ContextBuilder for a model (its caches are shared by every session)."""
+    # Per backend too: an int8 encoder's outputs aren't the fp32 one's
+    key = (model_name, default_backend())
+    builder = _builders.get(key)
+    if builder is None:
+        tokenizer, _ = get_blenderbot(model_name)
+        with _builders_lock:
+            builder = _builders.get(key)
+            if builder is None:
+                builder = ContextBuilder(
+                    tokenizer,
+                    max_tokens=config.env_int("POLYPROSE_CONTEXT_TOKENS", 128),
+                    max_turns=config.env_int("POLYPROSE_CONTEXT_TURNS", 10),
+                    encoder_cache_items=config.env_int("POLYPROSE_ENCODER_CACHE_ITEMS", 32),
+                )
+                _builders[key] = builder
+    return builder
@@ -0,0 +1,194 @@
+"""Conversation history for a session.
+
+History used to be a list of strings like "You: ..." / "PolyProse: ...", which
+the apps split apart and translated again on every rerun. A Turn keeps
+everything a chat exchange needs (what the user said, in which language, its
+translation, the reply and the reply's translation), computed once when the
+turn happens. Rendering history is then just reading these back.
+
+Only the latest turns stay in memory (all BlenderBot ever looks at anyway).
+Older ones are appended to a small SQLite file for the session, and the apps
+show history a page at a time, so a session's memory and a rerun's work stay
+the same however long someone practices. The file is deleted when the
+session's conversation is (and leftovers from sessions that never cleaned up
+are removed after a day).
+
+Settings (environment variables):
+    POLYPROSE_HISTORY_TURNS      turns kept in memory (default 20)
+    POLYPROSE_HISTORY_SPILL      0 to drop older turns instead of writing them to disk
+    POLYPROSE_HISTORY_PAGE_SIZE  turns per page of history in the apps (default 10)
+"""
+import sqlite3
+import threading
+import time
+import uuid
+import weakref
+from collections import deque
+from dataclasses import astuple, dataclass
+from pathlib import Path
+
+from polyprose import config
+
+# Spill files older than this belong to sessions that are long gone
+STALE_SECONDS = 24 * 60 * 60
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS turns (
+    seq INTEGER PRIMARY KEY,
+    lang TEXT NOT NULL,
+    user_text TEXT NOT NULL,
+    user_translation TEXT NOT NULL,
+    reply TEXT NOT NULL,
+    reply_translation TEXT NOT NULL
+)
+"""
+
+
+@dataclass(slots=True)
+class Turn:
+    """One exchange: the user's utterance and PolyProse's reply."""
+    lang: str
+    user_text: str
+    user_translation: str
+    reply: str = ""
+    reply_translation: str = ""
+
+
+def spill_dir() -> Path:
+    return config.data_dir() / "conversations"
+
+
+_swept = False
+
+
+def _sweep_stale(directory: Path):
+    """Removes spill files left behind by sessions that ended without cleaning up (once per process)."""
+    global _swept
+    if _swept:
+        return
+    _swept = True
+    cutoff = time.time() - STALE_SECONDS
+    for path in directory.glob("*.sqlite3"):
+        try:
+            if path.stat().st_mtime < cutoff:
+                path.unlink()
+        except OSError:
+            pass
+
+
+class TurnLog:
+    """Append-only store of one session's older turns."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._db.execute(_SCHEMA)
+        self._db.commit()
+        self._lock = threading.Lock()
+        self._count = 0
+
+    def append(self, turn: Turn):
+        with self._lock:
+            self._db.execute("INSERT INTO turns VALUES (?, ?, ?, ?, ?, ?)", (self._count, *astuple(turn)))
+            self._db.commit()
+            self._count += 1
+
+    def read(self, start: int, end: int) -> list:
+        """Turns start..end-1, oldest first."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT lang, user_text, user_translation, reply, reply_translation FROM turns "
+                "WHERE seq >= ? AND seq < ? ORDER BY seq", (start, end),
+            ).fetchall()
+        return [Turn(*row) for row in rows]
+
+    def __len__(self):
+        return self._count
+
+    def delete(self):
+        with self._lock:
+            self._db.close()
+            self.path.unlink(missing_ok=True)
+
+
+def _delete_log(log: TurnLog):
+    try:
+        log.delete()
+    except (OSError, sqlite3.Error):
+        pass
+
+
+class Conversation:
+    """A session's turns: the latest max_turns in memory, older ones spilled to disk (or dropped)."""
+
+    def __init__(self, max_turns=None, spill=None):
+        if max_turns is None:
+            max_turns = config.env_int("POLYPROSE_HISTORY_TURNS", 20)
+        if spill is None:
+            spill = config.env_flag("POLYPROSE_HISTORY_SPILL", True)
+        self.max_turns = max(max_turns, 1)
+        self.spill = spill
+        self._turns = deque()
+        self._log = None
+        self._delete_log = None
+
+    def add(self, turn: Turn) -> Turn:
+        self._turns.append(turn)
+        while len(self._turns) > self.max_turns:
+            self._evict(self._turns.popleft())
+        return turn
+
+    def _evict(self, turn: Turn):
+        if not self.spill:
+            return
+        if self._log is None:
+            directory = spill_dir()
+            _sweep_stale(directory)
+            self._log = TurnLog(directory / f"{uuid.uuid4().hex}.sqlite3")
+            # The session is gone once nothing holds its conversation anymore
+            self._delete_log = weakref.finalize(self, _delete_log, self._log)
+        self._log.append(turn)
+
+    def turns(self) -> list:
+        """The turns in memory (the latest ones), oldest first."""
+        return list(self._turns)
+
+    @property
+    def _spilled(self) -> int:
+        return len(self._log) if self._log is not None else 0
+
+    def slice(self, start: int, end: int) -> list:
+        """Turns start..end-1 of the whole conversation (0 = the first one still kept), reading disk if needed."""
+        start, end = max(start, 0), min(end, len(self))
+        spilled = self._spilled
+        older = self._log.read(start, min(end, spilled)) if start < spilled else []
+        recent = list(self._turns)[max(start - spilled, 0):max(end - spilled, 0)]
+        return older + recent
+
+    def page(self, number: int, per_page: int = None, skip_newest: int = 0) -> list:
+        """Page `number` of the history counting back from the newest (0 = the latest turns), oldest first."""
+        per_page = per_page or page_size()
+        end = len(self) - skip_newest - number * per_page
+        return self.slice(end - per_page, end) if end > 0 else []
+
+    def page_count(self, per_page: int = None, skip_newest: int = 0) -> int:
+        per_page = per_page or page_size()
+        return -(-max(len(self) - skip_newest, 0) // per_page)
+
+    def clear(self):
+        self._turns.clear()
+        if self._delete_log is not None:
+            self._delete_log()
+            self._log = self._delete_log = None
+
+    def __iter__(self):
+        return iter(self._turns)
+
+    def __len__(self):
+        """Every turn kept, in memory or on disk."""
+        return self._spilled + len(self._turns)
+
+
+def page_size() -> int:
+    return max(config.env_int("POLYPROSE_HISTORY_PAGE_SIZE", 10), 1)
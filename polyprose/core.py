@@ -0,0 +1,292 @@
+"""The PolyProse pipeline, without any UI.
+
+    utterance (lang) -> English -> BlenderBot reply -> reply translated back into lang
+
+The Streamlit apps are thin shells over a Pipeline, and scripts/benchmarks can
+use it the same way. Importing this module is cheap: transformers, torch,
+argostranslate and google.cloud are only imported the first time something is
+actually translated or generated, so a rerun (or someone only opening the
+About Me tab) doesn't pay for them.
+
+    from polyprose.core import Pipeline
+    turn = Pipeline("argos").run_turn("ru", "Привет! Как дела?")
+
+start_turn() runs the stages that don't depend on each other side by side on a
+small thread pool: the user text is translated while BlenderBot (and, for
+Argos, both translators) load, the reply starts the moment the translation is
+in, and its sentences are translated back while it's still being generated.
+CTranslate2 and torch release the GIL while they work, so threads are enough
+for a turn to take about as long as its slowest chain instead of the sum of
+every stage. A PendingTurn can be cancelled when the learner speaks again.
+
+Every translation and generation goes through polyprose.resilience: transient
+errors are retried with backoff, and a backend + language pair that keeps
+failing gets its circuit opened, so it fails fast with CircuitOpenError while
+everything else keeps working.
+
+With POLYPROSE_INFERENCE_SOCKET set, Argos translation and BlenderBot run in
+the shared inference server (polyprose.server) instead of in this process;
+see polyprose.client.
+
+Settings (environment variables):
+    POLYPROSE_PIPELINE_WORKERS  threads for running stages side by side (default 4, 0 = one after another)
+"""
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from polyprose import argos_backend, client, config, google_backend, models, resilience, responder, ui_strings
+from polyprose.conversation import Turn
+from polyprose.models import DEFAULT_MODEL
+
+BACKENDS = ("google", "argos")
+TITLE = ui_strings.STRINGS["title"]
+
+# What the apps' dropdown shows -> language code
+LANGUAGES = {"Russian": "ru", "French": "fr", "Belarusian": "be", "Polish": "pl", "Spanish": "es", "Hindi": "hi"}
+# Argos' public index has no Belarusian package (see languages() for a locally seeded one)
+ARGOS_LANGUAGES = {name: code for name, code in LANGUAGES.items() if code != "be"}
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """The shared pool for running stages side by side, or None if that's turned off."""
+    global _executor
+    workers = config.env_int("POLYPROSE_PIPELINE_WORKERS", 4)
+    if workers <= 0:
+        return None
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pipeline")
+    return _executor
+
+
+def _run_now(fn, *args) -> Future:
+    """Runs fn right here and wraps the outcome in a finished Future."""
+    future = Future()
+    future.set_running_or_notify_cancel()
+    try:
+        future.set_result(fn(*args))
+    except BaseException as e:
+        future.set_exception(e)
+    return future
+
+
+def _pairs(turns) -> list:
+    # BlenderBot only ever sees English: what the learner said (translated) and what it answered
+    return [(turn.user_translation, turn.reply) for turn in turns]
+
+
+def languages(backend: str) -> dict:
+    """The languages a translation backend can be practiced in."""
+    if backend != "argos":
+        return LANGUAGES
+    # Any other language works with Argos as soon as packages to and from English are seeded
+    return {name: code for name, code in LANGUAGES.items()
+            if code in ARGOS_LANGUAGES.values()
+            or (argos_backend.has_route(code, "en") and argos_backend.has_route("en", code))}
+
+
+class Pipeline:
+    """Translate in, respond, translate out -- with one translation backend.
+
+    For Google, any extra keyword arguments (e.g. credentials=...) are passed
+    on to the translate client.
+    """
+
+    def __init__(self, backend: str = "google", max_length: int = responder.MAX_LENGTH,
+                 model_name: str = DEFAULT_MODEL, **client_kwargs):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown translation backend {backend!r}, expected one of {BACKENDS}")
+        self.backend = backend
+        self.max_length = max_length
+        self.model_name = model_name
+        if backend == "google":
+            # Only rebuilds the client pool if the arguments changed, so this is fine on every rerun
+            google_backend.configure(**client_kwargs)
+
+    @property
+    def languages(self) -> dict:
+        return languages(self.backend)
+
+    def translate(self, from_language: str, to_language: str, text: str) -> str:
+        """Translates text and returns just the translated string."""
+        return resilience.call(self.backend, f"{from_language}-{to_language}", self._translate,
+                               from_language, to_language, text)
+
+    def _translate(self, from_language, to_language, text):
+        if self.backend == "google":
+            # Google detects the source language by itself
+            return google_backend.translate_text(to_language, text)["translatedText"]
+        inference = client.get_client()
+        if inference is not None:
+            return inference.call("translate", from_language=from_language, to_language=to_language, text=text)
+        return argos_backend.translate_text(from_language, to_language, text)["translatedText"]
+
+    def translate_batch(self, from_language: str, to_language: str, texts) -> list:
+        """Translates many texts in one batched call."""
+        return resilience.call(self.backend, f"{from_language}-{to_language}", self._translate_batch,
+                               from_language, to_language, list(texts))
+
+    def _translate_batch(self, from_language, to_language, texts):
+        inference = client.get_client()
+        if self.backend != "google" and inference is not None:
+            return inference.call("translate_batch", from_language=from_language, to_language=to_language,
+                                  texts=texts)
+        if self.backend == "google":
+            results = google_backend.translate_batch(None, to_language, texts)
+        else:
+            results = argos_backend.translate_batch(from_language, to_language, texts)
+        return [result["translatedText"] for result in results]
+
+    def ui_string(self, lang: str, key: str) -> str:
+        """A fixed UI string in lang: from the pre-built catalog, or translated live if it isn't there."""
+        if lang == "en":
+            return ui_strings.STRINGS[key]
+        text = ui_strings.lookup(self.backend, lang, key)
+        if text is None:
+            text = self.translate("en", lang, ui_strings.STRINGS[key])
+        return text
+
+    def title(self, lang: str) -> str:
+        """The app's tagline in the language being practiced."""
+        return self.ui_string(lang, "title")
+
+    def respond(self, english_text: str, history=()) -> str:
+        """BlenderBot's whole reply (in English). history: the earlier Turns, oldest first."""
+        return resilience.call("responder", self.model_name, self._respond, english_text, _pairs(history))
+
+    def _respond(self, english_text, pairs):
+        inference = client.get_client()
+        if inference is not None:
+            return inference.call("generate", text=english_text, max_length=self.max_length,
+                                  model_name=self.model_name, history=pairs)
+        return responder.generate_reply(english_text, self.max_length, self.model_name, pairs)
+
+    def stream_respond(self, english_text: str, lang: str, history=()) -> responder.StreamedReply:
+        """BlenderBot's reply as it's generated, each finished sentence translated into lang."""
+        return resilience.call_stream("responder", self.model_name, self._stream_respond, english_text,
+                               lambda sentence: self.translate("en", lang, sentence), _pairs(history))
+
+    def _stream_respond(self, english_text, translate_fn, pairs):
+        inference = client.get_client()
+        if inference is None:
+            return responder.stream_reply(english_text, translate_fn, self.max_length, self.model_name, pairs)
+        chunks, close = inference.stream("stream", text=english_text, max_length=self.max_length,
+                                         model_name=self.model_name, history=pairs)
+        reply = responder.StreamedReply(chunks, translate_fn)
+        reply.on_cancel(close)
+        return reply
+
+    def run_turn(self, lang: str, text: str, history=()) -> Turn:
+        """One whole exchange, start to finish, one stage after another."""
+        translation = self.translate(lang, "en", text)
+        reply = self.respond(translation, history)
+        return Turn(lang, text, translation, reply, self.translate("en", lang, reply))
+
+    def run_turns(self, lang: str, texts) -> list:
+        """Many exchanges in one language, each stage batched across all of them."""
+        texts = list(texts)
+        translations = self.translate_batch(lang, "en", texts)
+        replies = resilience.call("responder", self.model_name, self._respond_batch, translations)
+        reply_translations = self.translate_batch("en", lang, replies)
+        return [Turn(lang, *fields) for fields in zip(texts, translations, replies, reply_translations)]
+
+    def _respond_batch(self, english_texts):
+        inference = client.get_client()
+        if inference is not None:
+            return inference.call("generate_batch", texts=english_texts, max_length=self.max_length,
+                                  model_name=self.model_name)
+        return responder.generate_replies(english_texts, self.max_length, self.model_name)
+
+    def submit(self, fn, *args) -> Future:
+        """Runs fn in the background (or right away when the pool is turned off)."""
+        executor = get_executor()
+        if executor is None:
+            return _run_now(fn, *args)
+        return executor.submit(fn, *args)
+
+    def prepare(self, lang: str) -> list:
+        """Starts loading everything a turn in lang will need, without waiting for it."""
+        inference = client.get_client()
+        if inference is not None:
+            # Loaded (and kept) by the inference server, not here
+            return [self.submit(lambda: inference.call("prepare", backend=self.backend, lang=lang,
+                                                       model_name=self.model_name))]
+        futures = [self.submit(models.get_loaded, self.model_name)]
+        if self.backend == "argos":
+            futures.append(self.submit(argos_backend.get_translator, lang, "en"))
+            futures.append(self.submit(argos_backend.get_translator, "en", lang))
+        return futures
+
+    def start_turn(self, lang: str, text: str, history=()) -> "PendingTurn":
+        """Starts an exchange with every independent stage running at once."""
+        return PendingTurn(self, lang, text, history)
+
+
+class PendingTurn:
+    """An exchange that is still running.
+
+    user_translation() and reply() wait for their stage only; cancel() stops
+    whatever hasn't finished yet (e.g. because the learner already said
+    something else).
+    """
+
+    def __init__(self, pipeline: Pipeline, lang: str, text: str, history=()):
+        self.pipeline = pipeline
+        self.lang = lang
+        self.text = text
+        # A copy: the caller's conversation may grow while this turn is still running
+        self.history = list(history)
+        self._cancelled = False
+        self._reply = Future()
+        # The translation goes in the queue first: it's on the critical path, the loads below aren't always
+        self._translation = pipeline.submit(pipeline.translate, lang, "en", text)
+        # The model load doesn't need the translation, so it runs next to it
+        self._warm = pipeline.prepare(lang)
+        self._translation.add_done_callback(self._start_reply)
+
+    def _start_reply(self, translation):
+        if not self._reply.set_running_or_notify_cancel():
+            return
+        try:
+            reply = self.pipeline.stream_respond(translation.result(), self.lang, self.history)
+        except BaseException as e:
+            self._reply.set_exception(e)
+            return
+        self._reply.set_result(reply)
+        if self._cancelled:
+            # cancel() came in while the reply was starting
+            reply.cancel()
+
+    def user_translation(self, timeout: float = None) -> str:
+        """The learner's words in English."""
+        return self._translation.result(timeout)
+
+    def reply(self, timeout: float = None) -> responder.StreamedReply:
+        """BlenderBot's reply, as soon as it has started streaming."""
+        return self._reply.result(timeout)
+
+    def result(self) -> Turn:
+        """Waits for the whole exchange."""
+        reply = self.reply()
+        for _ in reply:
+            pass
+        return Turn(self.lang, self.text, self.user_translation(), reply.text, reply.translation())
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled
+
+    def cancel(self):
+        self._cancelled = True
+        # The reply first: cancelling the translation runs _start_reply right away
+        if not self._reply.cancel() and self._reply.done() and self._reply.exception() is None:
+            self._reply.result().cancel()
+        self._translation.cancel()
+        for future in self._warm:
+            # A model or translator that is already loading finishes anyway; the next turn needs it too
+            future.cancel()
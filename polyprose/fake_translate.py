@@ -0,0 +1,109 @@
+"""A local stand-in for the Google Translate v2 HTTP API.
+
+It answers the same POST /language/translate/v2 requests the real service does
+(the translate_v2 client talks to it unchanged), with fake but deterministic
+translations: "[ru] hello". Handy for tests and benchmarks with no network
+and no credentials. Point the Google backend at it with
+    POLYPROSE_GOOGLE_ENDPOINT=http://127.0.0.1:8765
+
+Run it with:
+    python -m polyprose.fake_translate --port 8765 --latency-ms 40
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+def fake_translation(text: str, target: str) -> str:
+    return f"[{target}] {text}"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # HTTP/1.1 so clients can keep their connections alive like with the real API
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        if not urlparse(self.path).path.startswith("/language/translate/v2"):
+            self._reply(404, {"error": {"code": 404, "message": "Not found"}})
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length)
+        if self.headers.get("Content-Type", "").startswith("application/json"):
+            params = json.loads(body or b"{}")
+        else:
+            params = {k: v if k == "q" else v[0] for k, v in parse_qs(body.decode()).items()}
+
+        texts = params.get("q", [])
+        if isinstance(texts, str):
+            texts = [texts]
+        target = params.get("target", "en")
+        source = params.get("source")
+
+        server = self.server
+        with server.stats_lock:
+            server.requests += 1
+            server.segments += len(texts)
+        if server.latency_seconds:
+            time.sleep(server.latency_seconds)
+
+        translations = []
+        for text in texts:
+            translation = {"translatedText": fake_translation(text, target)}
+            if not source:
+                translation["detectedSourceLanguage"] = "und"
+            translations.append(translation)
+        self._reply(200, {"data": {"translations": translations}})
+
+    def _reply(self, status, payload):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=UTF-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeTranslateServer(ThreadingHTTPServer):
+    """Threaded fake Translate v2 server that counts the requests it gets."""
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=0, latency_ms=0.0):
+        super().__init__((host, port), _Handler)
+        self.latency_seconds = latency_ms / 1000
+        self.requests = 0
+        self.segments = 0
+        self.stats_lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """Serves in a background thread and returns the server."""
+        threading.Thread(target=self.serve_forever, name="fake-translate", daemon=True).start()
+        return self
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="pretend network + API time per request")
+    args = parser.parse_args(argv)
+    server = FakeTranslateServer(args.host, args.port, args.latency_ms)
+    print(f"Fake Translate v2 listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
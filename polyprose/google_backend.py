@@ -0,0 +1,217 @@
+"""Google Translate (v2) backend used by app.py and streamlit_app.py.
+
+Clients are long-lived and pooled: each translate.Client keeps its own HTTP
+session, so connections stay alive between calls instead of every translation
+paying for a new client and a new HTTPS handshake. Concurrent translate_text
+calls for the same language pair are coalesced into one bulk request.
+
+Settings (environment variables):
+    POLYPROSE_GOOGLE_POOL_SIZE    number of pooled clients (default 4)
+    POLYPROSE_GOOGLE_COALESCE_MS  how long to wait for other calls to join a bulk request (default 5, 0 = off)
+    POLYPROSE_GOOGLE_ENDPOINT     talk to another server instead, e.g. the local stand-in
+                                  (python -m polyprose.fake_translate)
+"""
+import threading
+import time
+from concurrent.futures import Future, wait
+from contextlib import contextmanager
+
+from polyprose import config, metrics
+from polyprose.cache import cached_batch, cached_translation
+
+# The v2 API takes at most 128 strings per request
+MAX_SEGMENTS = 128
+
+_client_kwargs = {}
+
+
+def configure(**client_kwargs):
+    """Sets the arguments google.cloud translate.Client is built with (e.g. credentials=...).
+
+    The apps call this on every rerun, so the pool is only rebuilt when the
+    arguments actually change.
+    """
+    global _pool
+    if client_kwargs == _client_kwargs:
+        return
+    _client_kwargs.clear()
+    _client_kwargs.update(client_kwargs)
+    _pool = None
+
+
+def _new_client():
+    # Imported here so importing this module (or configure()) doesn't load google.cloud
+    from google.cloud import translate_v2 as translate
+
+    kwargs = dict(_client_kwargs)
+    endpoint = config.env_str("POLYPROSE_GOOGLE_ENDPOINT")
+    if endpoint:
+        from google.auth.credentials import AnonymousCredentials
+        kwargs["credentials"] = AnonymousCredentials()
+        kwargs["client_options"] = {"api_endpoint": endpoint}
+    return translate.Client(**kwargs)
+
+
+class ClientPool:
+    """A fixed set of long-lived clients, each used by one thread at a time."""
+
+    def __init__(self, size: int, factory=_new_client):
+        self.size = size
+        self._factory = factory
+        self._idle = []
+        self._created = 0
+        self._available = threading.Condition()
+
+    @contextmanager
+    def client(self):
+        with metrics.span("client_pool_wait", backend="google"):
+            client = self._checkout()
+        try:
+            yield client
+        finally:
+            with self._available:
+                self._idle.append(client)
+                self._available.notify()
+
+    def _checkout(self):
+        # Clients are created lazily, up to size; after that we wait for one to come back
+        with self._available:
+            while not self._idle and self._created >= self.size:
+                self._available.wait()
+            if self._idle:
+                return self._idle.pop()
+            self._created += 1
+        try:
+            return self._factory()
+        except BaseException:
+            # Give the slot back (bad credentials, say), or the pool runs dry and everyone waits forever
+            with self._available:
+                self._created -= 1
+                self._available.notify()
+            raise
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ClientPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ClientPool(config.env_int("POLYPROSE_GOOGLE_POOL_SIZE", 4))
+    return _pool
+
+
+def _bulk_translate(from_language, to_language, texts) -> list:
+    """Translates a list of texts, one request per 128 of them."""
+    results = []
+    with get_pool().client() as client:
+        for start in range(0, len(texts), MAX_SEGMENTS):
+            chunk = texts[start:start + MAX_SEGMENTS]
+            with metrics.span("translate_request", backend="google"):
+                results.extend(client.translate(chunk, target_language=to_language, source_language=from_language))
+            metrics.count("translated_segments", len(chunk), backend="google")
+    return results
+
+
+class Coalescer:
+    """Merges translate calls that arrive within a few milliseconds into one bulk request.
+
+    The first caller for a language pair waits wait_seconds for others to join,
+    then sends everyone's texts together. A bucket that fills up to max_segments
+    is sent right away by whoever filled it.
+    """
+
+    def __init__(self, wait_seconds: float, max_segments: int = MAX_SEGMENTS, send=_bulk_translate):
+        self.wait_seconds = wait_seconds
+        self.max_segments = max_segments
+        self._send = send
+        self._pending = {}
+        self._lock = threading.Lock()
+        self.requests_sent = 0
+        self.texts_sent = 0
+
+    def translate(self, from_language, to_language: str, text: str) -> dict:
+        key = (from_language, to_language)
+        future = Future()
+        with self._lock:
+            bucket = self._pending.setdefault(key, [])
+            bucket.append((text, future))
+            leader = len(bucket) == 1
+            full = len(bucket) >= self.max_segments
+            if full:
+                del self._pending[key]
+
+        if full:
+            self._flush(key, bucket)
+        elif leader:
+            started = time.perf_counter()
+            # Done early if whoever filled the bucket has already sent it
+            wait([future], self.wait_seconds)
+            metrics.observe("coalesce_wait", time.perf_counter() - started, backend="google")
+            with self._lock:
+                # Someone else may have already sent our bucket because it filled up
+                bucket = self._pending.get(key)
+                if bucket and bucket[0][1] is future:
+                    del self._pending[key]
+                else:
+                    bucket = None
+            if bucket:
+                self._flush(key, bucket)
+        return future.result()
+
+    def _flush(self, key, bucket):
+        unique = list(dict.fromkeys(text for text, _ in bucket))
+        try:
+            results = dict(zip(unique, self._send(key[0], key[1], unique)))
+        except Exception as e:
+            for _, future in bucket:
+                future.set_exception(e)
+            return
+        self.requests_sent += 1
+        self.texts_sent += len(unique)
+        for text, future in bucket:
+            future.set_result(results[text])
+
+
+_coalescer = None
+
+
+def get_coalescer():
+    """The process-wide coalescer, or None if coalescing is turned off."""
+    global _coalescer
+    wait_ms = config.env_float("POLYPROSE_GOOGLE_COALESCE_MS", 5.0)
+    if wait_ms <= 0:
+        return None
+    if _coalescer is None:
+        with _pool_lock:
+            if _coalescer is None:
+                _coalescer = Coalescer(wait_ms / 1000)
+    return _coalescer
+
+
+@metrics.timed("translate_text", backend="google")
+@cached_translation("google")
+def translate_text(target: str, text: str) -> dict:
+    """Translates text into the target language."""
+    coalescer = get_coalescer()
+    if coalescer is None:
+        return _bulk_translate(None, target, [text])[0]
+    return coalescer.translate(None, target, text)
+
+
+@metrics.timed("translate_batch", backend="google")
+def translate_batch(from_language, to_language: str, texts) -> list:
+    """Translates many texts at once, one request per 128 of them.
+
+    from_language can be None to let Google detect it (like translate_text does).
+    Returns one result dict per text, in order.
+    """
+    # Same cache key as translate_text when the source is auto-detected
+    pair = to_language if from_language is None else f"{from_language}-{to_language}"
+    return cached_batch(
+        "google", pair, list(texts),
+        lambda missing: _bulk_translate(from_language, to_language, missing),
+    )
@@ -0,0 +1,327 @@
+"""Lightweight tracing and metrics for the PolyProse hot path.
+
+Spans time a stage (translation, package install, model load, generate,
+decode, ...), counters count things (cache hits, tokens, requests), gauges
+hold a current level (memory used by resident models). Everything
+ends up in an in-process registry that can be shown in the apps' debug
+sidebar or exported in the Prometheus text format, either as a file (for the
+node_exporter textfile collector) or from a tiny local HTTP endpoint.
+
+It's all off unless POLYPROSE_METRICS=1; when off, span() hands back a shared
+no-op object and count()/observe() return right away.
+
+Settings (environment variables):
+    POLYPROSE_METRICS               1 to turn metrics on
+    POLYPROSE_METRICS_PORT          serve /metrics on this localhost port
+    POLYPROSE_METRICS_FILE          write the Prometheus text to this file ...
+    POLYPROSE_METRICS_FILE_SECONDS  ... every this many seconds (default 15)
+
+Usage:
+    with metrics.span("generate", backend="fp32"):
+        ...
+    metrics.count("translation_cache_hits", tier="memory")
+"""
+import functools
+import os
+import threading
+import time
+from collections import deque
+
+from polyprose import config
+
+PREFIX = "polyprose_"
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_enabled = False
+_lock = threading.Lock()
+_histograms = {}
+_counters = {}
+_gauges = {}
+_recent = deque(maxlen=50)
+_exporters_started = False
+
+
+class _Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+class _Span:
+    __slots__ = ("name", "labels", "start")
+
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self.start
+        labels = self.labels
+        if exc_type is not None:
+            labels = {**labels, "error": exc_type.__name__}
+        observe(self.name, seconds, **labels)
+        _recent.append((time.time(), self.name, labels, seconds))
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def enable():
+    """Turns metrics on (and starts the exporters configured in the environment)."""
+    global _enabled
+    _enabled = True
+    _start_exporters()
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def span(name: str, **labels):
+    """Context manager timing a stage into the <name>_seconds histogram."""
+    if not _enabled:
+        return _NOOP
+    return _Span(name, labels)
+
+
+def timed(name: str, **labels):
+    """Decorator version of span()."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with _Span(name, labels):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def observe(name: str, seconds: float, **labels):
+    """Records a duration (e.g. a queue wait) into the <name>_seconds histogram."""
+    if not _enabled:
+        return
+    key = _key(name, labels)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = _Histogram()
+        histogram.observe(seconds)
+
+
+def count(name: str, value: float = 1, **labels):
+    """Adds to the <name>_total counter."""
+    if not _enabled:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def gauge(name: str, value: float, **labels):
+    """Sets the <name> gauge to its current value."""
+    if not _enabled:
+        return
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+        _gauges.clear()
+        _recent.clear()
+
+
+def snapshot() -> dict:
+    """Plain-dict view of everything recorded so far (used by the debug sidebar)."""
+    with _lock:
+        timings = {
+            _label_text(name, labels): {
+                "count": h.count,
+                "mean_ms": round(h.sum / h.count * 1000, 2) if h.count else 0.0,
+                "total_s": round(h.sum, 3),
+            }
+            for (name, labels), h in sorted(_histograms.items())
+        }
+        counters = {_label_text(name, labels): value for (name, labels), value in sorted(_counters.items())}
+        gauges = {_label_text(name, labels): value for (name, labels), value in sorted(_gauges.items())}
+        recent = [
+            {"span": _label_text(name, tuple(sorted(labels.items()))), "ms": round(seconds * 1000, 2)}
+            for _, name, labels, seconds in reversed(_recent)
+        ]
+    return {"timings": timings, "counters": counters, "gauges": gauges, "recent": recent}
+
+
+def _label_text(name, labels):
+    if not labels:
+        return name
+    return name + "{" + ",".join(f"{k}={v}" for k, v in labels) + "}"
+
+
+def _prom_labels(labels, extra=()):
+    items = list(labels) + list(extra)
+    if not items:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in items)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(items, escaped)) + "}"
+
+
+def render_prometheus() -> str:
+    """Everything recorded so far in the Prometheus text exposition format."""
+    lines = []
+    with _lock:
+        by_name = {}
+        for (name, labels), h in _histograms.items():
+            by_name.setdefault(name, []).append((labels, h))
+        for name in sorted(by_name):
+            metric = f"{PREFIX}{name}_seconds"
+            lines.append(f"# TYPE {metric} histogram")
+            for labels, h in by_name[name]:
+                cumulative = 0
+                for bound, bucket_count in zip(BUCKETS, h.counts):
+                    cumulative += bucket_count
+                    lines.append(f"{metric}_bucket{_prom_labels(labels, [('le', repr(bound))])} {cumulative}")
+                lines.append(f"{metric}_bucket{_prom_labels(labels, [('le', '+Inf')])} {h.count}")
+                lines.append(f"{metric}_sum{_prom_labels(labels)} {h.sum}")
+                lines.append(f"{metric}_count{_prom_labels(labels)} {h.count}")
+
+        by_name = {}
+        for (name, labels), value in _counters.items():
+            by_name.setdefault(name, []).append((labels, value))
+        for name in sorted(by_name):
+            metric = f"{PREFIX}{name}_total"
+            lines.append(f"# TYPE {metric} counter")
+            for labels, value in by_name[name]:
+                lines.append(f"{metric}{_prom_labels(labels)} {value}")
+
+        by_name = {}
+        for (name, labels), value in _gauges.items():
+            by_name.setdefault(name, []).append((labels, value))
+        for name in sorted(by_name):
+            metric = f"{PREFIX}{name}"
+            lines.append(f"# TYPE {metric} gauge")
+            for labels, value in by_name[name]:
+                lines.append(f"{metric}{_prom_labels(labels)} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def write_textfile(path):
+    """Writes the Prometheus text to a file atomically."""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        f.write(render_prometheus())
+    os.replace(tmp, path)
+
+
+def serve(port: int, host: str = "127.0.0.1"):
+    """Serves /metrics from a background thread and returns the server."""
+    # http.server is slow to import and most processes never export, so it's only imported here
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = render_prometheus().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+def _start_exporters():
+    global _exporters_started
+    with _lock:
+        if _exporters_started:
+            return
+        _exporters_started = True
+
+    port = config.env_int("POLYPROSE_METRICS_PORT", 0)
+    if port:
+        try:
+            serve(port)
+        except OSError:
+            # Another server process on this box already has the port
+            pass
+
+    path = config.env_str("POLYPROSE_METRICS_FILE")
+    if path:
+        interval = config.env_float("POLYPROSE_METRICS_FILE_SECONDS", 15.0)
+
+        def write_forever():
+            while True:
+                time.sleep(interval)
+                write_textfile(path)
+
+        threading.Thread(target=write_forever, name="metrics-textfile", daemon=True).start()
+
+
+def debug_sidebar():
+    """Shows the metrics in the Streamlit sidebar (only when metrics are on)."""
+    if not _enabled:
+        return
+    import streamlit as st
+
+    data = snapshot()
+    with st.sidebar.expander("Debug: timings", expanded=False):
+        st.dataframe(
+            [{"stage": stage, **values} for stage, values in data["timings"].items()],
+            use_container_width=True,
+        )
+        st.write("Counters")
+        st.json(data["counters"], expanded=False)
+        st.write("Gauges")
+        st.json(data["gauges"], expanded=False)
+        st.write("Recent spans")
+        st.dataframe(data["recent"], use_container_width=True)
+
+
+if config.env_flag("POLYPROSE_METRICS"):
+    enable()
@@ -0,0 +1,218 @@
+"""Process-wide registry for the BlenderBot responder.
+
+Loading facebook/blenderbot-400M-distill takes tens of seconds, and the apps
+used to do it on every utterance. Here every (tokenizer, model) pair is loaded
+once per process and shared by all Streamlit sessions (imported modules live
+for the whole server, unlike the app scripts that rerun on each interaction).
+
+Set POLYPROSE_WARM_MODELS=1 to start loading the default model in the
+background as soon as this module is imported, or run
+    python -m polyprose.models
+to load it once and print how long it took and how much memory it uses.
+
+POLYPROSE_RESPONDER_BACKEND picks how the model runs on CPU:
+    fp32  the plain PyTorch model (default)
+    int8  PyTorch with the Linear layers dynamically quantized to int8
+    onnx  an exported ONNX Runtime graph with cached decoder past states
+          (needs `pip install optimum[onnxruntime]`; exported once to the data dir)
+benchmarks/responder_modes.py checks the modes against fp32 and compares speed and memory.
+
+If `python -m polyprose.snapshot write` has saved a local snapshot of the model,
+fp32 and int8 load from it instead of the hub: no lookups, and the weights are
+memory-mapped, so a (re)load is quick and processes on one machine share them.
+
+transformers (and torch) are only imported when a model is actually loaded.
+"""
+import json
+import os
+import sys
+import threading
+import time
+from dataclasses import dataclass
+
+from polyprose import config, metrics, snapshot
+
+DEFAULT_MODEL = "facebook/blenderbot-400M-distill"
+BACKENDS = ("fp32", "int8", "onnx")
+
+
+@dataclass
+class LoadedModel:
+    """A loaded (tokenizer, model) pair plus what it cost to load."""
+    name: str
+    backend: str
+    tokenizer: object
+    model: object
+    load_seconds: float
+    rss_bytes: int
+
+    def stats(self) -> dict:
+        return {
+            "name": self.name,
+            "backend": self.backend,
+            "load_seconds": round(self.load_seconds, 3),
+            "rss_delta_mb": round(self.rss_bytes / 2 ** 20, 1),
+        }
+
+
+_models = {}
+_lock = threading.Lock()
+_model_locks = {}
+
+
+def current_rss_bytes() -> int:
+    """Resident memory of this process right now."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        pass
+    try:
+        # Unix only, so not imported at the top: the apps import this module on Windows too
+        import resource
+    except ImportError:
+        return _windows_rss_bytes()
+    # No /proc (macOS) -- peak RSS is the best we can do
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _windows_rss_bytes() -> int:
+    """Working set size on Windows (0 if it can't be read)."""
+    import ctypes
+    from ctypes import wintypes
+
+    class Counters(ctypes.Structure):
+        _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                    ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                    ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                    ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t), ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                    ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+
+    counters = Counters()
+    counters.cb = ctypes.sizeof(Counters)
+    try:
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+            return counters.WorkingSetSize
+    except (AttributeError, OSError):
+        pass
+    return 0
+
+
+def default_backend() -> str:
+    return config.env_str("POLYPROSE_RESPONDER_BACKEND", "fp32")
+
+
+def _load_onnx(model_name: str):
+    try:
+        from optimum.onnxruntime import ORTModelForSeq2SeqLM
+    except ImportError as e:
+        raise ImportError("The onnx responder backend needs `pip install optimum[onnxruntime]`") from e
+
+    export_dir = config.data_dir() / "onnx" / model_name.replace("/", "--")
+    if export_dir.exists():
+        return ORTModelForSeq2SeqLM.from_pretrained(export_dir, use_cache=True)
+    # First time only: export to ONNX (with the decoder past key/values) and keep it
+    model = ORTModelForSeq2SeqLM.from_pretrained(model_name, export=True, use_cache=True)
+    model.save_pretrained(export_dir)
+    return model
+
+
+def _load_model(model_name: str, backend: str, snapshot_path=None):
+    if backend == "onnx":
+        return _load_onnx(model_name)
+
+    if snapshot_path is not None:
+        model = snapshot.load_model(snapshot_path)
+    else:
+        from transformers import BlenderbotForConditionalGeneration
+
+        model = BlenderbotForConditionalGeneration.from_pretrained(model_name)
+    model.eval()
+    if backend == "int8":
+        import torch
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    elif backend != "fp32":
+        raise ValueError(f"Unknown responder backend {backend!r}, expected one of {BACKENDS}")
+    return model
+
+
+def _load(model_name: str, backend: str) -> LoadedModel:
+    from transformers import BlenderbotTokenizer
+
+    snapshot_path = snapshot.find(model_name) if backend != "onnx" else None
+    rss_before = current_rss_bytes()
+    start = time.perf_counter()
+    with metrics.span("model_load", model=model_name, backend=backend,
+                      source="snapshot" if snapshot_path is not None else "hub"):
+        if snapshot_path is not None:
+            tokenizer = snapshot.load_tokenizer(snapshot_path)
+        else:
+            tokenizer = BlenderbotTokenizer.from_pretrained(model_name)
+        model = _load_model(model_name, backend, snapshot_path)
+    return LoadedModel(
+        name=model_name,
+        backend=backend,
+        tokenizer=tokenizer,
+        model=model,
+        load_seconds=time.perf_counter() - start,
+        rss_bytes=max(current_rss_bytes() - rss_before, 0),
+    )
+
+
+def get_loaded(model_name: str = DEFAULT_MODEL, backend: str = None) -> LoadedModel:
+    """Returns the LoadedModel for a name (and backend), loading it the first time only."""
+    key = (model_name, backend or default_backend())
+    loaded = _models.get(key)
+    if loaded is not None:
+        return loaded
+
+    with _lock:
+        model_lock = _model_locks.setdefault(key, threading.Lock())
+    # Sessions asking for the same model at once wait for a single load
+    with model_lock:
+        loaded = _models.get(key)
+        if loaded is None:
+            loaded = _load(*key)
+            _models[key] = loaded
+    return loaded
+
+
+def get_blenderbot(model_name: str = DEFAULT_MODEL, backend: str = None):
+    """Returns the shared (tokenizer, model) pair for BlenderBot."""
+    loaded = get_loaded(model_name, backend)
+    return loaded.tokenizer, loaded.model
+
+
+def is_loaded(model_name: str = DEFAULT_MODEL, backend: str = None) -> bool:
+    return (model_name, backend or default_backend()) in _models
+
+
+def unload(model_name: str = DEFAULT_MODEL, backend: str = None):
+    """Drops a model from the registry (the memory goes once nobody else holds it)."""
+    _models.pop((model_name, backend or default_backend()), None)
+
+
+def load_stats() -> list:
+    """Load time and memory for every model loaded in this process."""
+    return [loaded.stats() for loaded in _models.values()]
+
+
+def warm(model_name: str = DEFAULT_MODEL, background: bool = True):
+    """Loads a model ahead of time so the first reply doesn't pay for it."""
+    if not background:
+        get_loaded(model_name)
+        return None
+    thread = threading.Thread(target=get_loaded, args=(model_name,), name=f"warm-{model_name}", daemon=True)
+    thread.start()
+    return thread
+
+
+if config.env_flag("POLYPROSE_WARM_MODELS"):
+    warm()
+
+
+if __name__ == "__main__":
+    get_loaded(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_MODEL, sys.argv[2] if len(sys.argv) > 2 else None)
+    print(json.dumps(load_stats(), indent=2))
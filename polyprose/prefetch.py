@@ -0,0 +1,160 @@
+"""Speculative prefetch for the language a learner just picked.
+
+The dropdown fixes the language long before anyone speaks, but the Argos
+package install and the CTranslate2 model load used to happen on the first
+translation, with the learner waiting. Picking a language now starts loading
+and warming both directions of the pair (through English too, for pivoted
+pairs) and BlenderBot in the background, so the first turn finds them hot.
+
+Prefetches are shared: sessions that pick the same language at the same time
+wait on one set of loads instead of queueing their own. Each session holds on
+to the one prefetch it wants; when nobody wants a prefetch anymore (everyone
+switched to another language) whatever hasn't started is cancelled. A load
+that is already running finishes, the next one to pick that language needs it
+anyway.
+
+Settings (environment variables):
+    POLYPROSE_PREFETCH_WORKERS  background threads for prefetching (default 2, 0 = off)
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from polyprose import argos_backend, client, config, google_backend, metrics, models
+
+# Translating something short once allocates the translator's buffers, so the first real turn doesn't
+WARMUP_TEXT = "Hello."
+
+_executor = None
+_prefetches = {}
+_lock = threading.Lock()
+
+
+def get_executor():
+    """The prefetch pool (separate from the pipeline's, so prefetching never delays a turn), or None if off."""
+    global _executor
+    workers = config.env_int("POLYPROSE_PREFETCH_WORKERS", 2)
+    if workers <= 0:
+        return None
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prefetch")
+    return _executor
+
+
+def _load_model(model_name, stop):
+    models.get_loaded(model_name)
+
+
+def _warm_argos(from_code, to_code, stop):
+    hops = argos_backend.route(from_code, to_code)
+    for hop_from, hop_to in zip(hops, hops[1:]):
+        if stop.is_set():
+            return
+        translator = argos_backend.get_translator(hop_from, hop_to)
+        if translator is not None and not stop.is_set():
+            translator.translate([WARMUP_TEXT])
+
+
+def _warm_google(stop):
+    # Builds a pooled client (and its HTTP session) without sending anything
+    with google_backend.get_pool().client():
+        pass
+
+
+def _warm_server(inference, backend, lang, model_name, stop):
+    # The inference server runs model_steps() itself; one call covers them all
+    inference.call("prepare", backend=backend, lang=lang, model_name=model_name)
+
+
+def model_steps(backend, lang, model_name) -> list:
+    """(name, fn, args) for the models a turn in lang needs, most useful first."""
+    steps = [("model", _load_model, (model_name,))]
+    if backend == "argos":
+        steps.append((f"{lang}-en", _warm_argos, (lang, "en")))
+        steps.append((f"en-{lang}", _warm_argos, ("en", lang)))
+    return steps
+
+
+def _steps(backend, lang, model_name) -> list:
+    """(name, fn, args) for everything a turn in lang needs, most useful first."""
+    inference = client.get_client()
+    if inference is not None:
+        steps = [("server", _warm_server, (inference, backend, lang, model_name))]
+    else:
+        steps = model_steps(backend, lang, model_name)
+    if backend != "argos":
+        steps.append(("client", _warm_google, ()))
+    return steps
+
+
+class Prefetch:
+    """Everything one (backend, language, model) needs, loading in the background."""
+
+    def __init__(self, key: tuple):
+        self.key = key
+        self.futures = []
+        self._users = 0
+        self._stop = threading.Event()
+
+    def _start(self, executor):
+        backend, lang, model_name = self.key
+        for name, fn, args in _steps(backend, lang, model_name):
+            self.futures.append(executor.submit(self._run, name, fn, (*args, self._stop)))
+
+    def _run(self, name, fn, args):
+        if self._stop.is_set():
+            return
+        with metrics.span("prefetch", step=name, backend=self.key[0]):
+            fn(*args)
+
+    def done(self) -> bool:
+        return all(future.done() for future in self.futures)
+
+    @property
+    def cancelled(self) -> bool:
+        return self._stop.is_set()
+
+    def wait(self, timeout: float = None) -> bool:
+        """Waits for every step. True if they all finished."""
+        return not wait(self.futures, timeout).not_done
+
+    def errors(self) -> list:
+        """What went wrong in the steps that finished (a missing package, say)."""
+        return [future.exception() for future in self.futures
+                if future.done() and not future.cancelled() and future.exception() is not None]
+
+    def release(self):
+        """This session doesn't need it anymore; the last one out cancels what hasn't started."""
+        with _lock:
+            self._users -= 1
+            if self._users > 0:
+                return
+            if _prefetches.get(self.key) is self:
+                del _prefetches[self.key]
+        if not self.done():
+            self._stop.set()
+            for future in self.futures:
+                future.cancel()
+            metrics.count("prefetch_cancelled", backend=self.key[0])
+
+
+def start(pipeline, lang: str):
+    """Starts (or joins) the prefetch for lang. Call release() on it when done with it; None if prefetch is off."""
+    executor = get_executor()
+    if executor is None:
+        return None
+    key = (pipeline.backend, lang, pipeline.model_name)
+    with _lock:
+        prefetch = _prefetches.get(key)
+        if prefetch is not None and prefetch.done():
+            # Finished ones aren't kept: the next start is cheap anyway and sees anything that got unloaded since
+            del _prefetches[key]
+            prefetch = None
+        if prefetch is None:
+            prefetch = _prefetches[key] = Prefetch(key)
+            prefetch._start(executor)
+        else:
+            metrics.count("prefetch_joined", backend=key[0])
+        prefetch._users += 1
+    return prefetch
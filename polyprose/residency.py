@@ -0,0 +1,202 @@
+"""Memory budget for the loaded translation models.
+
+Every Argos pair that has been used once used to stay loaded for good, next to
+BlenderBot, so a server that had seen every language kept every translator in
+RAM until the container got OOM-killed. Translators now live in a residency
+manager with a RAM budget: loading one that doesn't fit first evicts the least
+recently (or least often) used ones, and an evicted translator is simply loaded
+again the next time it's needed.
+
+A model's footprint is counted against the budget from the moment its load
+starts (two sessions picking two new languages at once can't both squeeze in),
+estimated from the size of its weights on disk, which is what CTranslate2 keeps
+in memory. A translator that is evicted while a translation is using it is
+freed when that translation is done.
+
+Evictions, loads and reloads (and how long the reloads took) go into the
+metrics, next to the resident bytes, to size the budget by.
+
+Settings (environment variables):
+    POLYPROSE_TRANSLATOR_MEMORY_MB  RAM all translators may use together (default 1024, 0 = no limit)
+    POLYPROSE_TRANSLATOR_EVICTION   which one goes first: lru (default) or lfu
+"""
+import os
+import threading
+import time
+from dataclasses import dataclass
+
+from polyprose import config, metrics
+
+POLICIES = ("lru", "lfu")
+
+
+def footprint_bytes(path) -> int:
+    """Size of everything under path (a model directory) in bytes."""
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+@dataclass
+class _Resident:
+    value: object
+    size: int
+    last_used: float
+
+
+class ResidencyManager:
+    """Loaded models under a memory budget, evicting by LRU or LFU."""
+
+    def __init__(self, budget_bytes: int = 0, policy: str = "lru", name: str = "translators"):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown eviction policy {policy!r}, expected one of {POLICIES}")
+        self.budget_bytes = budget_bytes
+        self.policy = policy
+        self.name = name
+        self.loads = 0
+        self.reloads = 0
+        self.evictions = 0
+        self.reload_seconds = 0.0
+        self._resident = {}
+        self._loading = {}
+        # Uses are remembered across evictions, so LFU knows a popular pair when it comes back
+        self._uses = {}
+        self._evicted = set()
+        self._lock = threading.Lock()
+        self._key_locks = {}
+
+    def get(self, key):
+        """The resident model for key, or None if it isn't loaded."""
+        with self._lock:
+            resident = self._resident.get(key)
+            if resident is None:
+                return None
+            resident.last_used = time.monotonic()
+            self._uses[key] = self._uses.get(key, 0) + 1
+            return resident.value
+
+    def load(self, key, loader, size_bytes: int):
+        """The model for key, calling loader() to load it if it isn't resident (once, however many ask)."""
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            value = self.get(key)
+            if value is not None:
+                return value
+
+            with self._lock:
+                # Counted from now on, so whatever is loaded next sees this one coming
+                self._loading[key] = size_bytes
+                self._make_room()
+            started = time.perf_counter()
+            try:
+                value = loader()
+            finally:
+                with self._lock:
+                    self._loading.pop(key, None)
+            seconds = time.perf_counter() - started
+
+            with self._lock:
+                self._resident[key] = _Resident(value, size_bytes, time.monotonic())
+                self._uses[key] = self._uses.get(key, 0) + 1
+                reload = key in self._evicted
+                self._evicted.discard(key)
+                self.loads += 1
+                if reload:
+                    self.reloads += 1
+                    self.reload_seconds += seconds
+                # Another load may have made it in while this one ran
+                self._make_room(keep=key)
+        metrics.observe("model_residency_load", seconds, pool=self.name, reload=str(reload).lower())
+        metrics.count("model_residency_reloads" if reload else "model_residency_loads", pool=self.name)
+        self._publish()
+        return value
+
+    def _used_bytes(self) -> int:
+        return sum(r.size for r in self._resident.values()) + sum(self._loading.values())
+
+    def _victim(self, keep):
+        candidates = [key for key in self._resident if key != keep]
+        if not candidates:
+            return None
+        if self.policy == "lfu":
+            return min(candidates, key=lambda key: (self._uses.get(key, 0), self._resident[key].last_used))
+        return min(candidates, key=lambda key: self._resident[key].last_used)
+
+    def _make_room(self, keep=None):
+        # Called with the lock held. A single model bigger than the budget still loads, alone
+        if self.budget_bytes <= 0:
+            return
+        while self._used_bytes() > self.budget_bytes:
+            victim = self._victim(keep)
+            if victim is None:
+                break
+            self._drop(victim)
+
+    def _drop(self, key):
+        resident = self._resident.pop(key)
+        self._evicted.add(key)
+        self.evictions += 1
+        metrics.count("model_residency_evictions", pool=self.name)
+        metrics.count("model_residency_evicted_bytes", resident.size, pool=self.name)
+
+    def evict(self, key) -> bool:
+        """Unloads one model now. False if it wasn't loaded."""
+        with self._lock:
+            if key not in self._resident:
+                return False
+            self._drop(key)
+        self._publish()
+        return True
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._resident):
+                self._drop(key)
+        self._publish()
+
+    def _publish(self):
+        with self._lock:
+            resident_bytes = sum(r.size for r in self._resident.values())
+            count = len(self._resident)
+        metrics.gauge("model_residency_bytes", resident_bytes, pool=self.name)
+        metrics.gauge("model_residency_models", count, pool=self.name)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "resident": sorted("-".join(key) if isinstance(key, tuple) else str(key) for key in self._resident),
+                "resident_mb": round(sum(r.size for r in self._resident.values()) / 2 ** 20, 1),
+                "budget_mb": round(self.budget_bytes / 2 ** 20, 1),
+                "policy": self.policy,
+                "loads": self.loads,
+                "reloads": self.reloads,
+                "evictions": self.evictions,
+                "reload_seconds": round(self.reload_seconds, 3),
+            }
+
+
+_residency = None
+_residency_lock = threading.Lock()
+
+
+def get_residency() -> ResidencyManager:
+    """The process-wide residency manager for translation models."""
+    global _residency
+    if _residency is None:
+        with _residency_lock:
+            if _residency is None:
+                _residency = ResidencyManager(
+                    budget_bytes=config.env_int("POLYPROSE_TRANSLATOR_MEMORY_MB", 1024) * 2 ** 20,
+                    policy=config.env_str("POLYPROSE_TRANSLATOR_EVICTION", "lru").lower(),
+                )
+    return _residency
@@ -0,0 +1,286 @@
+"""Retries and circuit breakers around the translation and generation backends.
+
+app_argos.py used to catch any exception, sleep a second and rerun the whole
+script, so a failure that wasn't going away (no package for a pair, a download
+that keeps failing, BlenderBot running out of memory) became an endless loop of
+reruns, each one retrying the expensive thing that had just failed.
+
+Now every backend call goes through call():
+
+* Errors are sorted into retryable (timeouts, dropped connections, 429/5xx
+  and rate-limit 403s from Google), permanent (no package, out of memory, a
+  missing dependency, rejected credentials), the request's own fault (400,
+  404 and the like, which say nothing about the backend) and the rest. Retryable ones are tried again a few times with
+  exponential backoff and full jitter, so sessions that failed together don't
+  come back together.
+* Each (backend, language pair) has a circuit breaker. After a few failures in
+  a row, or a single permanent one, the circuit opens and calls
+  fail right away with CircuitOpenError (saying when to try again) instead of
+  hitting the backend. After a while one call is let through to check; if it
+  works the circuit closes again.
+* A streamed reply (call_stream()) counts once it has been read to the end:
+  generation fails (running out of memory, say) while the reply is being
+  read, long after the call that started it returned.
+
+Circuits are per pair, so a missing be->en package doesn't stop Russian, and
+the rest of the app keeps working while one is open.
+
+Settings (environment variables):
+    POLYPROSE_RETRY_ATTEMPTS         tries per call, the first one included (default 3)
+    POLYPROSE_RETRY_BASE_MS          backoff before the first retry, doubling after that (default 200)
+    POLYPROSE_RETRY_MAX_MS           longest backoff (default 5000)
+    POLYPROSE_CIRCUIT_FAILURES       failures in a row that open a circuit (default 5)
+    POLYPROSE_CIRCUIT_RESET_SECONDS  how long a circuit stays open before one call may try again (default 30)
+"""
+import math
+import random
+import socket
+import threading
+import time
+
+from polyprose import config, metrics
+from polyprose.argos_registry import PackageNotAvailable
+
+# HTTP statuses worth trying again: rate limited, or the server had a bad moment
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+# Statuses that only say this request was malformed. Not 401/403: Google answers rate and daily
+# limits with 403, and credentials that stopped working are very much the backend's problem
+REQUEST_ERROR_STATUS = {400, 404, 405, 411, 413, 414, 415, 422}
+# Google's reasons for a 403 that goes away by itself (rateLimitExceeded, userRateLimitExceeded,
+# "User Rate Limit Exceeded" in the message), unlike dailyLimitExceeded
+RATE_LIMIT_REASON = "ratelimitexceeded"
+# google.api_core / requests / urllib3 errors by name, so none of them has to be imported here
+RETRYABLE_NAMES = {
+    "ServiceUnavailable", "TooManyRequests", "InternalServerError", "DeadlineExceeded", "GatewayTimeout",
+    "BadGateway", "RetryError", "TransportError", "ConnectTimeout", "ReadTimeout", "ProtocolError",
+    "ChunkedEncodingError",
+}
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling a backend whose circuit is open."""
+
+    def __init__(self, backend: str, key: str, retry_after: float, cause: str):
+        self.backend = backend
+        self.key = key
+        self.retry_after = retry_after
+        super().__init__(f"{backend} {key} is unavailable for another {math.ceil(retry_after)}s ({cause})")
+
+
+def _status(error: BaseException):
+    status = getattr(error, "code", None) or getattr(error, "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Could the same call work if it's simply tried again?"""
+    if isinstance(error, CircuitOpenError):
+        return False
+    if getattr(error, "retryable", False):
+        # Judged where it happened (polyprose.client.RemoteError from the inference server)
+        return True
+    if isinstance(error, (TimeoutError, ConnectionError, socket.timeout)):
+        return True
+    status = _status(error)
+    if status == 403:
+        reasons = [str(detail.get("reason", "")) for detail in getattr(error, "errors", None) or ()
+                   if isinstance(detail, dict)]
+        return any(RATE_LIMIT_REASON in text.lower().replace(" ", "") for text in [str(error), *reasons])
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    if any(cls.__name__ in RETRYABLE_NAMES for cls in type(error).__mro__):
+        return True
+    # urllib's URLError (an OSError) around a network problem, e.g. a package mirror that's down
+    reason = getattr(error, "reason", None)
+    return isinstance(reason, (TimeoutError, ConnectionError, socket.timeout, socket.gaierror))
+
+
+def is_permanent(error: BaseException) -> bool:
+    """Will this keep failing until someone changes something (installs a package, adds memory)?"""
+    if isinstance(error, (PackageNotAvailable, MemoryError, ImportError)) or getattr(error, "permanent", False):
+        return True
+    if _status(error) == 401:
+        # Bad or revoked credentials don't fix themselves
+        return True
+    message = str(error).lower()
+    # torch reports running out of memory as a RuntimeError
+    return isinstance(error, RuntimeError) and ("out of memory" in message or "can't allocate memory" in message)
+
+
+def is_request_error(error: BaseException) -> bool:
+    """A 4xx that only says this request was bad: the backend is fine."""
+    return _status(error) in REQUEST_ERROR_STATUS
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter."""
+
+    def __init__(self, attempts: int = 3, base_delay: float = 0.2, max_delay: float = 5.0):
+        self.attempts = max(attempts, 1)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, retry: int) -> float:
+        """Seconds to wait before retry number `retry` (0 = the first retry)."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** retry))
+
+
+class CircuitBreaker:
+    """Closed -> open after failures -> half open (one trial call) -> closed again."""
+
+    def __init__(self, backend: str, key: str, failure_threshold: int = 5, reset_seconds: float = 30.0):
+        self.backend = backend
+        self.key = key
+        self.failure_threshold = max(failure_threshold, 1)
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self.last_error = ""
+        self._trial_started = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < self.reset_seconds:
+            return "open"
+        return "half_open"
+
+    def before_call(self):
+        """Raises CircuitOpenError if the call shouldn't go to the backend right now."""
+        with self._lock:
+            if self.opened_at is None:
+                return
+            now = time.monotonic()
+            remaining = self.reset_seconds - (now - self.opened_at)
+            # A trial that never reported back (a stream nobody finished reading) doesn't block the next one forever
+            trial_running = self._trial_started is not None and now - self._trial_started < self.reset_seconds
+            if remaining <= 0 and not trial_running:
+                # Half open: this call gets to find out whether the backend is back
+                self._trial_started = now
+                return
+        metrics.count("circuit_rejected", backend=self.backend)
+        raise CircuitOpenError(self.backend, self.key, max(remaining, 0), self.last_error)
+
+    def release_trial(self):
+        """The trial call ended without telling us anything about the backend."""
+        with self._lock:
+            self._trial_started = None
+
+    def record_success(self):
+        with self._lock:
+            was_open = self.opened_at is not None
+            self.failures = 0
+            self.opened_at = None
+            self._trial_started = None
+        if was_open:
+            metrics.count("circuit_closed", backend=self.backend)
+            metrics.gauge("circuit_open", 0, backend=self.backend, key=self.key)
+
+    def record_failure(self, error: BaseException, permanent: bool = False):
+        with self._lock:
+            self.failures += 1
+            self.last_error = f"{type(error).__name__}: {error}"
+            self._trial_started = None
+            # A permanent error won't go away by waiting for more of them, and a failed trial reopens
+            should_open = permanent or self.failures >= self.failure_threshold or self.opened_at is not None
+            if should_open:
+                self.opened_at = time.monotonic()
+        if should_open:
+            metrics.count("circuit_opened", backend=self.backend)
+            metrics.gauge("circuit_open", 1, backend=self.backend, key=self.key)
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+_policy = None
+
+
+def get_breaker(backend: str, key: str) -> CircuitBreaker:
+    """The process-wide circuit breaker for a backend and key (a language pair, a model)."""
+    breaker = _breakers.get((backend, key))
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.get((backend, key))
+            if breaker is None:
+                breaker = _breakers[(backend, key)] = CircuitBreaker(
+                    backend, key,
+                    failure_threshold=config.env_int("POLYPROSE_CIRCUIT_FAILURES", 5),
+                    reset_seconds=config.env_float("POLYPROSE_CIRCUIT_RESET_SECONDS", 30.0),
+                )
+    return breaker
+
+
+def get_policy() -> RetryPolicy:
+    global _policy
+    if _policy is None:
+        _policy = RetryPolicy(
+            attempts=config.env_int("POLYPROSE_RETRY_ATTEMPTS", 3),
+            base_delay=config.env_float("POLYPROSE_RETRY_BASE_MS", 200.0) / 1000,
+            max_delay=config.env_float("POLYPROSE_RETRY_MAX_MS", 5000.0) / 1000,
+        )
+    return _policy
+
+
+def _record(breaker: CircuitBreaker, error: BaseException):
+    """Tells the breaker about a call that failed for good (no retries left)."""
+    if isinstance(error, CircuitOpenError) or is_request_error(error):
+        # Another circuit further down is open, or the request itself was bad: not this backend's failure
+        breaker.release_trial()
+    else:
+        breaker.record_failure(error, permanent=is_permanent(error))
+
+
+def _attempt(backend: str, breaker: CircuitBreaker, fn, args):
+    """fn(*args), retried while the error is worth retrying; a final failure is recorded and raised."""
+    policy = get_policy()
+    retry = 0
+    while True:
+        try:
+            return fn(*args)
+        except Exception as e:
+            if is_retryable(e) and retry + 1 < policy.attempts:
+                metrics.count("retries", backend=backend, error=type(e).__name__)
+                time.sleep(policy.delay(retry))
+                retry += 1
+                continue
+            _record(breaker, e)
+            raise
+
+
+def call(backend: str, key: str, fn, *args):
+    """fn(*args) behind the circuit breaker for (backend, key), retrying what's worth retrying."""
+    breaker = get_breaker(backend, key)
+    breaker.before_call()
+    result = _attempt(backend, breaker, fn, args)
+    breaker.record_success()
+    return result
+
+
+def call_stream(backend: str, key: str, fn, *args):
+    """Like call(), for an fn that returns a StreamedReply: it counts as a success or failure when it ends."""
+    breaker = get_breaker(backend, key)
+    breaker.before_call()
+    reply = _attempt(backend, breaker, fn, args)
+
+    def finished(error, cancelled):
+        if error is not None:
+            _record(breaker, error)
+        elif cancelled:
+            # Stopped before the end: we don't know whether generating would have worked
+            breaker.release_trial()
+        else:
+            breaker.record_success()
+
+    reply.on_finish(finished)
+    return reply
+
+
+def open_circuits() -> list:
+    """(backend, key, seconds until a retry, last error) for every circuit that isn't closed."""
+    now = time.monotonic()
+    return [
+        (b.backend, b.key, max(b.reset_seconds - (now - b.opened_at), 0), b.last_error)
+        for b in list(_breakers.values()) if b.opened_at is not None
+    ]
@@ -0,0 +1,270 @@
+"""Generating BlenderBot replies.
+
+generate_reply() waits for the whole reply (generate_replies() does a whole
+list at once, for offline batches). stream_reply() starts one in the
+background and hands it back as a StreamedReply, which sends every finished
+sentence off to be translated and can be cancelled.
+
+By default that reply arrives in one piece, generated with BlenderBot's beam
+search like generate_reply(). With POLYPROSE_STREAM_REPLIES=1 it hands back
+words as the model produces them instead, so the user sees the first words
+after a single decoding step, and sentences are translated while the model is
+still working on the next one. transformers can only stream greedy decoding,
+so streamed replies are a little plainer.
+
+Both go through the cross-session micro-batcher (polyprose.batcher) unless
+batching is turned off. Given the earlier turns as history, they let BlenderBot
+see as much of the conversation as fits its token budget (polyprose.context).
+
+Settings (environment variables):
+    POLYPROSE_STREAM_REPLIES  1 to stream replies word by word, greedily (default 0: whole, beam search)
+"""
+import re
+import threading
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor
+
+from polyprose import config, metrics
+from polyprose.batcher import STREAM_NUM_BEAMS, get_batcher, stop_criteria
+from polyprose.context import get_builder
+from polyprose.models import DEFAULT_MODEL, get_blenderbot
+
+MAX_LENGTH = 100
+
+# A sentence is finished once we see ., ! or ? followed by whitespace
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+_translate_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="back-translate")
+
+
+def _encode(tokenizer, text):
+    # Quick note -- the attention_mask keeps nonsense responses out. Plenty were there before...
+    with metrics.span("tokenize"):
+        return tokenizer(text, return_tensors="pt", padding=True, truncation=True)
+
+
+def _context_ids(model_name, text, history):
+    with metrics.span("tokenize"):
+        return get_builder(model_name).input_ids(text, history)
+
+
+def generate_reply(text: str, max_length: int = MAX_LENGTH, model_name: str = DEFAULT_MODEL,
+                   history=()) -> str:
+    """Generates BlenderBot's whole reply to text. history: earlier (user, reply) pairs, oldest first."""
+    input_ids = _context_ids(model_name, text, history)
+    batcher = get_batcher(model_name)
+    if batcher is not None:
+        return batcher.generate(input_ids, max_length)
+
+    tokenizer, model = get_blenderbot(model_name)
+    inputs = get_builder(model_name).generate_inputs(model, input_ids)
+    with metrics.span("generate", batched="no"):
+        reply_ids = model.generate(**inputs, max_length=max_length)
+    metrics.count("generated_tokens", reply_ids.shape[-1])
+    with metrics.span("decode"):
+        return tokenizer.decode(reply_ids[0], skip_special_tokens=True)
+
+
+def generate_replies(texts, max_length: int = MAX_LENGTH, model_name: str = DEFAULT_MODEL) -> list:
+    """Generates replies to many texts in one padded generate call (for offline batches)."""
+    tokenizer, model = get_blenderbot(model_name)
+    inputs = _encode(tokenizer, list(texts))
+    with metrics.span("generate", batched="yes"):
+        reply_ids = model.generate(input_ids=inputs["input_ids"], attention_mask=inputs["attention_mask"],
+                                   max_length=max_length)
+    with metrics.span("decode"):
+        return tokenizer.batch_decode(reply_ids, skip_special_tokens=True)
+
+
+class StreamedReply:
+    """A reply that is still being generated.
+
+    Iterating over it yields text chunks as they arrive; .text is everything so
+    far. If a translate function was given, each completed sentence is
+    translated in the background right away. cancel() stops both, by setting
+    stop (pass the event whatever produces the chunks is watching).
+    """
+
+    def __init__(self, chunks, translate_fn=None, stop=None):
+        self._chunks = chunks
+        self._translate = translate_fn
+        self._unsent = ""
+        self._futures = []
+        self._on_cancel = []
+        self._on_finish = []
+        self._finished = False
+        self._finish_lock = threading.Lock()
+        self.stop = stop if stop is not None else threading.Event()
+        self.text = ""
+        self.error = None
+
+    def __iter__(self):
+        try:
+            for chunk in self._chunks:
+                if not chunk:
+                    continue
+                self.text += chunk
+                self._unsent += chunk
+                self._send_finished_sentences()
+                yield chunk
+            if self.error is not None:
+                raise self.error
+        except GeneratorExit:
+            # The reader stopped listening: says nothing about how generation went
+            self._finish(None, cancelled=True)
+            raise
+        except Exception as e:
+            self._finish(e)
+            raise
+        # Whatever is left at the end is the last sentence
+        self._send(self._unsent)
+        self._unsent = ""
+        self._finish(None, cancelled=self.stop.is_set())
+
+    def on_finish(self, callback):
+        """Calls callback(error, cancelled) once, when the reply is over.
+
+        error is the exception generation failed with (or None); cancelled is
+        True if it was stopped before the end.
+        """
+        with self._finish_lock:
+            if not self._finished:
+                self._on_finish.append(callback)
+                return
+        callback(self.error, self.cancelled)
+
+    def _finish(self, error, cancelled=False):
+        with self._finish_lock:
+            if self._finished:
+                return
+            self._finished = True
+        for callback in self._on_finish:
+            callback(error, cancelled)
+
+    def _send_finished_sentences(self):
+        *finished, self._unsent = _SENTENCE_END.split(self._unsent)
+        for sentence in finished:
+            self._send(sentence)
+
+    def _send(self, sentence):
+        sentence = sentence.strip()
+        if sentence and self._translate is not None and not self.stop.is_set():
+            self._futures.append(_translate_pool.submit(self._translate, sentence))
+
+    def translation_so_far(self) -> str:
+        """The translated sentences that are ready, in order, without waiting."""
+        done = []
+        for future in self._futures:
+            if not future.done():
+                break
+            done.append(future.result())
+        return " ".join(done)
+
+    def translation(self) -> str:
+        """The full translation (waits for the remaining sentences)."""
+        return " ".join(future.result() for future in self._futures)
+
+    @property
+    def cancelled(self) -> bool:
+        return self.stop.is_set()
+
+    def on_cancel(self, callback):
+        """Calls callback() when the reply is cancelled, e.g. to stop whatever is producing the chunks."""
+        self._on_cancel.append(callback)
+
+    def cancel(self):
+        """Stops generating at the next token and drops translations that haven't started."""
+        if self.stop.is_set():
+            return
+        self.stop.set()
+        for future in self._futures:
+            future.cancel()
+        for callback in self._on_cancel:
+            callback()
+        self._finish(None, cancelled=True)
+
+
+def streaming() -> bool:
+    """Do replies stream word by word (greedy), or arrive whole (beam search)?"""
+    return config.env_flag("POLYPROSE_STREAM_REPLIES")
+
+
+def _when_done(future):
+    # The whole reply as one chunk; nothing at all if it was dropped before it started
+    try:
+        reply = future.result()
+    except CancelledError:
+        return
+    yield reply
+
+
+def _whole_reply(input_ids, translate_fn, max_length, model_name) -> StreamedReply:
+    """A StreamedReply that arrives in one piece, generated with the model's own beam search."""
+    stop = threading.Event()
+    batcher = get_batcher(model_name)
+    future = batcher.submit(input_ids, max_length, stop=stop) if batcher is not None else Future()
+    reply = StreamedReply(_when_done(future), translate_fn, stop=stop)
+    # Still queued? Then it never starts; once it's running, the stop event ends it at the next step
+    reply.on_cancel(future.cancel)
+    if batcher is not None:
+        return reply
+
+    def generate():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            tokenizer, model = get_blenderbot(model_name)
+            inputs = get_builder(model_name).generate_inputs(model, input_ids)
+            with metrics.span("generate", batched="no"):
+                reply_ids = model.generate(**inputs, max_length=max_length, stopping_criteria=stop_criteria([stop]))
+            with metrics.span("decode"):
+                future.set_result(tokenizer.decode(reply_ids[0], skip_special_tokens=True))
+        except Exception as e:
+            future.set_exception(e)
+
+    threading.Thread(target=generate, name="blenderbot-reply", daemon=True).start()
+    return reply
+
+
+def stream_reply(text: str, translate_fn=None, max_length: int = MAX_LENGTH,
+                 model_name: str = DEFAULT_MODEL, history=()) -> StreamedReply:
+    """Starts generating a reply in the background and returns it as a StreamedReply."""
+    input_ids = _context_ids(model_name, text, history)
+    if not streaming():
+        return _whole_reply(input_ids, translate_fn, max_length, model_name)
+
+    from transformers import TextIteratorStreamer
+
+    tokenizer, model = get_blenderbot(model_name)
+    # For an encoder-decoder model the "prompt" is just the decoder start token
+    streamer = TextIteratorStreamer(tokenizer, skip_prompt=True, skip_special_tokens=True)
+    reply = StreamedReply(streamer, translate_fn)
+
+    batcher = get_batcher(model_name)
+    if batcher is not None:
+        future = batcher.submit(input_ids, max_length, streamer, stop=reply.stop)
+
+        def on_done(future):
+            # The batcher already ended the stream; just pass any error on to the reader
+            if not future.cancelled() and future.exception() is not None:
+                reply.error = future.exception()
+
+        future.add_done_callback(on_done)
+        # Still queued? Then it never reaches the model; end the stream so a reader isn't left waiting
+        reply.on_cancel(lambda: future.cancel() and streamer.end())
+        return reply
+
+    def generate():
+        try:
+            # The encoder pass happens here too (unless it's cached), not in the caller's thread
+            inputs = get_builder(model_name).generate_inputs(model, input_ids)
+            with metrics.span("generate", batched="no"):
+                # transformers can't stream beam search
+                model.generate(**inputs, max_length=max_length, streamer=streamer, num_beams=STREAM_NUM_BEAMS,
+                               stopping_criteria=stop_criteria([reply.stop]))
+        except Exception as e:
+            # Unblock the reader, then let it raise the error
+            reply.error = e
+            streamer.end()
+
+    threading.Thread(target=generate, name="blenderbot-stream", daemon=True).start()
+    return reply
@@ -0,0 +1,303 @@
+"""Shared inference server: one set of models for every app replica on a machine.
+
+Each Streamlit server process used to load its own BlenderBot and Argos
+translators, so running several replicas on one machine multiplied the memory
+by the replica count, and every replica's torch and CTranslate2 sized their
+thread pools for the whole machine, so the replicas fought over the cores.
+
+This runs the models in a small preforked pool instead. The parent loads
+BlenderBot once, then forks the workers. They share its weights copy-on-write,
+so the pages are never copied since inference only reads them. All workers
+accept on one Unix socket. Each worker gets a fixed number of threads, and is
+pinned to its own cores where the OS allows, so workers x threads never asks for
+more cores than there are. Argos translators are loaded in each worker on first
+use (CTranslate2 starts threads, which don't survive a fork), under the usual
+residency budget. Memory then grows with the number of workers, not with the
+number of app replicas.
+
+    python -m polyprose.server --workers 2 --threads 4
+    POLYPROSE_INFERENCE_SOCKET=~/.cache/polyprose/inference.sock streamlit run app_argos.py
+
+The apps reach it through polyprose.client (see there). Unix only.
+
+Settings (environment variables, the command line options override them):
+    POLYPROSE_INFERENCE_SOCKET     socket to listen on (default: inference.sock in the data dir)
+    POLYPROSE_INFERENCE_WORKERS    worker processes (default: cores / threads)
+    POLYPROSE_INFERENCE_THREADS    torch and CTranslate2 threads per worker (default 2)
+    POLYPROSE_INFERENCE_PIN_CPUS   0 to leave workers free to run on any core
+"""
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+import traceback
+from pathlib import Path
+
+from polyprose import argos_backend, config, models, prefetch, resilience, responder
+from polyprose.client import recv_message, send_message
+
+# Don't respawn workers faster than this if they keep dying
+RESPAWN_DELAY = 1.0
+
+_worker_index = None
+
+
+def socket_path() -> Path:
+    return Path(config.env_str("POLYPROSE_INFERENCE_SOCKET") or config.data_dir() / "inference.sock").expanduser()
+
+
+def _history(args) -> list:
+    # JSON has no tuples, and the context builder's cache keys on them
+    return [tuple(pair) for pair in args.get("history", ())]
+
+
+def _translate(args):
+    return argos_backend.translate_text(args["from_language"], args["to_language"], args["text"])["translatedText"]
+
+
+def _translate_batch(args):
+    results = argos_backend.translate_batch(args["from_language"], args["to_language"], args["texts"])
+    return [result["translatedText"] for result in results]
+
+
+def _generate(args):
+    return responder.generate_reply(args["text"], args["max_length"], args["model_name"], _history(args))
+
+
+def _generate_batch(args):
+    return responder.generate_replies(args["texts"], args["max_length"], args["model_name"])
+
+
+def _prepare(args):
+    for name, fn, step_args in prefetch.model_steps(args["backend"], args["lang"], args["model_name"]):
+        fn(*step_args, threading.Event())
+
+
+def _ping(args):
+    return {"pid": os.getpid(), "worker": _worker_index, "models": models.load_stats()}
+
+
+OPS = {
+    "translate": _translate,
+    "translate_batch": _translate_batch,
+    "generate": _generate,
+    "generate_batch": _generate_batch,
+    "prepare": _prepare,
+    "ping": _ping,
+}
+
+
+def _error(e: BaseException) -> dict:
+    """How an error travels back to the client, with resilience's verdict on it."""
+    code = getattr(e, "code", None) or getattr(e, "status_code", None)
+    return {"error": {
+        "kind": type(e).__name__,
+        "message": str(e),
+        "code": code if isinstance(code, int) else None,
+        "retryable": resilience.is_retryable(e),
+        "permanent": resilience.is_permanent(e),
+    }}
+
+
+def _call(op, args) -> dict:
+    fn = OPS.get(op)
+    try:
+        if fn is None:
+            raise ValueError(f"Unknown inference op {op!r}")
+        return {"result": fn(args)}
+    except Exception as e:
+        return _error(e)
+
+
+def _stream(conn, args):
+    """Sends a reply chunk by chunk as it's generated; stops generating if the client goes away."""
+    try:
+        reply = responder.stream_reply(args["text"], None, args["max_length"], args["model_name"], _history(args))
+    except Exception as e:
+        send_message(conn, _error(e))
+        return
+    try:
+        for chunk in reply:
+            send_message(conn, {"chunk": chunk})
+    except OSError:
+        reply.cancel()
+        raise
+    except Exception as e:
+        send_message(conn, _error(e))
+        return
+    send_message(conn, {"done": True})
+
+
+def _handle(conn):
+    """Serves one client connection, a request at a time, until it's closed."""
+    with conn:
+        while True:
+            try:
+                request = recv_message(conn)
+            except (OSError, ValueError):
+                return
+            if request is None:
+                return
+            op = request.pop("op", None)
+            try:
+                if op == "stream":
+                    _stream(conn, request)
+                else:
+                    send_message(conn, _call(op, request))
+            except OSError:
+                return
+
+
+def _pin_threads(count: int):
+    """Caps torch's (and OpenMP/MKL's) threads for this process."""
+    for name in ("OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ[name] = str(count)
+    try:
+        import torch
+    except ImportError:
+        return
+    torch.set_num_threads(count)
+    try:
+        # Generation barely uses inter-op parallelism; this can only be set before it's first used
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass
+
+
+def _pin_cpus(index: int, threads: int):
+    """Keeps worker `index` on cores of its own, if there are enough to go around."""
+    if not config.env_flag("POLYPROSE_INFERENCE_PIN_CPUS", True) or not hasattr(os, "sched_setaffinity"):
+        return
+    cpus = sorted(os.sched_getaffinity(0))
+    mine = cpus[index * threads:(index + 1) * threads]
+    if len(mine) == threads:
+        os.sched_setaffinity(0, mine)
+
+
+def _worker(listener, index: int, threads: int):
+    global _worker_index
+    _worker_index = index
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    # Ctrl-C goes to the whole process group; the parent decides when workers stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _pin_cpus(index, threads)
+    _pin_threads(threads)
+    # CTranslate2 batches in parallel on this worker's threads only (argos_backend reads it per translator)
+    os.environ.setdefault("POLYPROSE_ARGOS_THREADS", str(threads))
+    while True:
+        try:
+            conn, _ = listener.accept()
+        except InterruptedError:
+            continue
+        threading.Thread(target=_handle, args=(conn,), name="inference-conn", daemon=True).start()
+
+
+def _spawn(listener, index: int, threads: int) -> int:
+    pid = os.fork()
+    if pid:
+        return pid
+    code = 0
+    try:
+        _worker(listener, index, threads)
+    except BaseException:
+        traceback.print_exc()
+        code = 1
+    finally:
+        os._exit(code)
+
+
+def _listen(path: Path):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if path.exists():
+        # Left over from a server that didn't shut down cleanly -- unless one is still running there
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(str(path))
+        except OSError:
+            path.unlink()
+        else:
+            raise RuntimeError(f"An inference server is already listening on {path}")
+        finally:
+            probe.close()
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(str(path))
+    os.chmod(path, 0o660)
+    listener.listen(128)
+    return listener
+
+
+def serve(path: Path, workers: int, threads: int, model_names=(), backend: str = None):
+    """Loads the models, forks the workers and keeps them running until SIGTERM/SIGINT."""
+    # The parent never runs inference: one thread, so there is no thread pool to be half-copied by fork()
+    _pin_threads(1)
+    backend = backend or models.default_backend()
+    if backend == "onnx":
+        # ONNX Runtime sessions own thread pools too, so each worker loads its own on first use
+        model_names = ()
+    for model_name in model_names:
+        loaded = models.get_loaded(model_name, backend)
+        print(f"Loaded {model_name} ({loaded.backend}) in {loaded.load_seconds:.1f}s", file=sys.stderr)
+    # Without this the workers' garbage collector writes to every object it inherited, copying their pages
+    gc.collect()
+    gc.freeze()
+
+    listener = _listen(path)
+    children = {}
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for index in range(workers):
+        children[_spawn(listener, index, threads)] = index
+    print(f"Inference server listening on {path} with {workers} workers x {threads} threads", file=sys.stderr)
+
+    try:
+        while children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            index = children.pop(pid, None)
+            if index is None or stopping:
+                continue
+            print(f"Worker {index} exited ({status}), restarting it", file=sys.stderr)
+            time.sleep(RESPAWN_DELAY)
+            if not stopping:
+                children[_spawn(listener, index, threads)] = index
+    finally:
+        listener.close()
+        path.unlink(missing_ok=True)
+
+
+def main(argv=None):
+    threads = max(config.env_int("POLYPROSE_INFERENCE_THREADS", 2), 1)
+    parser = argparse.ArgumentParser(description="Serve BlenderBot and Argos to the apps from a preforked pool")
+    parser.add_argument("--socket", default=str(socket_path()), help="Unix socket to listen on")
+    parser.add_argument("--threads", type=int, default=threads, help="torch/CTranslate2 threads per worker")
+    parser.add_argument("--workers", type=int, help="worker processes (default: cores / threads)")
+    parser.add_argument("--model", action="append", dest="models",
+                        help=f"model to load before forking (default {models.DEFAULT_MODEL}; repeatable)")
+    parser.add_argument("--backend", choices=models.BACKENDS, help="responder backend (default: as configured)")
+    args = parser.parse_args(argv)
+
+    threads = max(args.threads, 1)
+    workers = args.workers or config.env_int("POLYPROSE_INFERENCE_WORKERS", 0) \
+        or max((os.cpu_count() or 1) // threads, 1)
+    serve(Path(args.socket).expanduser(), workers, threads, args.models or [models.DEFAULT_MODEL], args.backend)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+"""Local safetensors snapshots of BlenderBot, loaded memory-mapped.
+
+from_pretrained("facebook/blenderbot-400M-distill") looks the model up in the
+hub cache (or online), reads the weights and copies them into freshly
+allocated fp32 tensors, in every process, every time. A snapshot is the model
+written once as a single model.safetensors with its config and tokenizer files
+next to it. Loading one never touches the hub: the file is memory-mapped and
+the weight tensors point straight into the mapping (copy-on-write), so a load
+is mostly page faults and every process on the node shares the same page-cached
+weights instead of holding its own copy.
+
+Write one where the app will run (it downloads the model if it isn't cached):
+    python -m polyprose.snapshot write facebook/blenderbot-400M-distill
+
+polyprose.models uses a snapshot automatically when there is one. One written
+somewhere else with --output is found too: a small <model>.path file under the
+snapshot dir points at it.
+
+Settings (environment variables):
+    POLYPROSE_SNAPSHOT_DIR  where snapshots live (default: snapshots/ in the data dir)
+    POLYPROSE_MODEL_MMAP    0 to load snapshots with from_pretrained instead of memory-mapping them
+"""
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import shutil
+import struct
+import sys
+import time
+from pathlib import Path
+
+from polyprose import config
+
+WEIGHTS_NAME = "model.safetensors"
+MANIFEST_NAME = "polyprose-snapshot.json"
+VERSION = 1
+
+# safetensors dtype names -> torch dtype attribute names
+_DTYPES = {"F64": "float64", "F32": "float32", "F16": "float16", "BF16": "bfloat16",
+           "I64": "int64", "I32": "int32", "I16": "int16", "I8": "int8", "U8": "uint8", "BOOL": "bool"}
+
+
+def snapshot_root() -> Path:
+    return Path(config.env_str("POLYPROSE_SNAPSHOT_DIR") or config.data_dir() / "snapshots")
+
+
+def snapshot_path(model_name: str) -> Path:
+    return snapshot_root() / model_name.replace("/", "--")
+
+
+def pointer_path(model_name: str) -> Path:
+    """Where the location of a snapshot written with --output is kept."""
+    default = snapshot_path(model_name)
+    return default.with_name(f"{default.name}.path")
+
+
+def _complete(path: Path) -> bool:
+    try:
+        manifest = json.loads((path / MANIFEST_NAME).read_text())
+    except (OSError, ValueError):
+        return False
+    return manifest.get("version") == VERSION and (path / WEIGHTS_NAME).exists()
+
+
+def find(model_name: str):
+    """The snapshot folder for a model, or None if there's no complete one."""
+    path = snapshot_path(model_name)
+    if _complete(path):
+        return path
+    try:
+        path = Path(pointer_path(model_name).read_text().strip())
+    except OSError:
+        return None
+    return path if _complete(path) else None
+
+
+def _publish(tmp: Path, output: Path, model_name: str):
+    """Moves a finished snapshot into place and makes sure find() sees it."""
+    shutil.rmtree(output, ignore_errors=True)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    os.replace(tmp, output)
+    pointer = pointer_path(model_name)
+    if output.resolve() == snapshot_path(model_name).resolve():
+        pointer.unlink(missing_ok=True)
+    else:
+        pointer.parent.mkdir(parents=True, exist_ok=True)
+        pointer.write_text(str(output.resolve()))
+
+
+def write(model_name: str, output=None, dtype: str = "float32") -> Path:
+    """Saves a model as one safetensors file plus config and tokenizer, and returns the folder."""
+    import torch
+    from transformers import BlenderbotForConditionalGeneration, BlenderbotTokenizer
+
+    output = Path(output) if output else snapshot_path(model_name)
+    # Written to the side and renamed, so a half-written snapshot is never picked up
+    tmp = output.with_name(f"{output.name}.{os.getpid()}.tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+
+    model = BlenderbotForConditionalGeneration.from_pretrained(model_name, torch_dtype=getattr(torch, dtype))
+    model.eval()
+    # One file (no shards) so the whole model is a single mapping
+    model.save_pretrained(tmp, safe_serialization=True, max_shard_size="100GB")
+    BlenderbotTokenizer.from_pretrained(model_name).save_pretrained(tmp)
+
+    weights = tmp / WEIGHTS_NAME
+    (tmp / MANIFEST_NAME).write_text(json.dumps({
+        "version": VERSION,
+        "model": model_name,
+        "dtype": dtype,
+        "bytes": weights.stat().st_size,
+        "sha256": _sha256(weights),
+        "created": time.time(),
+    }, indent=2))
+    _publish(tmp, output, model_name)
+    return output
+
+
+def _sha256(path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def mmap_state_dict(path) -> dict:
+    """The tensors of a .safetensors file, backed by a copy-on-write memory map of it (nothing is read yet)."""
+    import torch
+
+    with open(path, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+    (header_size,) = struct.unpack("<Q", mapped[:8])
+    header = json.loads(mapped[8:8 + header_size])
+    header.pop("__metadata__", None)
+    data_start = 8 + header_size
+
+    tensors = {}
+    for name, info in header.items():
+        dtype = getattr(torch, _DTYPES[info["dtype"]])
+        start, end = info["data_offsets"]
+        if end == start:
+            tensors[name] = torch.empty(info["shape"], dtype=dtype)
+            continue
+        count = (end - start) // dtype.itemsize
+        tensors[name] = torch.frombuffer(mapped, dtype=dtype, count=count, offset=data_start + start) \
+            .reshape(info["shape"])
+    return tensors
+
+
+def _load_mapped(path: Path):
+    import torch
+    from transformers import BlenderbotConfig, BlenderbotForConditionalGeneration
+
+    model_config = BlenderbotConfig.from_pretrained(path, local_files_only=True)
+    # Built on the meta device: no memory for the weights until the mapped ones are put in
+    with torch.device("meta"):
+        model = BlenderbotForConditionalGeneration(model_config)
+    model.load_state_dict(mmap_state_dict(path / WEIGHTS_NAME), strict=False, assign=True)
+    # The output projection shares the embedding, which is only stored once
+    model.tie_weights()
+    leftover = [name for name, tensor in [*model.named_parameters(), *model.named_buffers()] if tensor.is_meta]
+    if leftover:
+        raise ValueError(f"{path / WEIGHTS_NAME} has no weights for {', '.join(leftover[:5])}")
+    return model
+
+
+def load_model(path: Path):
+    """BlenderBot from a snapshot folder: memory-mapped, or with from_pretrained if that's turned off or fails."""
+    if config.env_flag("POLYPROSE_MODEL_MMAP", True):
+        try:
+            return _load_mapped(path)
+        except (ValueError, RuntimeError, TypeError, KeyError) as e:
+            print(f"polyprose: memory-mapped load of {path} failed ({e}), using from_pretrained", file=sys.stderr)
+
+    from transformers import BlenderbotForConditionalGeneration
+
+    return BlenderbotForConditionalGeneration.from_pretrained(
+        path, local_files_only=True, low_cpu_mem_usage=True, use_safetensors=True,
+    )
+
+
+def load_tokenizer(path: Path):
+    from transformers import BlenderbotTokenizer
+
+    return BlenderbotTokenizer.from_pretrained(path, local_files_only=True)
+
+
+def main(argv=None):
+    from polyprose.models import DEFAULT_MODEL
+
+    parser = argparse.ArgumentParser(description="Write or inspect local BlenderBot snapshots")
+    commands = parser.add_subparsers(dest="command", required=True)
+    write_parser = commands.add_parser("write", help="save a model as a local safetensors snapshot")
+    write_parser.add_argument("model", nargs="?", default=DEFAULT_MODEL)
+    write_parser.add_argument("--output", help=f"folder to write (default: under {snapshot_root()})")
+    write_parser.add_argument("--dtype", default="float32", choices=["float32", "bfloat16"],
+                              help="bfloat16 halves the file and the memory, on CPUs that support it")
+    show_parser = commands.add_parser("show", help="print a snapshot's manifest")
+    show_parser.add_argument("model", nargs="?", default=DEFAULT_MODEL)
+    args = parser.parse_args(argv)
+
+    if args.command == "write":
+        start = time.perf_counter()
+        path = write(args.model, args.output, args.dtype)
+        print(f"Wrote {path} in {time.perf_counter() - start:.1f}s")
+        return 0
+    path = find(args.model)
+    if path is None:
+        print(f"No snapshot of {args.model} under {snapshot_root()}")
+        return 1
+    print((path / MANIFEST_NAME).read_text())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
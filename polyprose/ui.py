@@ -0,0 +1,162 @@
+"""Streamlit pieces shared by the apps: the chat bubbles and a streamed reply.
+
+Only the app scripts import this (it needs streamlit); everything else about a
+turn lives in polyprose.core.
+
+The apps run their chat pane as an st.fragment, so speaking or pressing Refresh
+only reruns the pane, not the title, the dropdown and the other tabs. Bubble
+HTML is built once per (message, translation) and shared by every session, and
+the history goes out as one markdown element instead of two per turn.
+"""
+import functools
+
+import streamlit as st
+
+from polyprose import prefetch, ui_strings
+from polyprose.resilience import CircuitOpenError
+
+# MAKE CHAT BUBBLES - Before this, it was just a wall of text and hard to read.
+_USER_BUBBLE = """
+    <div style="background-color: #d1e7dd; padding: 10px; border-radius: 10px; margin: 5px 0;">
+        <strong style="color: black;">You:</strong> <span style="color: black;">{original}</span><br>
+        <strong style="color: black;">Translation:</strong> <span style="color: black;">{translated}</span>
+    </div>
+"""
+
+_AI_BUBBLE = """
+    <div style="background-color: #f8d7da; padding: 10px; border-radius: 10px; margin: 5px 0;">
+        <strong style="color: black;">PolyProse:</strong> <span style="color: black;">{original}</span><br>
+        <strong style="color: black;">Translation:</strong> <span style="color: black;">{translated}</span>
+    </div>
+"""
+
+
+def header():
+    """The app title and the globe."""
+    st.title("PolyProse: Let's learn together!")
+    st.markdown("<h1 style='font-size: 50px; text-align: center;'>&#127760;</h1>", unsafe_allow_html=True)
+
+
+def tagline(translated_title: str, placeholder=None):
+    """The title again, in the language being practiced."""
+    (st if placeholder is None else placeholder).markdown(
+        f"<h1 style='font-size: 24px; text-align: center;'>{translated_title}</h1>", unsafe_allow_html=True,
+    )
+
+
+def title(pipeline, lang: str) -> str:
+    """The tagline in lang, or in English (with a warning) if it can't be translated right now."""
+    try:
+        return pipeline.title(lang)
+    except Exception as e:
+        show_error(e)
+        return ui_strings.STRINGS["title"]
+
+
+@functools.lru_cache(maxsize=4096)
+def bubble_html(template: str, original: str, translated: str) -> str:
+    return template.format(original=original, translated=translated)
+
+
+def history_html(turns) -> str:
+    """Both bubbles for every turn as one HTML string."""
+    return "".join(
+        bubble_html(_USER_BUBBLE, turn.user_text, turn.user_translation)
+        + bubble_html(_AI_BUBBLE, turn.reply, turn.reply_translation)
+        for turn in turns
+    )
+
+
+def display_user_message(original_message, translated_message):
+    st.markdown(bubble_html(_USER_BUBBLE, original_message, translated_message), unsafe_allow_html=True)
+
+
+def display_ai_message(original_message, translated_message, placeholder=None):
+    # With a placeholder (st.empty()) the same bubble can be updated while the reply streams in
+    (st if placeholder is None else placeholder).markdown(
+        _AI_BUBBLE.format(original=original_message, translated=translated_message), unsafe_allow_html=True,
+    )
+
+
+def stream_ai_message(reply) -> tuple:
+    """Shows a StreamedReply in one bubble as it comes in. Returns (reply, translation)."""
+    bubble = st.empty()
+    for _ in reply:
+        display_ai_message(reply.text, reply.translation_so_far(), bubble)
+    translation = reply.translation()
+    display_ai_message(reply.text, translation, bubble)
+    return reply.text, translation
+
+
+def language_select(pipeline, label: str = "Which language are we practicing today?") -> str:
+    """The language dropdown. Picking a language starts loading everything it needs right away."""
+    return st.selectbox(label, tuple(pipeline.languages), key="language",
+                        on_change=_language_changed, args=(pipeline,))
+
+
+def _language_changed(pipeline):
+    # Runs before the rerun, so the loads start before anything else on the page
+    prefetch_language(pipeline, pipeline.languages.get(st.session_state.language, "en"))
+
+
+def prefetch_language(pipeline, lang: str):
+    """Makes this session's prefetch the one for lang, letting go of the previous one."""
+    previous = st.session_state.get("prefetch")
+    if previous is not None and previous.key == (pipeline.backend, lang, pipeline.model_name):
+        return previous
+    st.session_state.prefetch = prefetch.start(pipeline, lang)
+    if st.session_state.prefetch is None:
+        # Prefetching is turned off: just start the loads
+        pipeline.prepare(lang)
+    if previous is not None:
+        previous.release()
+    return st.session_state.prefetch
+
+
+def start_turn(pipeline, lang, text, history=()):
+    """Starts a turn in the background, cancelling this session's previous one if it's still going."""
+    previous = st.session_state.get("pending_turn")
+    if previous is not None:
+        # The learner spoke again, nobody is waiting for that reply anymore
+        previous.cancel()
+    st.session_state.pending_turn = pipeline.start_turn(lang, text, history)
+    return st.session_state.pending_turn
+
+
+def show_error(error: Exception):
+    """Shows what went wrong without stopping the page (no sleeping and rerunning)."""
+    if isinstance(error, CircuitOpenError):
+        # Only this language (or the model) is off for a moment, everything else still works
+        st.warning(f"{error}. Try another language, or this one again in a little while.")
+    else:
+        st.error(f"An error occurred: {error}")
+
+
+def display_history(turns):
+    """Both bubbles for every stored turn (just reading, nothing is re-translated)."""
+    if turns:
+        st.markdown(history_html(turns), unsafe_allow_html=True)
+
+
+def history_pages(conversation, skip_newest: int = 0, key: str = "history_page"):
+    """The history one page at a time, newest page first, with buttons to go back through older ones.
+
+    Only the page on screen is read (older pages come from the session's spill
+    file), so this costs the same however long the conversation is.
+    """
+    pages = conversation.page_count(skip_newest=skip_newest)
+    if skip_newest:
+        # A new turn moves everything along, so start from the latest page again
+        st.session_state[key] = 0
+    page = min(st.session_state.get(key, 0), max(pages - 1, 0))
+    display_history(conversation.page(page, skip_newest=skip_newest))
+    if pages <= 1:
+        return
+
+    def go(to):
+        st.session_state[key] = to
+
+    older, position, newer = st.columns([1, 2, 1])
+    older.button("Older", key=f"{key}_older", disabled=page >= pages - 1, on_click=go, args=(page + 1,))
+    position.caption(f"Page {page + 1} of {pages} (newest first)")
+    newer.button("Newer", key=f"{key}_newer", disabled=page == 0, on_click=go, args=(page - 1,))
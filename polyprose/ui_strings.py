@@ -0,0 +1,128 @@
+"""Pre-translated UI strings.
+
+The apps' fixed strings in the practiced language (the title) used to go through Google or
+Argos on every rerun for whichever language was selected. Instead, a build
+step translates every string below into every language the apps offer, once
+per backend, and writes a small JSON catalog. The apps load it once per
+process, so showing the title in another language is a dict lookup. Anything
+missing from the catalog (or built from an older English text) falls back to
+translating it live.
+
+Build it (needs the backends, so run it wherever the apps are deployed):
+    python -m polyprose.ui_strings build --backends google argos
+
+Settings (environment variables):
+    POLYPROSE_UI_STRINGS  the catalog file (default: ui_strings.json in the data dir)
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+from pathlib import Path
+
+from polyprose import config
+
+VERSION = 1
+
+# key -> English. Change the English and the old translations are ignored until the next build.
+# Only strings the apps show in the language being practiced belong here; the rest of the UI stays English.
+STRINGS = {
+    "title": "Let's learn together!",
+}
+
+_catalog = None
+_lock = threading.Lock()
+
+
+def catalog_path() -> Path:
+    return Path(config.env_str("POLYPROSE_UI_STRINGS") or config.data_dir() / "ui_strings.json")
+
+
+def read_catalog(path) -> dict:
+    """The catalog at path, or an empty one if there is none yet."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            catalog = json.load(f)
+    except FileNotFoundError:
+        return {"version": VERSION, "sources": {}, "backends": {}}
+    if catalog.get("version") != VERSION:
+        raise ValueError(f"{path} is a version {catalog.get('version')} catalog, expected {VERSION}")
+    return catalog
+
+
+def get_catalog() -> dict:
+    """The catalog, read from disk the first time only."""
+    global _catalog
+    if _catalog is None:
+        with _lock:
+            if _catalog is None:
+                _catalog = read_catalog(catalog_path())
+    return _catalog
+
+
+def lookup(backend: str, lang: str, key: str):
+    """The pre-translated string, or None if the catalog doesn't have an up-to-date one."""
+    catalog = get_catalog()
+    if catalog["sources"].get(key) != STRINGS.get(key):
+        return None
+    backends = catalog["backends"]
+    # Prefer the backend the app uses, but any translation beats a live one
+    for name in [backend, *backends]:
+        text = backends.get(name, {}).get(lang, {}).get(key)
+        if text is not None:
+            return text
+    return None
+
+
+def build(backends, path=None, log=sys.stderr) -> dict:
+    """Translates every string into every language for each backend and writes the catalog."""
+    from polyprose.core import Pipeline, languages
+
+    path = Path(path) if path else catalog_path()
+    catalog = read_catalog(path)
+    if catalog["sources"] != STRINGS:
+        # English changed since the last build: nothing in there can be trusted
+        catalog["backends"] = {}
+    catalog["sources"] = dict(STRINGS)
+
+    keys = list(STRINGS)
+    for backend in backends:
+        pipeline = Pipeline(backend)
+        table = catalog["backends"].setdefault(backend, {})
+        for lang in languages(backend).values():
+            try:
+                translations = pipeline.translate_batch("en", lang, [STRINGS[key] for key in keys])
+            except Exception as e:
+                print(f"{backend}/{lang}: skipped ({type(e).__name__}: {e})", file=log)
+                continue
+            table[lang] = dict(zip(keys, translations))
+            print(f"{backend}/{lang}: {len(keys)} strings", file=log)
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp.write_text(json.dumps(catalog, ensure_ascii=False, indent=1), encoding="utf-8")
+    os.replace(tmp, path)
+    return catalog
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pre-translate the apps' UI strings")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build_parser = commands.add_parser("build", help="translate every string into every language")
+    build_parser.add_argument("--backends", nargs="+", default=["google", "argos"], choices=["google", "argos"])
+    build_parser.add_argument("--output", help=f"catalog file (default {catalog_path()})")
+    commands.add_parser("show", help="print the catalog")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        catalog = build(args.backends, args.output)
+        print(f"Wrote {args.output or catalog_path()} "
+              f"({sum(len(table) for table in catalog['backends'].values())} languages)")
+    else:
+        print(json.dumps(read_catalog(catalog_path()), ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
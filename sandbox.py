@@ -1,112 +1,66 @@
 import streamlit as st
 from streamlit_mic_recorder import mic_recorder, speech_to_text
-from transformers import BlenderbotTokenizer, BlenderbotForConditionalGeneration
-import argostranslate.package
-import argostranslate.translate
-import time
-
-def load_language_package(from_code, to_code):
-    """Load the language package from Argos Translate."""
-    argostranslate.package.update_package_index()
-    available_packages = argostranslate.package.get_available_packages()
-    package_to_install = next(
-        filter(
-            lambda x: x.from_code == from_code and x.to_code == to_code,
-            available_packages
-        )
-    )
-    argostranslate.package.install_from_path(package_to_install.download())
-
-def translate_text(from_language: str, to_language: str, text: str) -> dict:
-    """Translates text from one language to another using Argos Translate."""
-    load_language_package(from_language, to_language)
-    translated_text = argostranslate.translate.translate(text, from_language, to_language)
-    return {"translatedText": translated_text}
+from polyprose import metrics, ui
+from polyprose.conversation import Conversation, Turn
+from polyprose.core import Pipeline
+
+pipeline = Pipeline("argos")
 
 # Create two tabs -- One is "About me", one is "PolyProse"
 tabs = st.tabs(["PolyProse", "About Me", "Sources"])
 
 # FIRST TAB: Poly Prose
 with tabs[0]:
-    original_title = "PolyProse: Let's learn together!"
-    st.title(original_title)
-    st.markdown(f"<h1 style='font-size: 50px; text-align: center;'>&#127760;</h1>", unsafe_allow_html=True)
-
-    option = st.selectbox(
-        "Which language are we practicing today?",
-        ("Russian", "French", "Polish", "Spanish", "Hindi"),
-    )
+    ui.header()
 
-    lang_mapping = {"Russian": "ru", "French": "fr", "Polish": "pl", "Spanish": "es", "Hindi": "hi"}
-    lang = lang_mapping.get(option, "en")
+    option = ui.language_select(pipeline)
 
-    def translate_title(target_language: str) -> str:
-        """Translates the title from English to the target language."""
-        translation_result = translate_text("en", target_language, "Let's learn together!")
-        return translation_result["translatedText"]
+    lang = pipeline.languages.get(option, "en")
 
+    ui.prefetch_language(pipeline, lang)
     if option:
-        translated_title = translate_title(lang)
-        st.markdown(f"<h1 style='font-size: 24px; text-align: center;'>{translated_title}</h1>", unsafe_allow_html=True)
-
-    def display_user_message(original_message, translated_message):
-        st.markdown(f"""
-            <div style="background-color: #d1e7dd; padding: 10px; border-radius: 10px; margin: 5px 0;">
-                <strong style="color: black;">You:</strong> <span style="color: black;">{original_message}</span><br>
-                <strong style="color: black;">Translation:</strong> <span style="color: black;">{translated_message}</span>
-            </div>
-        """, unsafe_allow_html=True)
-
-    def display_ai_message(original_message, translated_message):
-        st.markdown(f"""
-            <div style="background-color: #f8d7da; padding: 10px; border-radius: 10px; margin: 5px 0;">
-                <strong style="color: black;">PolyProse:</strong> <span style="color: black;">{original_message}</span><br>
-                <strong style="color: black;">Translation:</strong> <span style="color: black;">{translated_message}</span>
-            </div>
-        """, unsafe_allow_html=True)
+        ui.tagline(ui.title(pipeline, lang))
 
     # Handle session state safely
-    if 'conversation_history' not in st.session_state:
-        st.session_state.conversation_history = []
+    if 'conversation' not in st.session_state:
+        st.session_state.conversation = Conversation()
 
     if 'ai_response' not in st.session_state:
         st.session_state.ai_response = ""
 
-    try:
-        c1, c2 = st.columns(2)
-        with c1:
-            st.write("Convert speech to text:")
-        with c2:
-            text = speech_to_text(language=lang, use_container_width=True, just_once=True, key='STT')
+    # Speaking reruns just this pane
+    @st.fragment
+    def chat_pane(lang):
+        try:
+            c1, c2 = st.columns(2)
+            with c1:
+                st.write("Convert speech to text:")
+            with c2:
+                text = speech_to_text(language=lang, use_container_width=True, just_once=True, key='STT')
 
-        if text:
-            st.session_state.conversation_history.append(f"You: {text}")
+            turn = ui.start_turn(pipeline, lang, text, st.session_state.conversation.turns()) if text else None
 
-            with st.spinner('Pondering...'):
-                translated_text = translate_text(lang, "en", text)["translatedText"]
-                display_user_message(text, translated_text)
+            if text:
+                with st.spinner('Pondering...'):
+                    translated_text = turn.user_translation()
+                    ui.display_user_message(text, translated_text)
 
-                # Model integration (BlenderBot)
-                model_name = "facebook/blenderbot-400M-distill"
-                tokenizer = BlenderbotTokenizer.from_pretrained(model_name)
-                model = BlenderbotForConditionalGeneration.from_pretrained(model_name)
+                    # Model integration (BlenderBot), streamed with sentence-by-sentence back-translation
+                    response, translated_response = ui.stream_ai_message(turn.reply())
 
-                inputs = tokenizer(text, return_tensors="pt", padding=True, truncation=True)
-                reply_ids = model.generate(input_ids=inputs["input_ids"], attention_mask=inputs["attention_mask"], max_length=100)
-                response = tokenizer.decode(reply_ids[0], skip_special_tokens=True)
+                    st.session_state.ai_response = response
 
-                st.session_state.ai_response = response
-                st.session_state.conversation_history.append(f"PolyProse: {response}")
+                    st.session_state.conversation.add(Turn(lang, text, translated_text, response, translated_response))
 
-                translated_response = translate_text("en", lang, response)["translatedText"]
-                display_ai_message(response, translated_response)
+            # Display conversation history (the latest page; older turns are on disk)
+            for turn in st.session_state.conversation.page(0):
+                st.write(f"You: {turn.user_text}")
+                st.write(f"PolyProse: {turn.reply}")
 
-        # Display conversation history
-        for entry in st.session_state.conversation_history:
-            st.write(entry)
+        except Exception as e:
+            ui.show_error(e)
 
-    except Exception as e:
-        st.error(f"An error occurred: {e}")
+    chat_pane(lang)
 
 # SECOND TAB: About Me
 with tabs[1]:
@@ -134,3 +88,6 @@ with tabs[2]:
     st.markdown(f'<a href={argosurl}><button style="background-color:Blue;">Argos Model</button></a>', unsafe_allow_html=True)
     blenderurl = 'https://huggingface.co/docs/transformers/model_doc/blenderbot#transformers.BlenderbotForCausalLM'
     st.markdown(f'<a href={blenderurl}><button style="background-color:Blue;">BlenderBot Model</button></a>', unsafe_allow_html=True)
+
+# DEBUG SIDEBAR -- per-stage timings and counters, only shows up with POLYPROSE_METRICS=1
+metrics.debug_sidebar()
@@ -1,10 +1,10 @@
 import streamlit as st
 from streamlit_mic_recorder import mic_recorder, speech_to_text
-from transformers import BlenderbotTokenizer, BlenderbotForConditionalGeneration
-from google.cloud import translate_v2 as translate
-import google.auth
-
-credentials, project = google.auth.default()
+from polyprose import metrics, ui
+from polyprose.conversation import Conversation, Turn
+# The whole translate -> BlenderBot -> translate back pipeline lives in polyprose.core.
+# Nothing heavy (transformers, google.cloud) is imported until it's actually used
+from polyprose.core import Pipeline
 
 # Create two tabs -- One is "About me", one is "Poly Prose"
 tabs = st.tabs(["PolyProse", "About Me"])
@@ -12,122 +12,79 @@ tabs = st.tabs(["PolyProse", "About Me"])
 # FIRST TAB: Poly Prose (:
 with tabs[0]:
     # AESTHETICS - Put the title on!
-    original_title = "PolyProse: Let's learn together!"
-    st.title(original_title)
-    st.markdown(f"<h1 style='font-size: 50px; text-align: center;'>&#127760;</h1>", unsafe_allow_html=True)
-
-
-    # GOOGLE TRANSLATE / HANDLE INPUT
-    def translate_text(target: str, text: str) -> dict:
-        """Translates text into the target language."""
-        # OLD CODE: Create translate client for local use
-        translate_client = translate.Client()
-        if isinstance(text, bytes):
-            text = text.decode("utf-8")
-        # Translate the text
-        result = translate_client.translate(text, target_language=target)
-        return result
+    ui.header()
 
+    # GOOGLE TRANSLATE / HANDLE INPUT -- credentials are found the first time something gets translated
+    pipeline = Pipeline("google")
 
     # LANGUAGE DROPDOWN - If more time, I would have liked to add more...
-    option = st.selectbox(
-        "Which language are we practicing today?",
-        ("Russian", "French", "Belarusian", "Polish", "Spanish", "Hindi"),
-    )
+    option = ui.language_select(pipeline)
 
     # Set the variable to the language
-    lang_mapping = {"Russian": "ru", "French": "fr", "Belarusian": "be", "Polish": "pl", "Spanish": "es", "Hindi": "hi"}
-    lang = lang_mapping.get(option, "en")
+    lang = pipeline.languages.get(option, "en")
 
+    # BlenderBot started loading the moment the language was picked, so it's ready by the time the user
+    # says something
+    ui.prefetch_language(pipeline, lang)
 
-    # Translate the title using Google Translate API (thanks to examples...)
-    def translate_title(target_language: str) -> str:
-        """Translates the title into the target language."""
-        translation_result = translate_text(target_language, "Let's learn together!")
-        return translation_result["translatedText"]
-
-
-    # Update the title to the translated text based on the selected language!!
-    # First, make sure that the user actually chose something
+    # Update the title to the translated text based on the selected language!! (thanks to examples...)
+    # First, make sure that the user actually chose something. It's pre-translated, so no waiting here
     if option:
-        translated_title = translate_title(lang)
-        st.markdown(f"<h1 style='font-size: 24px; text-align: center;'>{translated_title}</h1>", unsafe_allow_html=True)
-
-
-    # MAKE CHAT BUBBLES - Before this, it was just a wall of text and hard to read.
-    def display_user_message(original_message, translated_message):
-        st.markdown(f"""
-            <div style="background-color: #d1e7dd; padding: 10px; border-radius: 10px; margin: 5px 0;">
-                <strong style="color: black;">You:</strong> <span style="color: black;">{original_message}</span><br>
-                <strong style="color: black;">Translation:</strong> <span style="color: black;">{translated_message}</span>
-            </div>
-        """, unsafe_allow_html=True)
-
-
-    # AI response display function!! For some reason, this was finnicky
-    def display_ai_message(original_message, translated_message):
-        st.markdown(f"""
-            <div style="background-color: #f8d7da; padding: 10px; border-radius: 10px; margin: 5px 0;">
-                <strong style="color: black;">PolyProse:</strong> <span style="color: black;">{original_message}</span><br>
-                <strong style="color: black;">Translation:</strong> <span style="color: black;">{translated_message}</span>
-            </div>
-        """, unsafe_allow_html=True)
-
+        ui.tagline(ui.title(pipeline, lang))
 
     # SPEECH TO TEXT
 
     # This saves the text history (surprisingly finnicky)
     state = st.session_state
 
-    # Get the history started!!
-    if 'conversation_history' not in state:
-        state.conversation_history = []
+    # Get the history started!! Each turn keeps its translations, so nothing is re-translated later
+    if 'conversation' not in state:
+        state.conversation = Conversation()
 
-    # Streamlit has a nice columns thing going on for structure
-    c1, c2 = st.columns(2)
-    with c1:
-        st.write("Convert speech to text:")
-    with c2:
-        text = speech_to_text(language=lang, use_container_width=True, just_once=True, key='STT')
+    # The chat pane reruns on its own: saying something only redoes this part of the page,
+    # not the title, the dropdown or the other tabs
+    @st.fragment
+    def chat_pane(lang):
+        # A failed translation or an open circuit shows up here instead of stopping the whole page
+        try:
+            # Streamlit has a nice columns thing going on for structure
+            c1, c2 = st.columns(2)
+            with c1:
+                st.write("Convert speech to text:")
+            with c2:
+                text = speech_to_text(language=lang, use_container_width=True, just_once=True, key='STT')
 
-    if text:
-        # Put what the user said in the history
-        state.conversation_history.append(f"You: {text}")
+            # Translate!! (in the background -- saying something new cancels the last reply if it's still going)
+            turn = ui.start_turn(pipeline, lang, text, state.conversation.turns()) if text else None
 
-        # Translate!!
-        translated_text = translate_text("en", text)["translatedText"]
+            if text:
+                translated_text = turn.user_translation()
 
-        # Display BOTH!!!!!
-        display_user_message(text, translated_text)
+                # Display BOTH!!!!!
+                ui.display_user_message(text, translated_text)
 
-        # MODEL TIME!
-        # This was the billionth (not literally) model I tried to implement
-        # Ask me if you want to know more about the process. Believe me, I have stories and thoughts
-        model_name = "facebook/blenderbot-400M-distill"
-        tokenizer = BlenderbotTokenizer.from_pretrained(model_name)
-        model = BlenderbotForConditionalGeneration.from_pretrained(model_name)
+                # MODEL TIME!
+                # This was the billionth (not literally) model I tried to implement
+                # Ask me if you want to know more about the process. Believe me, I have stories and thoughts
+                # Generate! The reply streams into the bubble word by word, and we need to translate BACK
+                # because this is technically just for English -- each finished sentence gets translated
+                # while the model is still writing the next one
+                response, translated_response = ui.stream_ai_message(turn.reply())
 
-        # Generate!
-        # Quick note -- The attention_mask helps the nonsense responses NOT Be in there. Plenty were before...
-        inputs = tokenizer(text, return_tensors="pt", padding=True, truncation=True)
-        reply_ids = model.generate(input_ids=inputs["input_ids"], attention_mask=inputs["attention_mask"],
-                                   max_length=100)
-        response = tokenizer.decode(reply_ids[0], skip_special_tokens=True)
+                # Save!
+                st.session_state.ai_response = response
 
-        # Save!
-        st.session_state.ai_response = response
-        state.conversation_history.append(f"PolyProse: {response}")
+                # Put the whole exchange in the history (translations included)
+                state.conversation.add(Turn(lang, text, translated_text, response, translated_response))
 
-        # Okay, now we need to translate BACK because this is technically just for English
-        translated_response = translate_text(lang, response)["translatedText"]
+            # Display the conversation history and translations -- just reading what we stored, a page at a time
+            # (the newest turn is already on screen above)
+            ui.history_pages(state.conversation, skip_newest=1 if text else 0)
 
-        # Display AI response and its translation in the same bubble
-        display_ai_message(response, translated_response)
+        except Exception as e:
+            ui.show_error(e)
 
-    # Display the conversation history and translations
-    for entry in state.conversation_history:
-        user_text = entry.split(": ", 1)[1]
-        translated_text = translate_text("en", user_text)["translatedText"]
+    chat_pane(lang)
 
 # SECOND TAB -- All about me!
 with tabs[1]:
@@ -154,3 +111,6 @@ with tabs[1]:
         st.write(' ')
 
         st.markdown("<div style='text-align: center;'>", unsafe_allow_html=True)
+
+# DEBUG SIDEBAR -- per-stage timings and counters, only shows up with POLYPROSE_METRICS=1
+metrics.debug_sidebar()
@@ -0,0 +1,9 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def data_dir(tmp_path, monkeypatch):
+    """Keeps caches, spill files and manifests out of ~/.cache/polyprose."""
+    monkeypatch.setenv("POLYPROSE_DATA_DIR", str(tmp_path / "data"))
+    monkeypatch.setenv("POLYPROSE_CACHE_PATH", str(tmp_path / "cache.sqlite3"))
+    return tmp_path / "data"
@@ -0,0 +1,25 @@
+from polyprose import argos_backend
+from polyprose.argos_backend import MAX_BATCH_SIZE, split_sentences, sub_batch_size
+
+
+def test_sub_batches_spread_over_every_replica():
+    assert sub_batch_size(6, 3) == 2
+    assert sub_batch_size(7, 4) == 2
+    assert sub_batch_size(1, 4) == 1
+    assert sub_batch_size(0, 4) == 1
+
+
+def test_sub_batches_stay_under_the_maximum():
+    assert sub_batch_size(1000, 2) == MAX_BATCH_SIZE
+
+
+def test_threads_use_every_core(monkeypatch):
+    monkeypatch.setenv("POLYPROSE_ARGOS_THREADS", "2")
+    inter, intra = argos_backend._threads()
+    assert inter == 2
+    assert intra >= 1
+
+
+def test_split_sentences():
+    assert split_sentences("Hi. How are you? Fine!") == ["Hi.", "How are you?", "Fine!"]
+    assert split_sentences("नमस्ते। आप कैसे हैं?") == ["नमस्ते।", "आप कैसे हैं?"]
@@ -0,0 +1,40 @@
+import json
+import sys
+
+from polyprose import argos_registry, core
+from polyprose.argos_registry import MANIFEST_NAME, ArgosRegistry
+
+
+def _seed(folder, pairs):
+    folder.mkdir(parents=True, exist_ok=True)
+    packages = [{"from_code": a, "to_code": b, "version": "1", "filename": f"{a}_{b}.argosmodel", "sha256": ""}
+                for a, b in pairs]
+    (folder / MANIFEST_NAME).write_text(json.dumps({"packages": packages}))
+    return folder
+
+
+def test_known_pairs_come_from_the_manifest(tmp_path):
+    registry = ArgosRegistry(package_dir=_seed(tmp_path / "packages", [("en", "ru"), ("ru", "en")]),
+                             state_dir=tmp_path / "state")
+    assert registry.known_pairs() == {("en", "ru"), ("ru", "en")}
+
+
+def test_known_pairs_include_what_we_installed(tmp_path):
+    state = tmp_path / "state"
+    state.mkdir()
+    (state / argos_registry.INSTALLED_NAME).write_text(json.dumps(
+        {"en-pl": {"from_code": "en", "to_code": "pl", "sha256": "", "source": "index", "installed_at": 0}}))
+    assert ArgosRegistry(state_dir=state).known_pairs() == {("en", "pl")}
+
+
+def test_languages_dont_import_argostranslate(tmp_path, monkeypatch):
+    monkeypatch.setenv("POLYPROSE_ARGOS_PACKAGES", str(_seed(tmp_path / "packages", [("be", "en"), ("en", "be")])))
+    monkeypatch.setattr(argos_registry, "_registry", None)
+    monkeypatch.delitem(sys.modules, "argostranslate", raising=False)
+    monkeypatch.delitem(sys.modules, "argostranslate.package", raising=False)
+
+    languages = core.languages("argos")
+
+    assert languages["Belarusian"] == "be"
+    assert "Russian" in languages
+    assert "argostranslate" not in sys.modules
@@ -0,0 +1,74 @@
+import json
+
+import pytest
+
+from polyprose import batch
+from polyprose.batch import Checkpoint
+from polyprose.conversation import Turn
+
+
+class _StubPipeline:
+    def run_turns(self, lang, texts):
+        if lang == "xx":
+            raise LookupError("no package for xx")
+        return [Turn(lang, text, f"en:{text}", f"reply:{text}", f"{lang}:reply:{text}") for text in texts]
+
+
+def _write_jsonl(path, records):
+    path.write_text("".join(json.dumps(record) + "\n" for record in records))
+    return path
+
+
+def test_checkpoint_round_trip(tmp_path):
+    checkpoint = Checkpoint(tmp_path / "out.jsonl")
+    assert checkpoint.load() == {}
+
+    checkpoint.save({"input": "in.jsonl", "records": 32, "bytes": 4096, "errors": 1})
+    assert Checkpoint(tmp_path / "out.jsonl").load()["records"] == 32
+    assert not checkpoint.path.with_suffix(".tmp").exists()
+
+    checkpoint.clear()
+    assert not checkpoint.path.exists()
+    checkpoint.clear()
+
+
+def test_run_chunk_batches_by_language_and_keeps_order(monkeypatch):
+    monkeypatch.setattr(batch, "_pipeline", _StubPipeline())
+    records = [{"lang": "ru", "text": "a"}, {"lang": "xx", "text": "b"}, {"lang": "ru", "text": "c"}, {"text": "d"}]
+
+    results = batch.run_chunk(records)
+
+    assert [r.get("reply") for r in results] == ["reply:a", None, "reply:c", None]
+    assert results[1]["error"] == "LookupError: no package for xx"
+    assert "lang" in results[3]["error"]
+    assert "error" not in results[0] and "reply" not in records[0]
+
+
+def test_read_records_skips_blank_lines_and_done_records(tmp_path):
+    path = tmp_path / "in.jsonl"
+    path.write_text('{"text": "a"}\n\n{"text": "b"}\n{"text": "c"}\n')
+    assert [r["text"] for r in batch.read_records(path, skip=1)] == ["b", "c"]
+    assert [len(chunk) for chunk in batch.chunked(range(5), 2)] == [2, 2, 1]
+
+
+def test_resume_drops_output_written_after_the_checkpoint(tmp_path):
+    source = _write_jsonl(tmp_path / "in.jsonl", [{"lang": "ru", "text": "a"}])
+    output = tmp_path / "out.jsonl"
+    done = json.dumps({"lang": "ru", "text": "a", "reply": "hi"}) + "\n"
+    output.write_text(done + '{"lang": "ru", "te')
+    Checkpoint(output).save({"input": str(source.resolve()), "records": 1, "bytes": len(done), "errors": 0})
+
+    # Every record is already done, so no worker ever starts
+    summary = batch.run(source, output, resume=True, log=None)
+
+    assert summary["records"] == 1
+    assert output.read_text() == done
+
+
+def test_resume_refuses_another_inputs_checkpoint(tmp_path):
+    source = _write_jsonl(tmp_path / "in.jsonl", [{"lang": "ru", "text": "a"}])
+    output = tmp_path / "out.jsonl"
+    Checkpoint(output).save({"input": str(tmp_path / "other.jsonl"), "records": 1, "bytes": 0, "errors": 0})
+
+    with pytest.raises(ValueError):
+        batch.run(source, output, resume=True)
@@ -0,0 +1,146 @@
+import pytest
+
+from polyprose import batcher
+from polyprose.batcher import _FanOutStreamer, _rows_per_request
+
+
+class Rows(list):
+    """Just enough of a tensor for the fan-out: a shape and row slicing."""
+
+    @property
+    def shape(self):
+        return (len(self),)
+
+    def __getitem__(self, item):
+        result = list.__getitem__(self, item)
+        return Rows(result) if isinstance(item, slice) else result
+
+
+class Recorder:
+    def __init__(self):
+        self.values = []
+        self.ended = False
+
+    def put(self, value):
+        self.values.append(list(value))
+
+    def end(self):
+        self.ended = True
+
+
+def test_fan_out_gives_each_request_its_own_row():
+    first, second = Recorder(), Recorder()
+    streamer = _FanOutStreamer([first, None, second])
+    streamer.put(Rows(["a", "b", "c"]))
+    streamer.end()
+    assert first.values == [["a"]]
+    assert second.values == [["c"]]
+    assert first.ended and second.ended
+
+
+def test_rows_per_request():
+    assert _rows_per_request(8, 8) == 1
+    assert _rows_per_request(20, 2) == 10
+    assert _rows_per_request(3, 0) == 3
+
+
+def test_stop_criteria_covers_every_beam():
+    import threading
+
+    torch = pytest.importorskip("torch")
+    pytest.importorskip("transformers")
+    from polyprose.batcher import stop_criteria
+
+    stopped, running = threading.Event(), threading.Event()
+    stopped.set()
+    criteria = stop_criteria([stopped, running])[0]
+    flags = criteria(torch.zeros((6, 1), dtype=torch.long), None)
+    assert flags.tolist() == [True, True, True, False, False, False]
+
+
+class FakeTokenizer:
+    pad_token_id = 0
+
+    def batch_decode(self, reply_ids, skip_special_tokens=True):
+        return [f"reply to {ids}" for ids in reply_ids]
+
+
+class FakeModel:
+    """Records every generate call; fails for max_length 99."""
+
+    def __init__(self):
+        self.calls = []
+
+    def generate(self, batch, max_length, streamer=None, stopping_criteria=None, **options):
+        self.calls.append((max_length, streamer is not None, list(batch), options))
+        if max_length == 99:
+            raise MemoryError("out of memory")
+        return batch
+
+
+class FakeBuilder:
+    def batch_inputs(self, model, batch):
+        return {"batch": batch}
+
+
+def _fake_batcher(monkeypatch, **kwargs):
+    model = FakeModel()
+    monkeypatch.setattr(batcher, "get_blenderbot", lambda model_name: (FakeTokenizer(), model))
+    monkeypatch.setattr(batcher, "get_builder", lambda model_name: FakeBuilder())
+    return batcher.GenerateBatcher("fake", **kwargs), model
+
+
+def test_concurrent_requests_share_one_generate_call(monkeypatch):
+    scheduler, model = _fake_batcher(monkeypatch, max_batch_size=8, max_wait_seconds=0.5)
+
+    futures = [scheduler.submit([i], 20) for i in range(3)]
+
+    assert [future.result(timeout=5) for future in futures] == ["reply to [0]", "reply to [1]", "reply to [2]"]
+    assert [(max_length, len(batch)) for max_length, _, batch, _ in model.calls] == [(20, 3)]
+    assert scheduler.stats()["avg_batch_size"] == 3.0
+
+
+def test_batches_are_split_by_max_length_and_streaming(monkeypatch):
+    scheduler, model = _fake_batcher(monkeypatch, max_batch_size=8, max_wait_seconds=0.5)
+
+    futures = [
+        scheduler.submit([1], 20),
+        scheduler.submit([2], 40),
+        scheduler.submit([3], 20, streamer=Recorder()),
+        scheduler.submit([4], 20),
+    ]
+    for future in futures:
+        future.result(timeout=5)
+
+    calls = {(max_length, streamed): (batch, options) for max_length, streamed, batch, options in model.calls}
+    assert calls == {
+        (20, False): ([[1], [4]], {}),
+        (40, False): ([[2]], {}),
+        # Streamed rows are greedy, whole replies keep the model's beams
+        (20, True): ([[3]], {"num_beams": 1}),
+    }
+
+
+def test_a_failed_generate_fails_every_request_in_the_batch(monkeypatch):
+    scheduler, model = _fake_batcher(monkeypatch, max_batch_size=8, max_wait_seconds=0.5)
+    streamed = Recorder()
+
+    failing = [scheduler.submit([1], 99), scheduler.submit([2], 99, streamer=streamed)]
+    fine = scheduler.submit([3], 20)
+
+    for future in failing:
+        with pytest.raises(MemoryError):
+            future.result(timeout=5)
+    # The streamed reader isn't left waiting
+    assert streamed.ended
+    assert fine.result(timeout=5) == "reply to [3]"
+
+
+def test_batches_stop_at_the_maximum_size(monkeypatch):
+    scheduler, model = _fake_batcher(monkeypatch, max_batch_size=2, max_wait_seconds=0.5)
+
+    futures = [scheduler.submit([i], 20) for i in range(5)]
+    for future in futures:
+        future.result(timeout=5)
+
+    assert [len(batch) for _, _, batch, _ in model.calls] == [2, 2, 1]
@@ -0,0 +1,110 @@
+import pytest
+
+from polyprose import cache
+from polyprose.cache import TranslationCache, cached_batch, cached_translation
+
+
+@pytest.fixture
+def fresh_cache(tmp_path, monkeypatch):
+    """A process-wide cache of our own, on a temp file."""
+    monkeypatch.setattr(cache, "_cache", TranslationCache(tmp_path / "cache.sqlite3"))
+    return cache._cache
+
+
+def _commits(db):
+    statements = []
+    db.set_trace_callback(statements.append)
+    return lambda: sum(statement.strip() == "COMMIT" for statement in statements)
+
+
+def test_memory_tier_evicts_the_least_recently_used():
+    memory = TranslationCache(max_memory_items=2)
+    memory.put("argos", "en-ru", "a", "А")
+    memory.put("argos", "en-ru", "b", "Б")
+    memory.get("argos", "en-ru", "a")
+    memory.put("argos", "en-ru", "c", "В")
+
+    assert memory.get("argos", "en-ru", "b") is None
+    assert memory.get("argos", "en-ru", "a") == "А"
+    assert memory.memory_evictions == 1
+
+
+def test_disk_tier_survives_a_restart(tmp_path):
+    path = tmp_path / "nested" / "dir" / "cache.sqlite3"
+    TranslationCache(path).put("google", "ru", "hello", {"translatedText": "привет"})
+
+    reopened = TranslationCache(path)
+
+    assert reopened.get("google", "ru", "hello") == {"translatedText": "привет"}
+    assert reopened.disk_hits == 1
+    # Now in memory too
+    reopened.get("google", "ru", "hello")
+    assert reopened.disk_hits == 1 and reopened.hits == 2
+
+
+def test_disk_tier_evicts_the_least_recently_used(tmp_path):
+    path = tmp_path / "cache.sqlite3"
+    first = TranslationCache(path, max_memory_items=1, max_disk_items=2)
+    first.put("argos", "en-ru", "old", "1")
+    first.put("argos", "en-ru", "used", "2")
+
+    second = TranslationCache(path, max_memory_items=1, max_disk_items=2)
+    second.get("argos", "en-ru", "old")  # a disk hit: "old" is now the most recently used
+    second.EVICT_EVERY = 1
+    second.put("argos", "en-ru", "new", "3")
+
+    third = TranslationCache(path)
+    assert third.get("argos", "en-ru", "used") is None
+    assert third.get("argos", "en-ru", "old") == "1"
+    assert second.disk_evictions == 1
+
+
+def test_disk_hits_dont_commit_one_by_one(tmp_path):
+    path = tmp_path / "cache.sqlite3"
+    TranslationCache(path).put_many("argos", "en-ru", [(str(i), str(i)) for i in range(10)])
+    reopened = TranslationCache(path)
+    commits = _commits(reopened._db)
+
+    assert reopened.get_many("argos", "en-ru", [str(i) for i in range(10)]) == [str(i) for i in range(10)]
+    assert commits() == 0
+    reopened.flush()
+    assert commits() == 1
+
+
+def test_cached_batch_translates_only_the_missing_texts_once(fresh_cache):
+    fresh_cache.put("argos", "en-ru", "cat", "кот")
+    commits = _commits(fresh_cache._db)
+    calls = []
+
+    def translate_many(missing):
+        calls.append(list(missing))
+        return [text.upper() for text in missing]
+
+    results = cached_batch("argos", "en-ru", ["dog", "cat", b"dog", "sun"], translate_many)
+
+    assert results == ["DOG", "кот", "DOG", "SUN"]
+    assert calls == [["dog", "sun"]]
+    assert commits() == 1
+    assert cached_batch("argos", "en-ru", ["sun", "dog"], translate_many) == ["SUN", "DOG"]
+    assert len(calls) == 1
+
+
+def test_cached_translation_keys_on_every_language(fresh_cache):
+    calls = []
+
+    @cached_translation("argos")
+    def translate_text(from_language, to_language, text):
+        calls.append((from_language, to_language, text))
+        return {"translatedText": f"{to_language}:{text}"}
+
+    assert translate_text("en", "ru", "hi") == {"translatedText": "ru:hi"}
+    assert translate_text("en", "ru", "hi") == {"translatedText": "ru:hi"}
+    assert translate_text("en", "fr", "hi") == {"translatedText": "fr:hi"}
+    assert len(calls) == 2
+
+
+def test_no_disk_tier_when_turned_off(tmp_path):
+    memory_only = TranslationCache(tmp_path / "cache.sqlite3", max_disk_items=0)
+    memory_only.put("argos", "en-ru", "a", "А")
+    assert memory_only.get("argos", "en-ru", "a") == "А"
+    assert not (tmp_path / "cache.sqlite3").exists()
@@ -0,0 +1,86 @@
+import pytest
+
+from polyprose.context import ContextBuilder
+
+
+class WordTokenizer:
+    """One id per word (and one for the separator), enough to count tokens."""
+    eos_token_id = 2
+    model_max_length = 128
+
+    def __init__(self):
+        self.vocab = {}
+        self.calls = 0
+
+    def __call__(self, text, add_special_tokens=False):
+        self.calls += 1
+        if not text.strip():
+            return {"input_ids": [1]}
+        return {"input_ids": [self.vocab.setdefault(word, len(self.vocab) + 10) for word in text.split()]}
+
+
+def test_current_utterance_only_without_history():
+    tokenizer = WordTokenizer()
+    builder = ContextBuilder(tokenizer, max_tokens=16)
+    ids = builder.input_ids("hello there")
+    assert len(ids) == 3
+    assert ids[-1] == tokenizer.eos_token_id
+
+
+def test_oldest_turns_drop_off_first():
+    tokenizer = WordTokenizer()
+    builder = ContextBuilder(tokenizer, max_tokens=12)
+    history = [("one one", "two two"), ("three three", "four four")]
+    ids = builder.input_ids("now", history)
+    # 1 for now + </s>, 6 per turn (2 + sep + 2 + sep): only the newest turn fits in 12
+    assert len(ids) == 8
+    assert tokenizer.vocab["three"] in ids
+    assert tokenizer.vocab.get("one") not in ids
+
+
+def test_turns_are_tokenized_once():
+    tokenizer = WordTokenizer()
+    builder = ContextBuilder(tokenizer, max_tokens=64)
+    history = [("a b", "c d")]
+    builder.input_ids("e", history)
+    calls = tokenizer.calls
+    builder.input_ids("f", history)
+    # Only the new utterance
+    assert tokenizer.calls == calls + 1
+
+
+def test_max_turns_zero_ignores_history():
+    builder = ContextBuilder(WordTokenizer(), max_tokens=64, max_turns=0)
+    assert len(builder.input_ids("x", [("a", "b")])) == 2
+
+
+def test_batch_inputs_reuse_the_cache_without_changing_it():
+    pytest.importorskip("torch")
+    pytest.importorskip("transformers")
+
+    class Encoder:
+        calls = 0
+
+        def __call__(self, input_ids, attention_mask, return_dict):
+            Encoder.calls += 1
+            from transformers.modeling_outputs import BaseModelOutput
+            return BaseModelOutput(last_hidden_state=input_ids.unsqueeze(-1).float().repeat(1, 1, 4))
+
+    class Model:
+        encoder = Encoder()
+
+        def get_encoder(self):
+            return self.encoder
+
+    builder = ContextBuilder(WordTokenizer(), encoder_cache_items=8)
+    model = Model()
+    inputs = builder.batch_inputs(model, [[5, 6, 7], [8]])
+    assert inputs["encoder_outputs"].last_hidden_state.shape == (2, 3, 4)
+    assert inputs["attention_mask"].tolist() == [[1, 1, 1], [1, 0, 0]]
+    # The ids go along too, for encoder_no_repeat_ngram_size
+    assert inputs["input_ids"].tolist() == [[5, 6, 7], [8, 0, 0]]
+    # What generate() does for beam search must not reach the cache
+    inputs["encoder_outputs"]["last_hidden_state"] = inputs["encoder_outputs"].last_hidden_state.repeat_interleave(3, 0)
+    again = builder.generate_inputs(model, [5, 6, 7])
+    assert again["encoder_outputs"].last_hidden_state.shape == (1, 3, 4)
+    assert Encoder.calls == 2
@@ -0,0 +1,78 @@
+from polyprose import conversation
+from polyprose.conversation import Conversation, Turn
+
+
+def _turn(i):
+    return Turn("ru", f"привет {i}", f"hello {i}", f"reply {i}", f"ответ {i}")
+
+
+def _texts(turns):
+    return [turn.user_translation for turn in turns]
+
+
+def test_only_the_latest_turns_stay_in_memory():
+    chat = Conversation(max_turns=3)
+    for i in range(5):
+        chat.add(_turn(i))
+
+    assert _texts(chat.turns()) == ["hello 2", "hello 3", "hello 4"]
+    assert len(chat) == 5
+
+
+def test_slices_read_spilled_and_recent_turns_in_order():
+    chat = Conversation(max_turns=3)
+    for i in range(7):
+        chat.add(_turn(i))
+
+    assert chat.slice(0, 7) == [_turn(i) for i in range(7)]
+    assert _texts(chat.slice(2, 5)) == ["hello 2", "hello 3", "hello 4"]
+    assert _texts(chat.slice(-3, 2)) == ["hello 0", "hello 1"]
+
+
+def test_pages_count_back_from_the_newest():
+    chat = Conversation(max_turns=2)
+    for i in range(5):
+        chat.add(_turn(i))
+
+    assert _texts(chat.page(0, per_page=2)) == ["hello 3", "hello 4"]
+    assert _texts(chat.page(2, per_page=2)) == ["hello 0"]
+    assert chat.page(3, per_page=2) == []
+    assert chat.page_count(per_page=2) == 3
+    # The apps show the newest turn on its own, above the history
+    assert _texts(chat.page(0, per_page=2, skip_newest=1)) == ["hello 2", "hello 3"]
+    assert chat.page_count(per_page=2, skip_newest=1) == 2
+
+
+def test_without_spill_older_turns_are_dropped():
+    chat = Conversation(max_turns=2, spill=False)
+    for i in range(4):
+        chat.add(_turn(i))
+
+    assert len(chat) == 2
+    assert _texts(chat.slice(0, 10)) == ["hello 2", "hello 3"]
+    assert not list(conversation.spill_dir().glob("*.sqlite3"))
+
+
+def test_clear_deletes_the_spill_file():
+    chat = Conversation(max_turns=1)
+    chat.add(_turn(0))
+    chat.add(_turn(1))
+    [path] = conversation.spill_dir().glob("*.sqlite3")
+
+    chat.clear()
+
+    assert not path.exists()
+    assert len(chat) == 0
+    chat.add(_turn(2))
+    assert _texts(chat.slice(0, 5)) == ["hello 2"]
+
+
+def test_the_spill_file_goes_with_the_conversation():
+    chat = Conversation(max_turns=1)
+    chat.add(_turn(0))
+    chat.add(_turn(1))
+    [path] = conversation.spill_dir().glob("*.sqlite3")
+
+    del chat
+
+    assert not path.exists()
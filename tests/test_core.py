@@ -0,0 +1,72 @@
+import threading
+from concurrent.futures import CancelledError
+
+import pytest
+
+from polyprose import core, responder
+from polyprose.conversation import Turn
+
+
+class _StubPipeline(core.Pipeline):
+    """Argos pipeline with the models swapped for string functions."""
+
+    def __init__(self, translation_gate=None):
+        super().__init__("argos")
+        self.gate = translation_gate
+        self.replies_started = []
+
+    def _translate(self, from_language, to_language, text):
+        if self.gate is not None:
+            self.gate.wait(5)
+        return f"{to_language}:{text}"
+
+    def _stream_respond(self, english_text, translate_fn, pairs):
+        self.replies_started.append((english_text, pairs))
+        return responder.StreamedReply(iter(["Sure. ", "Why not?"]), translate_fn)
+
+    def prepare(self, lang):
+        return []
+
+
+@pytest.fixture(params=["4", "0"], ids=["threads", "serial"])
+def workers(request, monkeypatch):
+    monkeypatch.setenv("POLYPROSE_PIPELINE_WORKERS", request.param)
+
+
+def test_a_pending_turn_finishes_like_run_turn(workers):
+    pipeline = _StubPipeline()
+    history = [Turn("ru", "привет", "en:привет", "Hi!", "ru:Hi!")]
+
+    pending = pipeline.start_turn("ru", "как дела?", history)
+    history.append(Turn("ru", "later", "en:later"))
+    turn = pending.result()
+
+    assert turn == Turn("ru", "как дела?", "en:как дела?", "Sure. Why not?", "ru:Sure. ru:Why not?")
+    # The reply saw the history as it was when the turn started
+    assert pipeline.replies_started == [("en:как дела?", [("en:привет", "Hi!")])]
+
+
+def test_cancelling_before_the_translation_never_starts_the_reply(monkeypatch):
+    monkeypatch.setenv("POLYPROSE_PIPELINE_WORKERS", "4")
+    gate = threading.Event()
+    pipeline = _StubPipeline(gate)
+
+    pending = pipeline.start_turn("ru", "привет")
+    pending.cancel()
+    gate.set()
+
+    assert pending.cancelled
+    with pytest.raises(CancelledError):
+        pending.reply(timeout=5)
+    assert pipeline.replies_started == []
+
+
+def test_cancelling_a_started_reply_stops_it(monkeypatch):
+    monkeypatch.setenv("POLYPROSE_PIPELINE_WORKERS", "4")
+    pipeline = _StubPipeline()
+
+    pending = pipeline.start_turn("ru", "привет")
+    reply = pending.reply(timeout=5)
+    pending.cancel()
+
+    assert reply.cancelled
@@ -0,0 +1,111 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from polyprose.google_backend import ClientPool, Coalescer
+
+
+def test_pool_reuses_clients_up_to_its_size():
+    created = []
+    pool = ClientPool(2, factory=lambda: created.append(object()) or created[-1])
+    with pool.client() as first, pool.client() as second:
+        assert first is not second
+    with pool.client() as again:
+        assert again in (first, second)
+    assert len(created) == 2
+
+
+def test_pool_waits_for_a_client_when_all_are_out():
+    pool = ClientPool(1, factory=object)
+    got = []
+    with pool.client() as client:
+        waiter = threading.Thread(target=lambda: got.append(pool._checkout()))
+        waiter.start()
+        waiter.join(0.1)
+        assert waiter.is_alive()
+    waiter.join(1)
+    assert got == [client]
+
+
+def test_failing_factory_gives_its_slot_back():
+    def factory():
+        raise ValueError("bad credentials")
+
+    pool = ClientPool(2, factory=factory)
+    for _ in range(5):
+        with pytest.raises(ValueError):
+            with pool.client():
+                pass
+    # Would block forever if the failed creations had used up the slots
+    done = threading.Event()
+    thread = threading.Thread(target=lambda: (pytest.raises(ValueError, pool._checkout), done.set()))
+    thread.start()
+    thread.join(1)
+    assert done.is_set()
+
+
+def test_waiter_gets_the_slot_of_a_failed_creation():
+    release = threading.Event()
+    calls = []
+
+    def factory():
+        calls.append(1)
+        if len(calls) == 1:
+            release.wait(1)
+            raise ValueError("first one fails")
+        return "client"
+
+    pool = ClientPool(1, factory=factory)
+    with ThreadPoolExecutor(2) as executor:
+        failing = executor.submit(pool._checkout)
+        while not calls:
+            pass
+        waiting = executor.submit(pool._checkout)
+        release.set()
+        with pytest.raises(ValueError):
+            failing.result(1)
+        assert waiting.result(1) == "client"
+
+
+def test_coalescer_merges_concurrent_calls_into_one_request():
+    sent = []
+
+    def send(from_language, to_language, texts):
+        sent.append(list(texts))
+        return [{"translatedText": f"[{to_language}] {text}"} for text in texts]
+
+    coalescer = Coalescer(0.05, send=send)
+    texts = ["a", "b", "a", "c"]
+    with ThreadPoolExecutor(len(texts)) as executor:
+        results = list(executor.map(lambda text: coalescer.translate(None, "ru", text), texts))
+    assert [result["translatedText"] for result in results] == ["[ru] a", "[ru] b", "[ru] a", "[ru] c"]
+    assert len(sent) == 1
+    # Duplicates are only sent once
+    assert sorted(sent[0]) == ["a", "b", "c"]
+
+
+def test_coalescer_sends_a_full_bucket_right_away():
+    sent = []
+
+    def send(from_language, to_language, texts):
+        sent.append(list(texts))
+        return [{"translatedText": text} for text in texts]
+
+    coalescer = Coalescer(5.0, max_segments=2, send=send)
+    with ThreadPoolExecutor(2) as executor:
+        futures = [executor.submit(coalescer.translate, None, "fr", text) for text in ("x", "y")]
+        assert [future.result(2)["translatedText"] for future in futures] == ["x", "y"]
+    assert len(sent) == 1
+
+
+def test_coalescer_passes_errors_to_every_caller():
+    def send(from_language, to_language, texts):
+        raise ConnectionError("down")
+
+    coalescer = Coalescer(0.02, send=send)
+    with ThreadPoolExecutor(3) as executor:
+        futures = [executor.submit(coalescer.translate, None, "pl", text) for text in ("a", "b", "c")]
+        for future in futures:
+            with pytest.raises(ConnectionError):
+                future.result(2)
@@ -0,0 +1,73 @@
+import pytest
+
+from polyprose import metrics
+
+
+@pytest.fixture
+def recording(monkeypatch):
+    monkeypatch.delenv("POLYPROSE_METRICS_PORT", raising=False)
+    monkeypatch.delenv("POLYPROSE_METRICS_FILE", raising=False)
+    metrics.reset()
+    metrics.enable()
+    yield
+    metrics.disable()
+    metrics.reset()
+
+
+def test_nothing_is_recorded_when_off():
+    metrics.reset()
+    metrics.count("translated_segments", 3, backend="argos")
+    with metrics.span("generate"):
+        pass
+    assert metrics.render_prometheus() == "\n"
+
+
+def test_counters_and_gauges(recording):
+    metrics.count("translated_segments", 3, backend="argos")
+    metrics.count("translated_segments", 2, backend="argos")
+    metrics.count("translated_segments", backend="google")
+    metrics.gauge("model_residency_bytes", 2048, pool="translators")
+
+    lines = metrics.render_prometheus().splitlines()
+
+    assert "# TYPE polyprose_translated_segments_total counter" in lines
+    assert 'polyprose_translated_segments_total{backend="argos"} 5' in lines
+    assert 'polyprose_translated_segments_total{backend="google"} 1' in lines
+    assert "# TYPE polyprose_model_residency_bytes gauge" in lines
+    assert 'polyprose_model_residency_bytes{pool="translators"} 2048' in lines
+
+
+def test_histograms_are_cumulative(recording):
+    metrics.observe("generate", 0.003, batched="yes")
+    metrics.observe("generate", 0.2, batched="yes")
+    metrics.observe("generate", 100.0, batched="yes")
+
+    lines = metrics.render_prometheus().splitlines()
+
+    assert "# TYPE polyprose_generate_seconds histogram" in lines
+    assert 'polyprose_generate_seconds_bucket{batched="yes",le="0.001"} 0' in lines
+    assert 'polyprose_generate_seconds_bucket{batched="yes",le="0.005"} 1' in lines
+    assert 'polyprose_generate_seconds_bucket{batched="yes",le="0.25"} 2' in lines
+    assert 'polyprose_generate_seconds_bucket{batched="yes",le="60.0"} 2' in lines
+    assert 'polyprose_generate_seconds_bucket{batched="yes",le="+Inf"} 3' in lines
+    assert 'polyprose_generate_seconds_count{batched="yes"} 3' in lines
+    assert any(line.startswith('polyprose_generate_seconds_sum{batched="yes"} 100.20') for line in lines)
+
+
+def test_label_values_are_escaped(recording):
+    metrics.count("errors", kind='say "hi"\\\n')
+    assert 'polyprose_errors_total{kind="say \\"hi\\"\\\\\\n"} 1' in metrics.render_prometheus().splitlines()
+
+
+def test_labels_are_sorted_and_unlabelled_metrics_have_none(recording):
+    metrics.count("loads", pool="translators", backend="argos")
+    metrics.count("batches")
+    lines = metrics.render_prometheus().splitlines()
+    assert 'polyprose_loads_total{backend="argos",pool="translators"} 1' in lines
+    assert "polyprose_batches_total 1" in lines
+
+
+def test_spans_time_a_stage(recording):
+    with metrics.span("translate_request", backend="argos"):
+        pass
+    assert metrics.snapshot()["timings"]["translate_request{backend=argos}"]["count"] == 1
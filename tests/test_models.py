@@ -0,0 +1,21 @@
+import importlib
+import sys
+
+
+def test_imports_without_the_unix_only_resource_module(monkeypatch):
+    # As on Windows: `import resource` raises ImportError
+    monkeypatch.setitem(sys.modules, "resource", None)
+    from polyprose import models
+
+    try:
+        reloaded = importlib.reload(models)
+        assert reloaded.current_rss_bytes() >= 0
+    finally:
+        monkeypatch.undo()
+        importlib.reload(models)
+
+
+def test_current_rss_is_measured():
+    from polyprose.models import current_rss_bytes
+
+    assert current_rss_bytes() > 0
@@ -0,0 +1,86 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+
+from polyprose import prefetch
+
+PIPELINE = SimpleNamespace(backend="argos", model_name="blenderbot")
+
+
+@pytest.fixture
+def steps(monkeypatch):
+    """One prefetch worker and two stub steps; the first one waits for `gate`."""
+    executor = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(prefetch, "_executor", executor)
+    monkeypatch.setattr(prefetch, "_prefetches", {})
+    monkeypatch.setenv("POLYPROSE_PREFETCH_WORKERS", "1")
+    gate, started = threading.Event(), threading.Event()
+    ran = []
+
+    def load(name, stop):
+        started.set()
+        gate.wait(5)
+        ran.append(name)
+
+    def warm(name, stop):
+        ran.append(name)
+
+    monkeypatch.setattr(prefetch, "_steps", lambda backend, lang, model_name: [
+        ("model", load, (f"model-{lang}",)), ("warm", warm, (f"warm-{lang}",)),
+    ])
+    yield SimpleNamespace(gate=gate, started=started, ran=ran)
+    gate.set()
+    executor.shutdown(wait=True)
+
+
+def test_a_second_session_joins_the_prefetch_in_flight(steps):
+    first = prefetch.start(PIPELINE, "ru")
+    second = prefetch.start(PIPELINE, "ru")
+    steps.gate.set()
+
+    assert second is first
+    assert first.wait(5)
+    assert steps.ran == ["model-ru", "warm-ru"]
+
+
+def test_release_cancels_steps_that_have_not_started(steps):
+    pending = prefetch.start(PIPELINE, "ru")
+    assert steps.started.wait(5)
+    pending.release()
+    steps.gate.set()
+
+    pending.futures[0].result(timeout=5)
+    assert pending.cancelled
+    assert pending.futures[1].cancelled()
+    # The load that was already running finished; the warm-up never ran
+    assert steps.ran == ["model-ru"]
+    assert prefetch.start(PIPELINE, "ru") is not pending
+
+
+def test_release_waits_for_the_last_session(steps):
+    first = prefetch.start(PIPELINE, "ru")
+    prefetch.start(PIPELINE, "ru")
+    first.release()
+    steps.gate.set()
+
+    assert first.wait(5)
+    assert not first.cancelled
+    assert steps.ran == ["model-ru", "warm-ru"]
+
+
+def test_a_finished_prefetch_is_started_again(steps):
+    steps.gate.set()
+    first = prefetch.start(PIPELINE, "ru")
+    assert first.wait(5)
+
+    second = prefetch.start(PIPELINE, "ru")
+    assert second is not first
+    assert second.wait(5)
+    assert steps.ran == ["model-ru", "warm-ru"] * 2
+
+
+def test_off_without_workers(monkeypatch):
+    monkeypatch.setenv("POLYPROSE_PREFETCH_WORKERS", "0")
+    assert prefetch.start(PIPELINE, "ru") is None
@@ -0,0 +1,96 @@
+import threading
+import time
+
+import pytest
+
+from polyprose.residency import ResidencyManager
+
+
+def _load(manager, key, size=10):
+    return manager.load(key, lambda: f"model {key}", size)
+
+
+def test_lru_evicts_the_least_recently_used():
+    manager = ResidencyManager(budget_bytes=20, policy="lru")
+    _load(manager, "a")
+    _load(manager, "b")
+    manager.get("a")
+    _load(manager, "c")
+
+    assert manager.get("b") is None
+    assert manager.get("a") == "model a"
+    assert manager.evictions == 1
+
+
+def test_lfu_keeps_the_most_used():
+    manager = ResidencyManager(budget_bytes=20, policy="lfu")
+    _load(manager, "a")
+    _load(manager, "b")
+    for _ in range(3):
+        manager.get("a")
+    manager.get("b")  # more recent, but used less
+    _load(manager, "c")
+
+    assert manager.get("b") is None
+    assert manager.get("a") == "model a"
+
+
+def test_evicted_models_are_reloaded():
+    manager = ResidencyManager(budget_bytes=10)
+    _load(manager, "a")
+    _load(manager, "b")
+    assert _load(manager, "a") == "model a"
+    assert (manager.loads, manager.reloads, manager.evictions) == (3, 1, 2)
+
+
+def test_a_model_bigger_than_the_budget_still_loads_alone():
+    manager = ResidencyManager(budget_bytes=10)
+    _load(manager, "a", size=5)
+    assert _load(manager, "big", size=50) == "model big"
+    assert manager.stats()["resident"] == ["big"]
+
+
+def test_no_budget_keeps_everything():
+    manager = ResidencyManager(budget_bytes=0)
+    for key in "abcde":
+        _load(manager, key, size=10 ** 9)
+    assert manager.evictions == 0
+    assert len(manager.stats()["resident"]) == 5
+
+
+def test_concurrent_loads_of_one_key_call_the_loader_once():
+    manager = ResidencyManager()
+    calls = []
+
+    def loader():
+        calls.append(1)
+        time.sleep(0.05)
+        return "model"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(manager.load("a", loader, 1))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert calls == [1]
+    assert results == ["model"] * 4
+
+
+def test_a_failed_load_frees_its_reservation():
+    manager = ResidencyManager(budget_bytes=10)
+
+    def broken():
+        raise OSError("no weights")
+
+    with pytest.raises(OSError):
+        manager.load("a", broken, 10)
+    _load(manager, "b")
+    assert manager.evictions == 0
+    assert manager.stats()["resident"] == ["b"]
+
+
+def test_unknown_policy():
+    with pytest.raises(ValueError):
+        ResidencyManager(policy="fifo")
@@ -0,0 +1,197 @@
+import pytest
+
+from polyprose import resilience
+from polyprose.argos_registry import PackageNotAvailable
+from polyprose.resilience import CircuitBreaker, CircuitOpenError
+from polyprose.responder import StreamedReply
+
+
+class HTTPError(Exception):
+    def __init__(self, code, message="", errors=()):
+        super().__init__(message)
+        self.code = code
+        self.errors = list(errors)
+
+
+@pytest.fixture(autouse=True)
+def fresh_breakers(monkeypatch):
+    monkeypatch.setenv("POLYPROSE_RETRY_ATTEMPTS", "3")
+    monkeypatch.setenv("POLYPROSE_RETRY_BASE_MS", "0")
+    monkeypatch.setenv("POLYPROSE_CIRCUIT_FAILURES", "2")
+    monkeypatch.setenv("POLYPROSE_CIRCUIT_RESET_SECONDS", "30")
+    monkeypatch.setattr(resilience, "_policy", None)
+    monkeypatch.setattr(resilience, "_breakers", {})
+
+
+def test_classification():
+    assert resilience.is_retryable(TimeoutError())
+    assert resilience.is_retryable(HTTPError(503))
+    assert resilience.is_retryable(HTTPError(429))
+    assert not resilience.is_retryable(HTTPError(400))
+    assert not resilience.is_retryable(ValueError())
+
+    assert resilience.is_permanent(PackageNotAvailable("no be-en"))
+    assert resilience.is_permanent(MemoryError())
+    assert resilience.is_permanent(RuntimeError("CUDA out of memory"))
+    assert resilience.is_permanent(HTTPError(401, "invalid credentials"))
+    # A stray KeyError is a bug in a call, not a backend that's gone
+    assert not resilience.is_permanent(KeyError("x"))
+    assert not resilience.is_permanent(IndexError())
+
+
+def test_google_rate_limit_403_is_retried_daily_limit_is_counted():
+    assert resilience.is_retryable(HTTPError(403, "User Rate Limit Exceeded"))
+    assert resilience.is_retryable(HTTPError(403, "Forbidden", errors=[{"reason": "rateLimitExceeded"}]))
+    daily = HTTPError(403, "Daily Limit Exceeded", errors=[{"reason": "dailyLimitExceeded"}])
+    assert not resilience.is_retryable(daily)
+    assert not resilience.is_request_error(daily)
+
+
+def test_request_errors():
+    assert resilience.is_request_error(HTTPError(400))
+    assert resilience.is_request_error(HTTPError(404))
+    assert not resilience.is_request_error(HTTPError(401))
+    assert not resilience.is_request_error(HTTPError(403))
+    assert not resilience.is_request_error(HTTPError(503))
+
+
+def test_remote_errors_carry_their_verdict():
+    from polyprose.client import RemoteError
+
+    assert resilience.is_retryable(RemoteError("ReadTimeout", "slow", retryable=True))
+    assert resilience.is_permanent(RemoteError("PackageNotAvailable", "no xx", permanent=True))
+
+
+def test_transient_errors_are_retried():
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise ConnectionError("reset")
+        return "ok"
+
+    assert resilience.call("google", "ru-en", flaky) == "ok"
+    assert len(calls) == 3
+    assert resilience.get_breaker("google", "ru-en").state == "closed"
+
+
+def test_circuit_opens_after_failures_in_a_row_and_fails_fast():
+    calls = []
+
+    def broken():
+        calls.append(1)
+        raise ValueError("nope")
+
+    for _ in range(2):
+        with pytest.raises(ValueError):
+            resilience.call("argos", "ru-en", broken)
+    with pytest.raises(CircuitOpenError) as error:
+        resilience.call("argos", "ru-en", broken)
+    assert len(calls) == 2
+    assert error.value.retry_after > 0
+    # Other pairs aren't affected
+    assert resilience.call("argos", "fr-en", lambda: "fine") == "fine"
+    assert [(backend, key) for backend, key, *_ in resilience.open_circuits()] == [("argos", "ru-en")]
+
+
+def test_permanent_error_opens_the_circuit_at_once():
+    def missing():
+        raise PackageNotAvailable("no be-en")
+
+    with pytest.raises(PackageNotAvailable):
+        resilience.call("argos", "be-en", missing)
+    with pytest.raises(CircuitOpenError):
+        resilience.call("argos", "be-en", missing)
+
+
+def test_request_errors_leave_the_circuit_closed():
+    def bad_request():
+        raise HTTPError(400, "bad")
+
+    for _ in range(5):
+        with pytest.raises(HTTPError):
+            resilience.call("google", "pl", bad_request)
+    assert resilience.get_breaker("google", "pl").state == "closed"
+
+
+def test_half_open_trial_closes_or_reopens(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(resilience.time, "monotonic", lambda: clock[0])
+    breaker = CircuitBreaker("argos", "ru-en", failure_threshold=1, reset_seconds=10)
+    breaker.record_failure(ValueError())
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    clock[0] += 11
+    assert breaker.state == "half_open"
+    breaker.before_call()
+    # Only one trial at a time
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record_failure(ValueError())
+    assert breaker.state == "open"
+
+    clock[0] += 11
+    breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+
+def test_abandoned_trial_does_not_block_the_circuit_forever(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(resilience.time, "monotonic", lambda: clock[0])
+    breaker = CircuitBreaker("responder", "m", failure_threshold=1, reset_seconds=10)
+    breaker.record_failure(ValueError())
+    clock[0] += 11
+    breaker.before_call()
+    # Nobody ever reports how that trial went
+    clock[0] += 11
+    breaker.before_call()
+
+
+def _reply(chunks, error=None):
+    def generate():
+        yield from chunks
+        if error is not None:
+            raise error
+    return StreamedReply(generate())
+
+
+def test_stream_counts_when_it_is_read_not_when_it_starts():
+    replies = [resilience.call_stream("responder", "m", _reply, ["a "], MemoryError("OOM")) for _ in range(2)]
+    # Starting them said nothing yet
+    assert resilience.get_breaker("responder", "m").state == "closed"
+    with pytest.raises(MemoryError):
+        list(replies[0])
+    assert resilience.get_breaker("responder", "m").state == "open"
+
+
+def test_finished_stream_closes_a_half_open_circuit(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(resilience.time, "monotonic", lambda: clock[0])
+    breaker = resilience.get_breaker("responder", "m")
+    breaker.record_failure(MemoryError(), permanent=True)
+    clock[0] += 31
+
+    reply = resilience.call_stream("responder", "m", _reply, ["Hello ", "there."])
+    # The trial has started but not finished
+    assert breaker.state == "half_open"
+    with pytest.raises(CircuitOpenError):
+        resilience.call_stream("responder", "m", _reply, ["x"])
+    assert "".join(reply) == "Hello there."
+    assert breaker.state == "closed"
+
+
+def test_cancelled_stream_releases_the_trial(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(resilience.time, "monotonic", lambda: clock[0])
+    breaker = resilience.get_breaker("responder", "m")
+    breaker.record_failure(MemoryError(), permanent=True)
+    clock[0] += 31
+
+    reply = resilience.call_stream("responder", "m", _reply, ["a "])
+    reply.cancel()
+    assert breaker.state == "half_open"
+    # The next call gets to try
+    resilience.call_stream("responder", "m", _reply, ["b "])
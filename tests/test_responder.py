@@ -0,0 +1,70 @@
+from concurrent.futures import Future
+
+import pytest
+
+from polyprose import responder
+
+
+class FakeBatcher:
+    def __init__(self):
+        self.requests = []
+
+    def submit(self, input_ids, max_length, streamer=None, stop=None):
+        future = Future()
+        self.requests.append((input_ids, streamer, stop, future))
+        return future
+
+
+def _fake_model(monkeypatch):
+    batcher = FakeBatcher()
+    monkeypatch.setattr(responder, "get_batcher", lambda model_name: batcher)
+    monkeypatch.setattr(responder, "_context_ids", lambda model_name, text, history: [1, 2, 3])
+    return batcher
+
+
+def test_replies_arrive_whole_by_default(monkeypatch):
+    monkeypatch.delenv("POLYPROSE_STREAM_REPLIES", raising=False)
+    batcher = _fake_model(monkeypatch)
+
+    reply = responder.stream_reply("hello", translate_fn=str.upper)
+    [(input_ids, streamer, stop, future)] = batcher.requests
+    # No streamer, so the batcher keeps the model's beam search
+    assert streamer is None and stop is reply.stop
+    future.set_result("Hi there. How are you?")
+
+    assert list(reply) == ["Hi there. How are you?"]
+    assert reply.translation() == "HI THERE. HOW ARE YOU?"
+    assert not reply.cancelled
+
+
+def test_cancelling_a_queued_whole_reply(monkeypatch):
+    monkeypatch.delenv("POLYPROSE_STREAM_REPLIES", raising=False)
+    batcher = _fake_model(monkeypatch)
+    finished = []
+
+    reply = responder.stream_reply("hello")
+    reply.on_finish(lambda error, cancelled: finished.append((error, cancelled)))
+    reply.cancel()
+
+    [(_, _, stop, future)] = batcher.requests
+    assert stop.is_set() and future.cancelled()
+    assert list(reply) == []
+    assert finished == [(None, True)]
+
+
+def test_a_failed_whole_reply_raises_when_read(monkeypatch):
+    monkeypatch.delenv("POLYPROSE_STREAM_REPLIES", raising=False)
+    batcher = _fake_model(monkeypatch)
+
+    reply = responder.stream_reply("hello")
+    batcher.requests[0][3].set_exception(MemoryError("out of memory"))
+
+    with pytest.raises(MemoryError):
+        list(reply)
+
+
+def test_streaming_is_opt_in(monkeypatch):
+    monkeypatch.delenv("POLYPROSE_STREAM_REPLIES", raising=False)
+    assert not responder.streaming()
+    monkeypatch.setenv("POLYPROSE_STREAM_REPLIES", "1")
+    assert responder.streaming()
@@ -0,0 +1,111 @@
+import socket
+import sys
+import threading
+import time
+
+import pytest
+
+if sys.platform == "win32":
+    pytest.skip("the inference server is Unix only", allow_module_level=True)
+
+from polyprose import resilience, responder, server
+from polyprose.argos_registry import PackageNotAvailable
+from polyprose.client import InferenceClient, RemoteError
+
+
+@pytest.fixture
+def inference(tmp_path, monkeypatch):
+    """A server's connection handling on a temp socket, with stub ops instead of models."""
+    path = tmp_path / "inference.sock"
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(str(path))
+    listener.listen(8)
+
+    def accept():
+        while True:
+            try:
+                conn, _ = listener.accept()
+            except OSError:
+                return
+            threading.Thread(target=server._handle, args=(conn,), daemon=True).start()
+
+    threading.Thread(target=accept, daemon=True).start()
+    client = InferenceClient(str(path), timeout=5)
+    yield client
+    client.close()
+    listener.close()
+
+
+def test_a_plain_call_round_trips(inference, monkeypatch):
+    monkeypatch.setitem(server.OPS, "translate", lambda args: f"{args['to_language']}:{args['text']}")
+
+    assert inference.call("translate", from_language="en", to_language="ru", text="привет") == "ru:привет"
+    # The connection went back to the pool and takes the next call
+    assert inference.call("translate", from_language="en", to_language="fr", text="hi") == "fr:hi"
+    assert len(inference._idle) == 1
+
+
+@pytest.mark.parametrize("error, retryable, permanent", [
+    (TimeoutError("slow"), True, False),
+    (PackageNotAvailable("no package for xx->en"), False, True),
+    (ValueError("bad input"), False, False),
+])
+def test_remote_errors_keep_their_classification(inference, monkeypatch, error, retryable, permanent):
+    def fail(args):
+        raise error
+
+    monkeypatch.setitem(server.OPS, "translate", fail)
+
+    with pytest.raises(RemoteError) as caught:
+        inference.call("translate", from_language="xx", to_language="en", text="?")
+
+    assert caught.value.kind == type(error).__name__
+    assert resilience.is_retryable(caught.value) == retryable
+    assert resilience.is_permanent(caught.value) == permanent
+
+
+def test_unknown_ops_are_a_remote_error(inference):
+    with pytest.raises(RemoteError, match="Unknown inference op"):
+        inference.call("nope")
+
+
+def test_a_stream_cancelled_partway_stops_generating(inference, monkeypatch):
+    replies = []
+
+    def words(stop):
+        for i in range(1000):
+            if stop.is_set():
+                return
+            yield f"word{i} "
+            time.sleep(0.01)
+
+    def stream_reply(text, translate_fn, max_length, model_name, history):
+        stop = threading.Event()
+        reply = responder.StreamedReply(words(stop), translate_fn, stop=stop)
+        replies.append(reply)
+        return reply
+
+    monkeypatch.setattr(responder, "stream_reply", stream_reply)
+
+    chunks, close = inference.stream("stream", text="hi", max_length=20, model_name="m", history=[])
+    assert next(chunks) == "word0 "
+    close()
+
+    assert list(chunks) == []
+    [reply] = replies
+    deadline = time.monotonic() + 5
+    while not reply.cancelled and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert reply.cancelled
+    assert len(reply.text.split()) < 1000
+
+
+def test_a_whole_stream_ends_with_done(inference, monkeypatch):
+    monkeypatch.setattr(responder, "stream_reply",
+                        lambda *args: responder.StreamedReply(iter(["Hi ", "there."])))
+
+    chunks, _ = inference.stream("stream", text="hi", max_length=20, model_name="m", history=[])
+
+    assert list(chunks) == ["Hi ", "there."]
+    # Read to the end, so the connection is reused
+    assert len(inference._idle) == 1
@@ -0,0 +1,74 @@
+import json
+import struct
+
+import pytest
+
+from polyprose import snapshot
+
+
+def _fake_snapshot(folder, model_name="facebook/tiny"):
+    """What write() leaves in its temp folder, without needing torch: a manifest and the weights."""
+    folder.mkdir(parents=True)
+    header = json.dumps({"w": {"dtype": "F32", "shape": [2, 2], "data_offsets": [0, 16]}}).encode()
+    (folder / snapshot.WEIGHTS_NAME).write_bytes(
+        struct.pack("<Q", len(header)) + header + struct.pack("<4f", 1, 2, 3, 4))
+    (folder / snapshot.MANIFEST_NAME).write_text(json.dumps({"version": snapshot.VERSION, "model": model_name}))
+    return folder
+
+
+def test_no_snapshot():
+    assert snapshot.find("facebook/tiny") is None
+
+
+def test_a_snapshot_in_the_default_place_is_found(tmp_path):
+    snapshot._publish(_fake_snapshot(tmp_path / "tmp"), snapshot.snapshot_path("facebook/tiny"), "facebook/tiny")
+    assert snapshot.find("facebook/tiny") == snapshot.snapshot_path("facebook/tiny")
+    assert not snapshot.pointer_path("facebook/tiny").exists()
+
+
+def test_a_snapshot_written_with_output_is_found(tmp_path):
+    output = tmp_path / "elsewhere" / "tiny"
+    snapshot._publish(_fake_snapshot(tmp_path / "tmp"), output, "facebook/tiny")
+
+    assert snapshot.find("facebook/tiny") == output.resolve()
+    # Gone again: nothing to find
+    (output / snapshot.WEIGHTS_NAME).unlink()
+    assert snapshot.find("facebook/tiny") is None
+
+
+def test_an_incomplete_snapshot_is_ignored(tmp_path):
+    folder = _fake_snapshot(snapshot.snapshot_path("facebook/tiny"))
+    (folder / snapshot.MANIFEST_NAME).write_text(json.dumps({"version": snapshot.VERSION + 1}))
+    assert snapshot.find("facebook/tiny") is None
+
+
+def test_weights_are_memory_mapped(tmp_path):
+    pytest.importorskip("torch")
+    folder = _fake_snapshot(tmp_path / "tiny")
+
+    tensors = snapshot.mmap_state_dict(folder / snapshot.WEIGHTS_NAME)
+
+    assert tensors["w"].tolist() == [[1.0, 2.0], [3.0, 4.0]]
+
+
+def test_write_find_and_load_round_trip(tmp_path):
+    pytest.importorskip("torch")
+    pytest.importorskip("transformers")
+    from transformers import BlenderbotConfig, BlenderbotForConditionalGeneration
+
+    # A tiny random BlenderBot, so nothing is downloaded
+    source = tmp_path / "source"
+    tiny = BlenderbotConfig(vocab_size=64, d_model=16, encoder_layers=1, decoder_layers=1, encoder_attention_heads=2,
+                            decoder_attention_heads=2, encoder_ffn_dim=32, decoder_ffn_dim=32,
+                            max_position_embeddings=32)
+    BlenderbotForConditionalGeneration(tiny).save_pretrained(source)
+    try:
+        from transformers import BlenderbotTokenizer
+        BlenderbotTokenizer.from_pretrained("facebook/blenderbot-400M-distill").save_pretrained(source)
+    except OSError:
+        pytest.skip("needs the BlenderBot tokenizer files")
+
+    path = snapshot.write(str(source), output=tmp_path / "out")
+    assert snapshot.find(str(source)) == path.resolve()
+    model = snapshot.load_model(path)
+    assert model.config.d_model == 16
@@ -0,0 +1,71 @@
+import json
+
+import pytest
+
+from polyprose import core, ui_strings
+
+
+@pytest.fixture
+def catalog(tmp_path, monkeypatch):
+    """Writes a catalog to a temp file and points the lookups at it."""
+    path = tmp_path / "ui_strings.json"
+    monkeypatch.setenv("POLYPROSE_UI_STRINGS", str(path))
+    monkeypatch.setattr(ui_strings, "_catalog", None)
+
+    def write(backends, sources=None):
+        path.write_text(json.dumps({"version": ui_strings.VERSION, "sources": sources or dict(ui_strings.STRINGS),
+                                    "backends": backends}), encoding="utf-8")
+
+    return write
+
+
+class LivePipeline(core.Pipeline):
+    def __init__(self):
+        super().__init__("argos")
+        self.translated = []
+
+    def _translate(self, from_language, to_language, text):
+        self.translated.append((to_language, text))
+        return f"{to_language}:{text}"
+
+
+def test_lookup_prefers_the_apps_backend(catalog):
+    catalog({"google": {"ru": {"title": "google"}}, "argos": {"ru": {"title": "argos"}, "fr": {"title": "fr"}}})
+    assert ui_strings.lookup("argos", "ru", "title") == "argos"
+    assert ui_strings.lookup("google", "ru", "title") == "google"
+    # Any backend's translation beats translating live
+    assert ui_strings.lookup("google", "fr", "title") == "fr"
+    assert ui_strings.lookup("argos", "pl", "title") is None
+
+
+def test_translations_of_old_english_are_ignored(catalog):
+    catalog({"argos": {"ru": {"title": "старое"}}}, sources={"title": "Old tagline"})
+    assert ui_strings.lookup("argos", "ru", "title") is None
+
+
+def test_no_catalog_yet(catalog):
+    assert ui_strings.lookup("argos", "ru", "title") is None
+
+
+def test_ui_string_uses_the_catalog_then_translates_live(catalog):
+    catalog({"argos": {"ru": {"title": "Давай учиться вместе!"}}})
+    pipeline = LivePipeline()
+
+    assert pipeline.ui_string("ru", "title") == "Давай учиться вместе!"
+    assert pipeline.ui_string("en", "title") == ui_strings.STRINGS["title"]
+    assert pipeline.translated == []
+    assert pipeline.title("fr") == f"fr:{ui_strings.STRINGS['title']}"
+    assert pipeline.translated == [("fr", ui_strings.STRINGS["title"])]
+
+
+def test_build_writes_every_language(tmp_path, monkeypatch):
+    monkeypatch.setattr(core.Pipeline, "translate_batch",
+                        lambda self, from_language, to_language, texts: [f"{to_language}:{t}" for t in texts])
+    monkeypatch.setattr(core, "languages", lambda backend: {"Russian": "ru", "French": "fr"})
+    path = tmp_path / "out" / "catalog.json"
+
+    ui_strings.build(["argos"], path, log=None)
+
+    built = ui_strings.read_catalog(path)
+    assert built["sources"] == ui_strings.STRINGS
+    assert built["backends"]["argos"]["fr"]["title"] == f"fr:{ui_strings.STRINGS['title']}"